@@ -0,0 +1,254 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+from datetime import datetime
+from os import path
+
+import app.logger as logger
+from app.store import ManifestStore
+
+
+READ_CHUNK_SIZE = 1024 * 1024
+CACHE_VERSION = 1
+FILE_NAME_PATTERN = re.compile(r'(?P<key>[0-9a-f]{64})\.\d{3}|tmp\w+\.tmp')
+
+
+class ArchiveCacheError(Exception):
+    """Архив в кэше отсутствует или повреждён."""
+
+
+class ArchiveCache:
+    """Кэш готовых архивов (см. <code>compression.compress_file</code>) по SHA256 содержимого файла и настройкам сжатия.\n
+    Повторная отправка того же содержимого (повтор после ошибки, возврат к прежней версии миссии)
+    берёт архив из кэша без сжатия. Архивы хранятся файлами в отдельной папке (разрезанный архив - по файлу
+    на часть), а их список - в базе (см. <code>ManifestStore</code>). Если общий размер архивов превышает лимит,
+    удаляются архивы, которые дольше всего не использовались. Перед использованием SHA256 каждого файла
+    сверяется с сохранённым, повреждённый архив удаляется.
+
+    Чтение и запись файлов (<code>read</code>, <code>write</code>) не обращаются к базе и выполняются в отдельном потоке,
+    остальные методы - в потоке отправщика.
+    """
+
+    def __init__(self, store: ManifestStore, folder: str, max_bytes: int):
+        """Инициализирует кэш, считывает список архивов из базы и удаляет архивы с отсутствующими файлами
+        и файлы, не принадлежащие архивам (например, оставшиеся после сбоя во время записи).
+
+        Parameters
+        ----------
+        store : ManifestStore
+            хранилище состояния отправщика
+        folder : str
+            папка для файлов архивов
+        max_bytes : int
+            максимальный общий размер архивов в байтах
+        """
+
+        self.logger = logger.setup_logging(__name__)
+        self.store = store
+        self.FOLDER = folder
+        self.max_bytes = max_bytes
+        self.archives: dict[str, dict] = self.store.read_archives()
+
+        os.makedirs(self.FOLDER, exist_ok=True)
+
+        for key, archive in list(self.archives.items()):
+            if not all(path.exists(self.get_path(key, index)) for index in range(len(archive['blobs']))):
+                self.remove(key)
+
+        for entry in os.scandir(self.FOLDER):
+            file_name_match: re.Match | None = FILE_NAME_PATTERN.fullmatch(entry.name)
+            if entry.is_file() and file_name_match and file_name_match['key'] not in self.archives:
+                os.remove(entry.path)
+
+
+    def get_key(self, source_digest: str, archive_name: str, settings: dict) -> str:
+        """Возвращает ключ архива по SHA256 содержимого файла, имени файла в архиве и настройкам сжатия."""
+
+        key_data: str = json.dumps([CACHE_VERSION, source_digest, archive_name, settings], sort_keys=True)
+
+        return hashlib.sha256(key_data.encode()).hexdigest()
+
+
+    def get_path(self, key: str, index: int) -> str:
+        """Возвращает путь к файлу архива (части для разрезанного архива)."""
+
+        return path.join(self.FOLDER, f'{key}.{index:03d}')
+
+
+    def get(self, key: str) -> dict | None:
+        """Возвращает данные архива для <code>read</code> или None, если его нет. Архив отмечается использованным."""
+
+        archive: dict | None = self.archives.get(key)
+        if archive is None:
+            return None
+
+        archive['last_used_at'] = time.time()
+        self.store.save_archive(key, archive)
+
+        return archive
+
+
+    def read(self, key: str, archive: dict) -> dict:
+        """Возвращает архив из кэша в формате <code>compression.compress_file</code>.\n
+        Архив в памяти считывается целиком, части разрезанного архива копируются во временную папку системы,
+        так как после отправки они удаляются. SHA256 каждого файла сверяется с сохранённым.
+
+        Raises
+        ------
+        ArchiveCacheError
+            если файл архива отсутствует или его содержимое изменилось
+        """
+
+        parts_dir: str | None = tempfile.mkdtemp(prefix='pbo_sender_') if archive['parts'] else None
+        parts: list[str] = []
+        data: bytes | None = None
+
+        try:
+            for index, blob in enumerate(archive['blobs']):
+                if parts_dir is None:
+                    data = self.read_blob(key, index, blob)
+                    continue
+
+                parts.append(path.join(parts_dir, blob['name']))
+                self.read_blob(key, index, blob, parts[-1])
+        except (OSError, ArchiveCacheError) as e:
+            if parts_dir:
+                shutil.rmtree(parts_dir, ignore_errors=True)
+            raise ArchiveCacheError(str(e)) from e
+
+        return {
+            'file_name': archive['file_name'],
+            'data': data,
+            'parts': parts,
+            'archive_sha256': archive['archive_sha256'],
+            'source_sha256': archive['source_sha256'],
+            'original_size': archive['original_size'],
+            'compressed_size': archive['compressed_size'],
+            'method': archive['method'],
+            'created_at': datetime.now()
+        }
+
+
+    def read_blob(self, key: str, index: int, blob: dict, copy_path: str | None = None) -> bytes | None:
+        """Считывает файл архива и сверяет его SHA256. Если указан <code>copy_path</code>,
+        файл копируется туда блоками и не возвращается.
+        """
+
+        blob_hash = hashlib.sha256()
+        blob_chunks: list[bytes] = []
+
+        with open(self.get_path(key, index), 'rb') as blob_file:
+            if copy_path is None:
+                while chunk := blob_file.read(READ_CHUNK_SIZE):
+                    blob_hash.update(chunk)
+                    blob_chunks.append(chunk)
+            else:
+                with open(copy_path, 'wb') as copy_file:
+                    while chunk := blob_file.read(READ_CHUNK_SIZE):
+                        blob_hash.update(chunk)
+                        copy_file.write(chunk)
+
+        if blob_hash.hexdigest() != blob['sha256']:
+            raise ArchiveCacheError(f'Файл {index + 1} архива повреждён')
+
+        return None if copy_path else b''.join(blob_chunks)
+
+
+    def write(self, key: str, zip_result: dict) -> dict:
+        """Записывает файлы архива в папку кэша и возвращает данные архива для <code>save</code>.\n
+        Файлы записываются под уникальными временными именами и переименовываются после записи,
+        поэтому одновременная запись одного архива из разных потоков безопасна.
+
+        Parameters
+        ----------
+        key : str
+            ключ архива (см. <code>get_key</code>)
+        zip_result : dict
+            архив в формате <code>compression.compress_file</code> в памяти или разрезанный на части
+        """
+
+        blobs_sources: list[tuple[str | None, bytes | str]] = (
+            [(path.basename(part_path), part_path) for part_path in zip_result['parts']]
+            if zip_result['parts'] else [(None, zip_result['data'])]
+        )
+        blobs: list[dict] = []
+
+        for index, (blob_name, blob_source) in enumerate(blobs_sources):
+            blob_path: str = self.get_path(key, index)
+            blob_hash = hashlib.sha256()
+            temp_fd, temp_path = tempfile.mkstemp(prefix='tmp', suffix='.tmp', dir=self.FOLDER)
+
+            with open(temp_fd, 'wb') as blob_file:
+                if isinstance(blob_source, bytes):
+                    blob_hash.update(blob_source)
+                    blob_file.write(blob_source)
+                else:
+                    with open(blob_source, 'rb') as part_file:
+                        while chunk := part_file.read(READ_CHUNK_SIZE):
+                            blob_hash.update(chunk)
+                            blob_file.write(chunk)
+
+            os.replace(temp_path, blob_path)
+            blobs.append({'name': blob_name, 'sha256': blob_hash.hexdigest(), 'size': path.getsize(blob_path)})
+
+        return {
+            'file_name': zip_result['file_name'],
+            'parts': bool(zip_result['parts']),
+            'blobs': blobs,
+            'archive_sha256': zip_result['archive_sha256'],
+            'source_sha256': zip_result['source_sha256'],
+            'original_size': zip_result['original_size'],
+            'compressed_size': zip_result['compressed_size'],
+            'method': zip_result['method'],
+            'size': sum(blob['size'] for blob in blobs),
+            'last_used_at': time.time()
+        }
+
+
+    def save(self, key: str, archive: dict):
+        """Добавляет записанный архив в кэш и освобождает место по лимиту."""
+
+        self.archives[key] = archive
+        self.store.save_archive(key, archive)
+
+        self.evict(key)
+
+
+    def remove(self, key: str):
+        """Удаляет архив из кэша вместе с его файлами."""
+
+        archive: dict | None = self.archives.pop(key, None)
+        if archive is None:
+            return
+
+        self.store.remove_archive(key)
+
+        for index in range(len(archive['blobs'])):
+            try:
+                os.remove(self.get_path(key, index))
+            except FileNotFoundError:
+                pass
+
+
+    def evict(self, keep_key: str):
+        """Удаляет давно не использовавшиеся архивы, пока общий размер кэша превышает лимит.
+        Только что сохранённый архив больше лимита тоже удаляется.
+        """
+
+        total_size: int = sum(archive['size'] for archive in self.archives.values())
+        evicted_count = 0
+
+        for key in sorted(self.archives, key=lambda key: (key == keep_key, self.archives[key]['last_used_at'])):
+            if total_size <= self.max_bytes:
+                break
+
+            total_size -= self.archives[key]['size']
+            self.remove(key)
+            evicted_count += 1
+
+        if evicted_count:
+            self.logger.info(f'Из кэша архивов удалено давно не использовавшихся архивов: {evicted_count}')
@@ -0,0 +1,157 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from os import path
+
+import app.logger as logger
+from app.store import ManifestStore
+
+
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+class BaseStore:
+    """Хранилище последних отправленных версий файлов, относительно которых создаются патчи (см. <code>app.delta</code>).\n
+    Версии хранятся копиями в отдельной папке, а их список - в базе (см. <code>ManifestStore</code>).
+    Если общий размер копий превышает лимит, удаляются версии, которые дольше всего не использовались.
+
+    Файл копируется в папку <code>staging</code> перед сжатием, и сжимается и сравнивается именно копия.
+    После успешной отправки она становится новой базовой версией, поэтому база совпадает с тем,
+    что получил получатель, даже если файл изменился во время отправки.
+    """
+
+    def __init__(self, store: ManifestStore, folder: str, max_bytes: int):
+        """Инициализирует хранилище, считывает список версий из базы и удаляет оставшиеся временные копии.
+
+        Parameters
+        ----------
+        store : ManifestStore
+            хранилище состояния отправщика
+        folder : str
+            папка для копий версий
+        max_bytes : int
+            максимальный общий размер копий в байтах
+        """
+
+        self.logger = logger.setup_logging(__name__)
+        self.store = store
+        self.FOLDER = folder
+        self.STAGING_FOLDER = path.join(folder, 'staging')
+        self.max_bytes = max_bytes
+        self.bases: dict[str, dict] = self.store.read_bases()
+
+        os.makedirs(self.STAGING_FOLDER, exist_ok=True)
+        self.clear_staging()
+
+        for file_name in [file_name for file_name in self.bases if not path.exists(self.get_path(file_name))]:
+            self.remove(file_name)
+
+
+    def get_path(self, file_name: str) -> str:
+        """Возвращает путь к копии базовой версии файла."""
+
+        return path.join(self.FOLDER, f'{hashlib.sha256(file_name.encode()).hexdigest()[:32]}.base')
+
+
+    def get(self, file_name: str) -> dict | None:
+        """Возвращает базовую версию файла: <code>path</code>, <code>digest</code> (SHA256) и <code>size</code>
+        или None, если её нет. Версия отмечается использованной.
+        """
+
+        base: dict | None = self.bases.get(file_name)
+        if base is None:
+            return None
+
+        base['last_used_at'] = time.time()
+        self.store.save_base(file_name, base)
+
+        return {**base, 'path': self.get_path(file_name)}
+
+
+    def stage(self, file_path: str) -> tuple[str, str]:
+        """Копирует файл во временную папку, одновременно вычисляя его SHA256.
+
+        Returns
+        -------
+        tuple[str, str]
+            путь к копии (с тем же именем файла) и SHA256 её содержимого
+        """
+
+        staged_path = path.join(tempfile.mkdtemp(dir=self.STAGING_FOLDER), path.basename(file_path))
+        file_hash = hashlib.sha256()
+
+        with open(file_path, 'rb') as source_file, open(staged_path, 'wb') as staged_file:
+            while chunk := source_file.read(READ_CHUNK_SIZE):
+                file_hash.update(chunk)
+                staged_file.write(chunk)
+
+        return staged_path, file_hash.hexdigest()
+
+
+    def save(self, file_name: str, staged_path: str, digest: str):
+        """Делает отправленную копию файла его базовой версией и освобождает место по лимиту.
+
+        Parameters
+        ----------
+        file_name : str
+            имя файла
+        staged_path : str
+            путь к копии из <code>stage</code>
+        digest : str
+            SHA256 копии
+        """
+
+        size: int = path.getsize(staged_path)
+        if size > self.max_bytes:
+            self.logger.info(f'Файл {file_name} больше лимита хранилища версий и не сохраняется')
+            self.remove(file_name)
+            return
+
+        os.replace(staged_path, self.get_path(file_name))
+        self.bases[file_name] = {'digest': digest, 'size': size, 'last_used_at': time.time()}
+        self.store.save_base(file_name, self.bases[file_name])
+
+        self.evict(file_name)
+
+
+    def remove(self, file_name: str):
+        """Удаляет базовую версию файла."""
+
+        if self.bases.pop(file_name, None) is None:
+            return
+
+        self.store.remove_base(file_name)
+
+        try:
+            os.remove(self.get_path(file_name))
+        except FileNotFoundError:
+            pass
+
+
+    def evict(self, keep_file_name: str):
+        """Удаляет давно не использовавшиеся версии, пока общий размер копий превышает лимит."""
+
+        total_size: int = sum(base['size'] for base in self.bases.values())
+        evicted_count = 0
+
+        for file_name in sorted(self.bases, key=lambda file_name: self.bases[file_name]['last_used_at']):
+            if total_size <= self.max_bytes:
+                break
+            if file_name == keep_file_name:
+                continue
+
+            total_size -= self.bases[file_name]['size']
+            self.remove(file_name)
+            evicted_count += 1
+
+        if evicted_count:
+            self.logger.info(f'Из хранилища версий удалено давно не использовавшихся версий: {evicted_count}')
+
+
+    def clear_staging(self):
+        """Удаляет временные копии, которые не стали базовыми версиями."""
+
+        for entry in os.scandir(self.STAGING_FOLDER):
+            shutil.rmtree(entry.path, ignore_errors=True)
@@ -0,0 +1,302 @@
+import io
+import tempfile
+import zlib
+from datetime import datetime
+from hashlib import sha256
+from os import path
+from zipfile import ZipFile, ZipInfo, ZIP_STORED, ZIP_DEFLATED, ZIP_LZMA
+
+
+READ_CHUNK_SIZE = 1024 * 1024
+
+SAMPLES_COUNT = 8
+SAMPLE_SIZE = 256 * 1024
+
+DEFAULT_POLICY = 'balanced'
+
+# Имя метода: (тип сжатия ZIP, уровень сжатия)
+METHODS: dict[str, tuple[int, int | None]] = {
+    'store': (ZIP_STORED, None),
+    'deflate-fast': (ZIP_DEFLATED, 1),
+    'deflate': (ZIP_DEFLATED, 6),
+    'deflate-max': (ZIP_DEFLATED, 9),
+    'lzma': (ZIP_LZMA, None)
+}
+
+
+class CompressedBuffer(io.RawIOBase):
+    """Буфер в памяти для сжатых данных с ограничением размера. Наследует <code>RawIOBase</code>.\n
+    Данные сверх лимита не хранятся, но учитываются в размере. Буфер не поддерживает
+    перемещение, поэтому <code>ZipFile</code> пишет в него архив последовательно.
+    """
+
+    def __init__(self, memory_cap: int):
+        """Инициализирует новый буфер.
+
+        Parameters
+        ----------
+        memory_cap : int
+            максимальный размер хранимых данных в байтах
+        """
+
+        super().__init__()
+        self.memory_cap = memory_cap
+        self.size = 0
+        self.buffer: bytearray | None = bytearray()
+
+
+    def writable(self) -> bool:
+        return True
+
+
+    def write(self, data) -> int:
+        data_size = len(data)
+        self.size += data_size
+
+        if self.buffer is not None:
+            if self.size > self.memory_cap:
+                self.buffer = None
+            else:
+                self.buffer += data
+
+        return data_size
+
+
+    def tell(self) -> int:
+        return self.size
+
+
+    @property
+    def overflowed(self) -> bool:
+        """Превышен ли лимит размера буфера."""
+
+        return self.buffer is None
+
+
+    def getvalue(self) -> bytes | None:
+        """Возвращает сжатые данные или None, если лимит был превышен."""
+
+        return bytes(self.buffer) if self.buffer is not None else None
+
+
+class SplitBuffer(io.RawIOBase):
+    """Буфер, разрезающий поток сжатых данных на части ограниченного размера. Наследует <code>RawIOBase</code>.\n
+    Первая часть хранится в памяти. Если архив в неё не помещается, части по мере заполнения
+    записываются во временную папку системы (<code>name.zip.001</code>, <code>name.zip.002</code>, ...),
+    поэтому архив целиком не собирается ни в памяти, ни на диске.
+    """
+
+    def __init__(self, part_size: int, archive_name: str):
+        """Инициализирует новый буфер.
+
+        Parameters
+        ----------
+        part_size : int
+            максимальный размер части в байтах
+        archive_name : str
+            имя архива, из которого образуются имена частей
+        """
+
+        super().__init__()
+        self.part_size = part_size
+        self.archive_name = archive_name
+        self.size = 0
+        self.archive_hash = sha256()
+        self.buffer: bytearray | None = bytearray()
+        self.parts_dir: str | None = None
+        self.parts: list[str] = []
+        self.part_file = None
+        self.part_file_size = 0
+
+
+    def writable(self) -> bool:
+        return True
+
+
+    def write(self, data) -> int:
+        data_view = memoryview(data).cast('B')
+        data_size = len(data_view)
+        self.size += data_size
+        self.archive_hash.update(data_view)
+
+        while data_view:
+            if self.buffer is not None:
+                free_space = self.part_size - len(self.buffer)
+                if len(data_view) <= free_space:
+                    self.buffer += data_view
+                    break
+
+                self.buffer += data_view[:free_space]
+                data_view = data_view[free_space:]
+                self.spill_first_part()
+                continue
+
+            if self.part_file_size == self.part_size:
+                self.open_next_part()
+
+            chunk = data_view[:self.part_size - self.part_file_size]
+            self.part_file.write(chunk)
+            self.part_file_size += len(chunk)
+            data_view = data_view[len(chunk):]
+
+        return data_size
+
+
+    def tell(self) -> int:
+        return self.size
+
+
+    def close(self):
+        if self.part_file:
+            self.part_file.close()
+
+        super().close()
+
+
+    def spill_first_part(self):
+        """Записывает заполненную первую часть на диск и переходит к записи частей в файлы."""
+
+        self.parts_dir = tempfile.mkdtemp(prefix='pbo_sender_')
+        self.open_next_part()
+        self.part_file.write(self.buffer)
+        self.part_file_size = len(self.buffer)
+        self.buffer = None
+
+
+    def open_next_part(self):
+        """Закрывает текущую часть и открывает файл следующей."""
+
+        if self.part_file:
+            self.part_file.close()
+
+        part_path = path.join(self.parts_dir, f'{self.archive_name}.{len(self.parts) + 1:03d}')
+        self.parts.append(part_path)
+        self.part_file = open(part_path, 'wb')
+        self.part_file_size = 0
+
+
+    def getvalue(self) -> bytes | None:
+        """Возвращает сжатые данные или None, если архив разрезан на части."""
+
+        return bytes(self.buffer) if self.buffer is not None else None
+
+
+def estimate_compression_ratio(source_path: str) -> float:
+    """Оценивает степень сжатия файла по равномерно распределённым выборкам.\n
+    Выборки сжимаются быстрым DEFLATE, поэтому оценка занимает доли секунды даже для больших файлов.
+
+    Returns
+    -------
+    float
+        отношение размера сжатых выборок к исходному (1.0 - файл не сжимается)
+    """
+
+    file_size = path.getsize(source_path)
+    if not file_size:
+        return 1.0
+
+    samples_count = min(SAMPLES_COUNT, max(1, file_size // SAMPLE_SIZE))
+    step = max(0, file_size - SAMPLE_SIZE) // max(1, samples_count - 1)
+
+    sample_size = 0
+    compressed_size = 0
+
+    with open(source_path, 'rb') as source_file:
+        for index in range(samples_count):
+            source_file.seek(index * step)
+            sample = source_file.read(SAMPLE_SIZE)
+            sample_size += len(sample)
+            compressed_size += len(zlib.compress(sample, 1))
+
+    return compressed_size / sample_size if sample_size else 1.0
+
+
+def choose_method(compression_ratio: float, policy: str = DEFAULT_POLICY) -> str:
+    """Выбирает метод сжатия по оценке степени сжатия и политике.
+
+    Parameters
+    ----------
+    compression_ratio : float
+        оценка из <code>estimate_compression_ratio</code>
+    policy : str
+        fastest - минимум времени, smallest - минимум размера (LZMA открывается не всеми
+        архиваторами), balanced - компромисс
+
+    Returns
+    -------
+    str
+        имя метода из <code>METHODS</code>
+    """
+
+    match policy:
+        case 'fastest':
+            return 'store' if compression_ratio > 0.9 else 'deflate-fast'
+        case 'smallest':
+            return 'store' if compression_ratio > 0.98 else 'lzma'
+        case _:
+            if compression_ratio > 0.95:
+                return 'store'
+            if compression_ratio > 0.8:
+                return 'deflate-fast'
+            if compression_ratio < 0.4:
+                return 'deflate-max'
+            return 'deflate'
+
+
+def compress_file(source_path: str, memory_cap: int, policy: str = DEFAULT_POLICY, split: bool = False) -> dict:
+    """Сжимает файл в ZIP архив в памяти, не создавая временных файлов.\n
+    Метод сжатия выбирается по выборкам из файла согласно политике. В режиме разрезания архив,
+    превышающий <code>memory_cap</code>, записывается частями не больше <code>memory_cap</code>.
+
+    Parameters
+    ----------
+    source_path : str
+        путь к файлу
+    memory_cap : int
+        максимальный размер архива в байтах, который хранится в памяти
+    policy : str
+        политика выбора метода сжатия (fastest, smallest, balanced)
+    split : bool
+        разрезать ли архив, превышающий лимит, на части
+
+    Returns
+    -------
+    dict
+        данные архива: <code>file_name</code>, <code>data</code> (None, если архив больше лимита),
+        <code>parts</code> (пути к частям архива, если он разрезан), <code>archive_sha256</code>
+        (хэш архива целиком, если он разрезан), <code>source_sha256</code> (хэш сжатого содержимого файла),
+        <code>original_size</code> и <code>compressed_size</code> в байтах, <code>method</code>, <code>created_at</code>
+    """
+
+    file_basename = path.basename(source_path)
+    compressed_buffer = SplitBuffer(memory_cap, f'{file_basename}.zip') if split else CompressedBuffer(memory_cap)
+
+    method: str = choose_method(estimate_compression_ratio(source_path), policy)
+    compress_type, compress_level = METHODS[method]
+
+    with ZipFile(compressed_buffer, 'w', compress_type) as archive:
+        zip_info = ZipInfo.from_file(source_path, file_basename)
+        zip_info.compress_type = compress_type
+        zip_info.compress_level = compress_level
+
+        source_hash = sha256()
+
+        with open(source_path, 'rb') as source_file, archive.open(zip_info, 'w') as archive_entry:
+            while chunk := source_file.read(READ_CHUNK_SIZE):
+                source_hash.update(chunk)
+                archive_entry.write(chunk)
+
+    compressed_buffer.close()
+    parts: list[str] = compressed_buffer.parts if split else []
+
+    return {
+        'file_name': file_basename,
+        'data': compressed_buffer.getvalue(),
+        'parts': parts,
+        'archive_sha256': compressed_buffer.archive_hash.hexdigest() if parts else None,
+        'source_sha256': source_hash.hexdigest(),
+        'original_size': zip_info.file_size,
+        'compressed_size': compressed_buffer.size,
+        'method': method,
+        'created_at': datetime.now()
+    }
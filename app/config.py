@@ -0,0 +1,111 @@
+import copy
+import json
+from os import getenv, path
+
+import app.logger as logger
+
+
+CONFIG_FILE_PATH = 'pbo_sender.json'
+
+DEFAULT_USER_CONFIG = {
+    'webhook_url': '',
+    'webhook_urls': [],
+    'webhook_mode': 'balance',
+    'search_folder': f'{getenv('LOCALAPPDATA')}\\Arma 3\\MPMissionsCache',
+    'target_files_prefix': 'UTF',
+    'max_file_size_mb': 8,
+    'check_interval': 60,
+    'discord_admin_id': '',
+    'paranoid_rehash_runs': 0,
+    'hash_workers': 4,
+    'hash_algorithm': 'sha256',
+    'pbo_aware': True,
+    'compress_workers': 2,
+    'compress_executor': 'thread',
+    'compression_policy': 'balanced',
+    'max_pending_uploads': 10,
+    'upload_concurrency': 2,
+    'max_rate_limit_retries': 5,
+    'upload_limit_kbps': 0,
+    'upload_limit_schedule': [],
+    'progress_interval_seconds': 1.0,
+    'retry_base_delay': 60,
+    'retry_max_delay': 3600,
+    'oversized_mode': 'notify',
+    'max_attachments': 10,
+    'batch_linger_seconds': 1.0,
+    'watch_folder': True,
+    'watch_settle_seconds': 5,
+    'manual_run_mode': 'join',
+    'history_retention_days': 365,
+    'history_max_records': 100,
+    'forget_missing_days': 90,
+    'extra_search_folders': [],
+    'include_patterns': [],
+    'exclude_patterns': [],
+    'recursive_scan': True,
+    'log_level': 'INFO',
+    'log_levels': {},
+    'log_format': 'text',
+    'log_rotation': 'size',
+    'log_max_bytes': 5 * 1024 * 1024,
+    'log_rotation_when': 'midnight',
+    'log_backup_count': 5,
+    'metrics_textfile': 'pbo_sender_metrics.prom',
+    'metrics_json': 'pbo_sender_metrics.json',
+    'delta_uploads': False,
+    'delta_store_folder': 'pbo_sender_bases',
+    'delta_store_max_mb': 2048,
+    'delta_max_literal_mb': 8,
+    'archive_cache_folder': 'pbo_sender_archives',
+    'archive_cache_max_mb': 0
+}
+
+
+def read_user_config(file_path: str = CONFIG_FILE_PATH) -> dict:
+    """Считывает данные из конфига пользователя в формате JSON.\n
+    Отсутствующие в файле параметры берутся из <code>DEFAULT_USER_CONFIG</code>. Если файла нет
+    или его не удалось прочитать, возвращается стандартная конфигурация.
+
+    Parameters
+    ----------
+    file_path : str
+        путь к файлу конфигурации
+
+    Returns
+    -------
+    dict
+        конфигурация пользователя
+    """
+
+    config_logger = logger.setup_logging(__name__)
+    config_logger.info('Чтение файла конфигурации...')
+    user_config: dict = copy.deepcopy(DEFAULT_USER_CONFIG)
+
+    try:
+        if not path.exists(file_path):
+            config_logger.warning('Файл конфигурации отсутствует')
+            return user_config
+
+        with open(file_path, 'r', encoding='utf-8') as config_file:
+            user_config.update(json.load(config_file))
+            config_logger.info('Файл конфигурации считан')
+            return user_config
+    except Exception as e:
+        config_logger.error(f'Ошибка при чтении файла конфигурации! Будет загружена стандартная конфигурация. Ошибка:\n{str(e)}')
+        return copy.deepcopy(DEFAULT_USER_CONFIG)
+
+
+def save_user_config(user_config: dict, file_path: str = CONFIG_FILE_PATH):
+    """Записывает данные в файл конфига в формате JSON. Ошибки записи не перехватываются."""
+
+    with open(file_path, 'w', encoding='utf-8') as config_file:
+        json.dump(user_config, config_file, indent=2, ensure_ascii=False)
+
+
+def get_webhook_urls(user_config: dict) -> list[str]:
+    """Возвращает адреса всех Webhook без повторов: <code>webhook_url</code> и список <code>webhook_urls</code>."""
+
+    urls: list[str] = [user_config.get('webhook_url', ''), *user_config.get('webhook_urls', [])]
+
+    return list(dict.fromkeys(url.strip() for url in urls if url and url.strip()))
@@ -0,0 +1,372 @@
+"""Двоичные патчи между версиями файла по алгоритму rsync.
+
+Модуль использует только стандартную библиотеку. Получатель применяет патчи скриптом <code>apply_delta.py</code>,
+который передаётся без остального отправщика, поэтому содержит свою копию применения патча:
+при изменении формата её нужно менять вместе с этим модулем.
+
+Формат патча: <code>MAGIC</code>, длина заголовка (uint32 LE), заголовок JSON и поток zlib с командами:
+<code>C</code> + смещение (uint64 LE) + длина (uint32 LE) - скопировать блок из базовой версии,
+<code>L</code> + длина (uint32 LE) + данные - вставить новые данные.
+"""
+
+import hashlib
+import json
+import math
+import mmap
+import os
+import struct
+import zlib
+
+
+MAGIC = b'PBODLT01'
+DIGEST_ALGORITHM = 'sha256'
+
+MIN_BLOCK_SIZE = 2 * 1024
+MAX_BLOCK_SIZE = 64 * 1024
+MAX_LITERAL_CHUNK = 1024 * 1024
+
+ADLER_MODULUS = 65521
+
+SIMILARITY_SAMPLES = 16
+MIN_SIMILARITY = 0.5
+
+COPY_STRUCT = struct.Struct('<QI')
+LENGTH_STRUCT = struct.Struct('<I')
+
+
+class PatchError(Exception):
+    """Ошибка применения патча: повреждённый патч или не та базовая версия."""
+
+
+def get_block_size(base_size: int) -> int:
+    """Возвращает размер блока для базовой версии указанного размера.\n
+    Как в rsync, блок равен квадратному корню из размера файла, но не меньше 2 KiB и не больше 64 KiB.
+    """
+
+    return min(MAX_BLOCK_SIZE, max(MIN_BLOCK_SIZE, math.isqrt(base_size)))
+
+
+def get_strong_hash(block) -> bytes:
+    return hashlib.blake2b(block, digest_size=16).digest()
+
+
+def make_signature(base_view: memoryview, block_size: int) -> dict[int, dict[bytes, int]]:
+    """Возвращает сигнатуру базовой версии: слабые хэши полных блоков (Adler-32),
+    для каждого из них - сильные хэши блоков и их смещения.
+    """
+
+    signature: dict[int, dict[bytes, int]] = {}
+
+    for offset in range(0, len(base_view) - block_size + 1, block_size):
+        block = base_view[offset:offset + block_size]
+        signature.setdefault(zlib.adler32(block), {}).setdefault(get_strong_hash(block), offset)
+
+    return signature
+
+
+def open_view(file) -> tuple[mmap.mmap | None, memoryview]:
+    """Отображает файл в память. Пустой файл нельзя отобразить, для него возвращается пустой буфер."""
+
+    file.seek(0, 2)
+    if not file.tell():
+        return None, memoryview(b'')
+
+    file_map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    return file_map, memoryview(file_map)
+
+
+class PatchWriter:
+    """Записывает команды патча в сжатый поток и объединяет соседние копирования."""
+
+    def __init__(self):
+        self.compressor = zlib.compressobj(6)
+        self.chunks: list[bytes] = []
+        self.size = 0
+        self.copy_offset = 0
+        self.copy_length = 0
+        self.copied_bytes = 0
+        self.literal_bytes = 0
+
+
+    def copy(self, offset: int, length: int):
+        if self.copy_length and self.copy_offset + self.copy_length == offset:
+            self.copy_length += length
+            return
+
+        self.flush_copy()
+        self.copy_offset = offset
+        self.copy_length = length
+
+
+    def literal(self, data):
+        self.flush_copy()
+
+        for start in range(0, len(data), MAX_LITERAL_CHUNK):
+            chunk = data[start:start + MAX_LITERAL_CHUNK]
+            self.write(b'L' + LENGTH_STRUCT.pack(len(chunk)))
+            self.write(chunk)
+            self.literal_bytes += len(chunk)
+
+
+    def flush_copy(self):
+        if self.copy_length:
+            self.write(b'C' + COPY_STRUCT.pack(self.copy_offset, self.copy_length))
+            self.copied_bytes += self.copy_length
+            self.copy_length = 0
+
+
+    def write(self, data):
+        if compressed := self.compressor.compress(data):
+            self.chunks.append(compressed)
+            self.size += len(compressed)
+
+
+    def finish(self) -> bytes:
+        self.flush_copy()
+        self.chunks.append(self.compressor.flush())
+        return b''.join(self.chunks)
+
+
+def find_block(signature: dict[int, dict[bytes, int]], target_view: memoryview, start: int, stop: int, block_size: int) -> tuple[int, int] | None:
+    """Ищет первое окно новой версии, начинающееся в позициях от <code>start</code> до <code>stop</code>,
+    которое совпадает с блоком базовой версии. Окно сдвигается на байт со скользящим пересчётом Adler-32.
+
+    Returns
+    -------
+    tuple[int, int] | None
+        позиция окна и смещение совпавшего блока в базовой версии или None, если совпадений нет
+    """
+
+    if start > stop:
+        return None
+
+    weak = zlib.adler32(target_view[start:start + block_size])
+    weak_a, weak_b = weak & 0xFFFF, weak >> 16
+    get_candidates = signature.get
+    position = start
+
+    while True:
+        candidates: dict[bytes, int] | None = get_candidates(weak_b << 16 | weak_a)
+        if candidates:
+            offset: int | None = candidates.get(get_strong_hash(target_view[position:position + block_size]))
+            if offset is not None:
+                return position, offset
+
+        if position == stop:
+            return None
+
+        old_byte = target_view[position]
+        weak_a = (weak_a - old_byte + target_view[position + block_size]) % ADLER_MODULUS
+        weak_b = (weak_b - block_size * old_byte + weak_a - 1) % ADLER_MODULUS
+        position += 1
+
+
+def estimate_similarity(signature: dict[int, dict[bytes, int]], target_view: memoryview, block_size: int) -> float:
+    """Оценивает долю новой версии, совпадающую с базовой, по равномерно распределённым выборкам.
+
+    Общий с базовой версией участок длиной от двух блоков содержит блок базовой версии, начинающийся
+    не дальше размера блока от любой своей позиции, поэтому каждая выборка ищет совпадение только на этом отрезке.
+    """
+
+    last_window = len(target_view) - block_size
+    samples_count = min(SIMILARITY_SAMPLES, last_window // block_size + 1)
+    step = last_window // max(1, samples_count - 1)
+    matches_count = 0
+
+    for index in range(samples_count):
+        start = index * step
+        if find_block(signature, target_view, start, min(start + block_size, last_window), block_size):
+            matches_count += 1
+
+    return matches_count / samples_count
+
+
+def create_patch(base_path: str, target_path: str, max_literal_bytes: int, max_patch_bytes: int) -> dict | None:
+    """Создаёт патч, превращающий базовую версию файла в новую.\n
+    Новая версия просматривается окном размера блока со скользящим хэшем Adler-32: совпавшие с базовой
+    версией блоки заменяются командами копирования, остальное передаётся как есть. Сигнатура, слабый и
+    сильный хэши окна считаются <code>zlib</code> и <code>hashlib</code>, а по байтам в Python окно сдвигается
+    только внутри изменённых участков, поэтому неизменённые данные обрабатываются со скоростью хэширования.
+    Если версии почти не похожи (см. <code>estimate_similarity</code>), патч не создаётся сразу.
+
+    Parameters
+    ----------
+    base_path : str
+        путь к базовой (ранее отправленной) версии
+    target_path : str
+        путь к новой версии
+    max_literal_bytes : int
+        максимальный объём новых данных. Если он превышен, патч не создаётся
+    max_patch_bytes : int
+        максимальный размер патча. Если он превышен, патч не создаётся
+
+    Returns
+    -------
+    dict | None
+        <code>data</code> (патч), <code>base_digest</code> и <code>target_digest</code> (SHA256 версий),
+        <code>copied_bytes</code>, <code>literal_bytes</code> или None, если патч не выгоднее полной отправки
+    """
+
+    with open(base_path, 'rb') as base_file, open(target_path, 'rb') as target_file:
+        base_map, base_view = open_view(base_file)
+        target_map, target_view = open_view(target_file)
+
+        try:
+            base_size = len(base_view)
+            target_size = len(target_view)
+            block_size: int = get_block_size(base_size)
+            signature = make_signature(base_view, block_size)
+            writer = PatchWriter()
+
+            position = 0
+            last_window = target_size - block_size
+
+            if signature and last_window >= 0 and estimate_similarity(signature, target_view, block_size) < MIN_SIMILARITY:
+                return None
+
+            while signature and position <= last_window:
+                stop: int = min(last_window, position + max_literal_bytes - writer.literal_bytes)
+                match: tuple[int, int] | None = find_block(signature, target_view, position, stop, block_size)
+
+                if match is None:
+                    if stop < last_window:
+                        return None
+                    break
+
+                match_position, offset = match
+                if position < match_position:
+                    writer.literal(target_view[position:match_position])
+                writer.copy(offset, block_size)
+                position = match_position + block_size
+
+                if writer.size > max_patch_bytes:
+                    return None
+
+            if position < target_size:
+                writer.literal(target_view[position:target_size])
+
+            if writer.literal_bytes > max_literal_bytes:
+                return None
+
+            operations: bytes = writer.finish()
+            header = json.dumps({
+                'algorithm': DIGEST_ALGORITHM,
+                'base_digest': hashlib.new(DIGEST_ALGORITHM, base_view).hexdigest(),
+                'base_size': base_size,
+                'target_digest': hashlib.new(DIGEST_ALGORITHM, target_view).hexdigest(),
+                'target_size': target_size,
+                'block_size': block_size
+            }).encode()
+        finally:
+            base_view.release()
+            target_view.release()
+            for file_map in (base_map, target_map):
+                if file_map is not None:
+                    file_map.close()
+
+    patch_data = MAGIC + LENGTH_STRUCT.pack(len(header)) + header + operations
+    if len(patch_data) > max_patch_bytes:
+        return None
+
+    patch_header: dict = json.loads(header)
+
+    return {
+        'data': patch_data,
+        'base_digest': patch_header['base_digest'],
+        'target_digest': patch_header['target_digest'],
+        'copied_bytes': writer.copied_bytes,
+        'literal_bytes': writer.literal_bytes
+    }
+
+
+def read_patch_header(patch_data: bytes) -> tuple[dict, int]:
+    """Возвращает заголовок патча и смещение потока команд."""
+
+    if patch_data[:len(MAGIC)] != MAGIC:
+        raise PatchError('Файл не является патчем PBO Sender')
+
+    header_start = len(MAGIC) + LENGTH_STRUCT.size
+    (header_length,) = LENGTH_STRUCT.unpack_from(patch_data, len(MAGIC))
+
+    return json.loads(patch_data[header_start:header_start + header_length]), header_start + header_length
+
+
+def apply_patch(base_path: str, patch_data: bytes, output_path: str) -> dict:
+    """Применяет патч к базовой версии и записывает новую версию.\n
+    Базовая версия и результат сверяются с хэшами из заголовка патча. Если результат не совпал,
+    выходной файл удаляется.
+
+    Parameters
+    ----------
+    base_path : str
+        путь к базовой версии
+    patch_data : bytes
+        содержимое патча
+    output_path : str
+        путь к создаваемой новой версии
+
+    Returns
+    -------
+    dict
+        заголовок патча
+
+    Raises
+    ------
+    PatchError
+        если патч повреждён или создан для другой базовой версии
+    """
+
+    header, operations_offset = read_patch_header(patch_data)
+
+    try:
+        operations: bytes = zlib.decompress(patch_data[operations_offset:])
+    except zlib.error as e:
+        raise PatchError(f'Патч повреждён: {str(e)}') from e
+
+    with open(base_path, 'rb') as base_file:
+        base_digest: str = hashlib.file_digest(base_file, header['algorithm']).hexdigest()
+        if base_digest != header['base_digest']:
+            raise PatchError(f'Патч создан для другой версии файла ({header['base_digest'][:12]}, а не {base_digest[:12]})')
+
+        try:
+            with open(output_path, 'wb') as output_file:
+                target_digest: str = write_target(base_file, operations, output_file, header['algorithm'])
+
+            if target_digest != header['target_digest']:
+                raise PatchError('Хэш результата не совпадает с хэшем новой версии из патча')
+        except (PatchError, struct.error) as e:
+            os.remove(output_path)
+            raise e if isinstance(e, PatchError) else PatchError('Патч повреждён: команды обрываются') from e
+
+    return header
+
+
+def write_target(base_file, operations: bytes, output_file, algorithm: str) -> str:
+    """Выполняет команды патча и возвращает хэш записанной новой версии."""
+
+    target_hash = hashlib.new(algorithm)
+    position = 0
+
+    while position < len(operations):
+        operation = operations[position:position + 1]
+
+        if operation == b'C':
+            offset, length = COPY_STRUCT.unpack_from(operations, position + 1)
+            position += 1 + COPY_STRUCT.size
+            base_file.seek(offset)
+            chunk: bytes = base_file.read(length)
+        elif operation == b'L':
+            (length,) = LENGTH_STRUCT.unpack_from(operations, position + 1)
+            position += 1 + LENGTH_STRUCT.size
+            chunk = operations[position:position + length]
+            position += length
+        else:
+            raise PatchError(f'Неизвестная команда патча в позиции {position}')
+
+        if len(chunk) != length:
+            raise PatchError('Патч выходит за пределы базовой версии')
+
+        target_hash.update(chunk)
+        output_file.write(chunk)
+
+    return target_hash.hexdigest()
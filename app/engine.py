@@ -0,0 +1,1684 @@
+import asyncio
+import json
+import shutil
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+from os import path
+from typing import AsyncIterator, Awaitable, Callable
+
+import aiohttp
+
+import app.compression as compression
+import app.config as config
+import app.delta as delta
+import app.fingerprint as fingerprint
+import app.logger as logger
+import app.metrics as metrics
+import app.pbo as pbo
+import app.scanner as scanner
+import app.throttle as throttle
+from app.archivecache import ArchiveCache, ArchiveCacheError
+from app.basestore import BaseStore
+from app.outbox import Outbox
+from app.ratelimit import Webhook, WebhookPool
+from app.store import ManifestStore
+
+
+MESSAGE_MAX_LENGTH = 2000
+MESSAGE_OVERHEAD_BYTES = 64 * 1024
+
+
+class EngineSignal:
+    """Сигнал отправщика без зависимости от Qt.\n
+    Подключённые функции вызываются в потоке отправщика. Интерфейс передаёт их в свой поток сам
+    (см. <code>SenderThread</code>).
+    """
+
+    def __init__(self):
+        self.callbacks: list[Callable] = []
+
+
+    def connect(self, callback: Callable):
+        """Подключает функцию к сигналу."""
+
+        self.callbacks.append(callback)
+
+
+    def emit(self, *args):
+        """Вызывает подключённые функции с указанными аргументами."""
+
+        for callback in self.callbacks:
+            callback(*args)
+
+
+class SenderEngine:
+    """Отправщик файлов: поиск, хэширование, сжатие и отправка без зависимости от Qt.\n
+    Отправщик запускается один раз (<code>run</code>) и работает всё время работы приложения: цикл событий,
+    пул соединений aiohttp и манифесты файлов сохраняются между проверками.
+    Проверки ставятся в очередь методом <code>submit</code>: одновременно выполняется не больше
+    одной проверки, а запросы, поступившие во время неё, объединяются в одну ожидающую.
+    Для однократной проверки используется <code>run_once</code>.
+
+    О ходе работы отправщик сообщает сигналами <code>finished</code> (результат проверки),
+    <code>status_changed</code>, <code>outbox_changed</code> и <code>metrics_ready</code>.
+    """
+
+    def __init__(self, user_config: dict):
+        """Инициализирует новый экземпляр отправщика.
+
+        Parameters
+        ----------
+        user_config : dict
+            конфигурация пользователя
+        """
+
+        self.logger = logger.setup_logging(__name__)
+        self.finished = EngineSignal()
+        self.status_changed = EngineSignal()
+        self.outbox_changed = EngineSignal()
+        self.metrics_ready = EngineSignal()
+        self.loop = asyncio.new_event_loop()
+        self.wakeup = asyncio.Event()
+        self.current_job: dict | None = None
+        self.pending_job: dict | None = None
+        self.stopping = False
+        self.session: aiohttp.ClientSession | None = None
+        self.run_metrics = metrics.RunMetrics()
+        self.STORE_FILE_PATH = 'pbo_sender.db'
+        self.HASH_FILE_PATH = 'pbo_sender_files_hash.json'
+        self.STAT_FILE_PATH = 'pbo_sender_files_stat.json'
+        self.OUTBOX_FILE_PATH = 'pbo_sender_outbox.json'
+        self.user_config = user_config
+        self.hash_algorithm: str = user_config.get('hash_algorithm', fingerprint.DEFAULT_ALGORITHM)
+        if self.hash_algorithm not in fingerprint.ALGORITHMS:
+            self.logger.warning(f'Неизвестный алгоритм хэширования {self.hash_algorithm}. Будет использован {fingerprint.DEFAULT_ALGORITHM}')
+            self.hash_algorithm = fingerprint.DEFAULT_ALGORITHM
+        if user_config.get('pbo_aware', True):
+            self.hash_algorithm = f'{pbo.ALGORITHM_PREFIX}{self.hash_algorithm}'
+
+        self.store = ManifestStore(self.STORE_FILE_PATH)
+        self.store.import_json(self.HASH_FILE_PATH, self.STAT_FILE_PATH, self.OUTBOX_FILE_PATH, fingerprint.LEGACY_ALGORITHM)
+        self.files_hash: dict = self.store.read_digests()
+        self.files_hash_algorithm: str = self.store.get_meta('algorithm', self.hash_algorithm)
+        self.files_stat = {'runs': int(self.store.get_meta('runs', 0)), 'files': self.store.read_stats()}
+        self.files_entries: dict[str, dict] = self.store.read_entries()
+        self.full_rehash = False
+        self.webhook_mode: str = user_config.get('webhook_mode', 'balance')
+        if self.webhook_mode not in ('balance', 'fanout'):
+            self.logger.warning(f'Неизвестный режим Webhook {self.webhook_mode}. Будет использован balance')
+            self.webhook_mode = 'balance'
+        self.webhook_pool = WebhookPool([], user_config.get('upload_concurrency', 2))
+        self.fanout = False
+        self.deliveries: dict[str, dict[str, str]] = self.store.read_deliveries()
+        self.update_webhooks()
+        self.bandwidth_limiter: throttle.BandwidthLimiter | None = throttle.BandwidthLimiter(
+            user_config.get('upload_limit_kbps', 0),
+            user_config.get('upload_limit_schedule', [])
+        )
+        if not self.bandwidth_limiter.is_enabled():
+            self.bandwidth_limiter = None
+        self.outbox = Outbox(
+            self.store,
+            user_config.get('retry_base_delay', 60),
+            user_config.get('retry_max_delay', 3600)
+        )
+        self.base_store: BaseStore | None = None
+        if user_config.get('delta_uploads', False):
+            self.base_store = BaseStore(
+                self.store,
+                user_config.get('delta_store_folder', 'pbo_sender_bases'),
+                int(user_config.get('delta_store_max_mb', 2048) * 1024 * 1024)
+            )
+        self.archive_cache: ArchiveCache | None = None
+        if user_config.get('archive_cache_max_mb', 0) > 0:
+            self.archive_cache = ArchiveCache(
+                self.store,
+                user_config.get('archive_cache_folder', 'pbo_sender_archives'),
+                int(user_config.get('archive_cache_max_mb', 0) * 1024 * 1024)
+            )
+
+
+    def run(self, check_interval: float = 0):
+        """Выполняет проверки из очереди, пока отправщик не будет остановлен методом <code>stop</code>.
+
+        Parameters
+        ----------
+        check_interval : float
+            интервал автоматической проверки всей папки в секундах (0 - только по запросу <code>submit</code>)
+        """
+
+        asyncio.set_event_loop(self.loop)
+
+        try:
+            self.loop.run_until_complete(self.serve(check_interval))
+        except Exception as e:
+            self.logger.error(f'Критическая ошибка процесса отправщика: {str(e)}')
+        finally:
+            self.loop.close()
+            self.store.close()
+
+
+    def run_once(self, files: list[str] | None = None) -> dict:
+        """Выполняет одну проверку и завершает работу отправщика.
+
+        Parameters
+        ----------
+        files : list[str] | None
+            имена файлов для проверки. Если не указаны, проверяется вся папка
+
+        Returns
+        -------
+        dict
+            результат проверки, как в сигнале <code>finished</code>
+        """
+
+        asyncio.set_event_loop(self.loop)
+
+        try:
+            return self.loop.run_until_complete(self.run_single_job(files))
+        finally:
+            self.loop.close()
+            self.store.close()
+
+
+    def submit(self, files: list[str] | None = None, manual: bool = False):
+        """Ставит проверку в очередь отправщика. Может вызываться из любого потока.
+
+        Parameters
+        ----------
+        files : list[str] | None
+            имена файлов для проверки. Если не указаны, проверяется вся папка
+        manual : bool
+            запрошена ли проверка пользователем (см. <code>schedule_job</code>)
+        """
+
+        self.loop.call_soon_threadsafe(self.schedule_job, files, manual)
+
+
+    def cancel(self):
+        """Отменяет текущую и ожидающую проверки. Может вызываться из любого потока."""
+
+        self.loop.call_soon_threadsafe(self.cancel_jobs)
+
+
+    def stop(self):
+        """Отменяет проверки и завершает работу отправщика. Может вызываться из любого потока."""
+
+        self.loop.call_soon_threadsafe(self.stop_jobs)
+
+
+    def schedule_job(self, files: list[str] | None, manual: bool):
+        """Добавляет запрос проверки в ожидающую проверку.\n
+        Проверка всей папки поглощает проверки отдельных файлов, а списки файлов объединяются.
+        Ручная проверка всей папки во время такой же текущей проверки присоединяется к ней
+        (<code>manual_run_mode</code> join) или прерывает её и начинается заново (preempt).
+        Проверка отдельных файлов прерывается ручной проверкой в любом режиме.
+        """
+
+        current_job: dict | None = self.current_job
+
+        if manual and files is None and current_job is not None:
+            if current_job['files'] is None and self.user_config.get('manual_run_mode', 'join') == 'join':
+                self.logger.info('Ручная проверка присоединена к текущей проверке папки')
+                return
+
+            self.logger.info('Текущая проверка прервана ручной проверкой')
+            current_job['task'].cancel()
+
+        if self.pending_job is None:
+            self.pending_job = {'files': None if files is None else set(files)}
+        elif files is None or self.pending_job['files'] is None:
+            self.pending_job['files'] = None
+        else:
+            self.pending_job['files'].update(files)
+
+        if current_job is not None:
+            self.logger.info('Проверка отложена до завершения текущей')
+
+        self.wakeup.set()
+
+
+    def cancel_jobs(self):
+        """Отменяет текущую проверку и сбрасывает ожидающую.\n
+        Об отмене сообщается одним сигналом <code>finished</code>: для текущей проверки - после её остановки
+        (см. <code>serve</code>), для ожидающей без текущей - сразу.
+        """
+
+        pending_job: dict | None = self.pending_job
+        self.pending_job = None
+
+        if self.current_job is not None:
+            self.logger.info('Отмена текущей проверки...')
+            self.current_job['task'].cancel()
+        elif pending_job is not None:
+            self.logger.info('Проверка отменена')
+            self.finished.emit(self.get_cancelled_result())
+
+
+    def get_cancelled_result(self) -> dict:
+        """Возвращает результат отменённой проверки для <code>finished</code>."""
+
+        return {'successful': False, 'message': 'Проверка отменена'}
+
+
+    def stop_jobs(self):
+        """Отменяет проверки и завершает цикл обработки проверок."""
+
+        self.stopping = True
+        self.cancel_jobs()
+        self.wakeup.set()
+
+
+    def create_session(self) -> aiohttp.ClientSession:
+        """Создаёт сессию aiohttp с кэшем DNS и постоянными соединениями."""
+
+        connector = aiohttp.TCPConnector(
+            ttl_dns_cache=self.user_config.get('dns_cache_seconds', 300),
+            keepalive_timeout=self.user_config.get('keepalive_seconds', 60)
+        )
+
+        return aiohttp.ClientSession(connector=connector)
+
+
+    async def run_single_job(self, files: list[str] | None) -> dict:
+        """Выполняет одну проверку в отдельной сессии и возвращает её результат."""
+
+        async with self.create_session() as self.session:
+            result: dict = await self.run_job(files)
+
+        self.finished.emit(result)
+        return result
+
+
+    async def schedule_checks(self, check_interval: float):
+        """Ставит проверку всей папки в очередь каждые <code>check_interval</code> секунд, начиная с запуска."""
+
+        while True:
+            self.schedule_job(None, False)
+            await asyncio.sleep(check_interval)
+
+
+    async def serve(self, check_interval: float = 0):
+        """Выполняет проверки по одной, используя общий пул соединений, пока отправщик не будет остановлен."""
+
+        schedule_task: asyncio.Task | None = asyncio.create_task(self.schedule_checks(check_interval)) if check_interval > 0 else None
+
+        async with self.create_session() as self.session:
+            while not self.stopping:
+                if self.pending_job is None:
+                    await self.wakeup.wait()
+                    self.wakeup.clear()
+                    continue
+
+                files: set[str] | None = self.pending_job['files']
+                self.pending_job = None
+
+                task = asyncio.create_task(self.run_job(None if files is None else sorted(files)))
+                self.current_job = {'files': files, 'task': task}
+
+                try:
+                    result: dict = await task
+                except asyncio.CancelledError:
+                    if asyncio.current_task().cancelling():
+                        raise
+
+                    self.logger.info('Проверка отменена')
+                    result = self.get_cancelled_result()
+                finally:
+                    self.current_job = None
+
+                self.finished.emit(result)
+
+        if schedule_task:
+            schedule_task.cancel()
+
+        self.logger.info('Процесс отправщика остановлен')
+
+
+    def update_webhooks(self):
+        """Обновляет список Webhook из конфигурации (адрес может измениться в интерфейсе).\n
+        В режиме <code>balance</code> каждое сообщение отправляется в один Webhook, в режиме <code>fanout</code> - во все.
+        """
+
+        self.webhook_pool.update(config.get_webhook_urls(self.user_config))
+        self.fanout = self.webhook_mode == 'fanout' and len(self.webhook_pool.webhooks) > 1
+
+
+    async def run_job(self, files: list[str] | None) -> dict:
+        """Выполняет одну проверку и возвращает её результат для <code>finished</code>.
+        Метрики проверки публикуются и при её отмене (см. <code>publish_metrics</code>).
+        """
+
+        self.update_webhooks()
+        self.run_metrics = metrics.RunMetrics(self.webhook_pool.total_wait)
+
+        try:
+            result = await self.async_find_and_send_files(files)
+            self.run_metrics.outcome = str(result)
+
+            match result:
+                case 'success':
+                    return {'successful': True, 'message': 'Файлы успешно отправлены'}
+                case 'no_files':
+                    return {'successful': True, 'message': 'Нет новых файлов для отправки'}
+                case 'partial':
+                    return {'successful': False, 'message': 'Часть файлов не отправлена и будет отправлена повторно'}
+                case _:
+                    return {'successful': False, 'message': f'Ошибка при отправке файлов. {str(result)}'}
+        except Exception as e:
+            self.run_metrics.outcome = 'error'
+            self.logger.error(f'Критическая ошибка: {str(e)}')
+            return {'successful': False, 'message': f'Критическая ошибка: {str(e)}'}
+        finally:
+            self.publish_metrics()
+
+
+    def publish_metrics(self):
+        """Отправляет метрики проверки сигналом <code>metrics_ready</code> и записывает их
+        в текстовый файл Prometheus (<code>metrics_textfile</code>) и сводку JSON (<code>metrics_json</code>).
+        Пустой путь отключает запись файла.
+        """
+
+        summary: dict = self.run_metrics.finish(self.webhook_pool.total_wait)
+        self.logger.info(f'Метрики проверки: {metrics.format_summary(summary)}')
+        self.metrics_ready.emit(summary)
+
+        try:
+            if textfile_path := self.user_config.get('metrics_textfile', 'pbo_sender_metrics.prom'):
+                metrics.write_prometheus_textfile(textfile_path, summary)
+            if json_path := self.user_config.get('metrics_json', 'pbo_sender_metrics.json'):
+                metrics.write_json_summary(json_path, summary)
+        except OSError as e:
+            self.logger.error(f'Ошибка сохранения метрик: {str(e)}')
+
+
+    async def async_find_and_send_files(self, files: list[str] | None = None) -> str:
+        """Запускает процесс поиска и отправки файлов.\n
+        Хэширование, сжатие и отправка работают одновременно как конвейер, связанный очередями:
+        первый изменённый файл отправляется, пока остальные ещё хэшируются и сжимаются.
+
+        Parameters
+        ----------
+        files : list[str] | None
+            имена файлов для проверки. Если не указаны, проверяется вся папка
+        """
+
+        self.logger.info('Начат процесс поиска и отправки файлов')
+        self.outbox_changed.emit(len(self.outbox))
+
+        file_scanner: scanner.FileScanner = scanner.create_scanner(self.user_config)
+        scan_started_at = time.perf_counter()
+
+        if files is None:
+            self.logger.info('Поиск нужных файлов...')
+            pbo_files: dict[str, tuple[str, dict]] = await asyncio.to_thread(file_scanner.scan)
+            self.logger.info(file_scanner.get_summary())
+            self.store.touch_files(list(pbo_files))
+        else:
+            self.logger.info(f'Проверка изменённых файлов: {len(files)}')
+            pbo_files: dict[str, tuple[str, dict]] = await asyncio.to_thread(file_scanner.resolve, files)
+
+        self.run_metrics.add('scan_seconds', time.perf_counter() - scan_started_at)
+        self.run_metrics.add('files_scanned', len(pbo_files))
+
+        self.status_changed.emit('Сравнение файлов...')
+        self.logger.info(f'Начато сравнение файлов через {self.hash_algorithm}')
+
+        candidate_files: dict[str, tuple[str, dict]] = await asyncio.to_thread(self.get_hash_candidates, pbo_files, files is None)
+        self.logger.info(f'Файлов для хэширования: {len(candidate_files)}')
+
+        hash_queue = asyncio.Queue()
+        zip_queue = asyncio.Queue()
+        upload_queue = asyncio.Queue()
+
+        for file_name, (file_path, file_stat) in candidate_files.items():
+            hash_queue.put_nowait((file_name, file_path, file_stat))
+        hash_queue.shutdown()
+
+        hash_workers: int = max(1, self.user_config.get('hash_workers', 4))
+        compress_workers: int = max(1, self.user_config.get('compress_workers', 2))
+
+        self.changed_files_count = 0
+        self.failed_files_count = 0
+        self.hashed_files: set[str] = set()
+        self.upload_slots = asyncio.Semaphore(max(1, self.user_config.get('max_pending_uploads', 10)))
+
+        hash_executor = ThreadPoolExecutor(max_workers=hash_workers, thread_name_prefix='pbo_hash')
+        compress_executor: Executor = self.create_compress_executor()
+
+        try:
+            async with asyncio.TaskGroup() as task_group:
+                task_group.create_task(self.run_stage(hash_workers, lambda: self.hash_worker(hash_queue, zip_queue, hash_executor), zip_queue))
+                task_group.create_task(self.run_stage(compress_workers, lambda: self.compress_worker(zip_queue, upload_queue, compress_executor), upload_queue))
+                batch_linger: float = self.user_config.get('batch_linger_seconds', 1.0)
+                send_task = task_group.create_task(self.send_files(self.session, self.iter_queue_batches(upload_queue, batch_linger)))
+        except asyncio.CancelledError:
+            self.discard_queued_archives(upload_queue)
+            raise
+        finally:
+            hash_executor.shutdown(wait=False, cancel_futures=True)
+            compress_executor.shutdown(wait=False, cancel_futures=True)
+            self.store.set_meta('runs', self.files_stat['runs'])
+            if self.base_store:
+                self.base_store.clear_staging()
+
+        if files is None and self.files_hash_algorithm != self.hash_algorithm:
+            self.finish_migration(pbo_files)
+
+        if files is None:
+            self.prune_store()
+
+        if not self.changed_files_count:
+            self.logger.info('Нет новых файлов для отправки')
+            return 'no_files'
+
+        self.logger.info(f'Найдено новых файлов для отправки: {self.changed_files_count}')
+
+        if not send_task.result() or self.failed_files_count == self.changed_files_count:
+            return 'error'
+
+        if self.failed_files_count:
+            self.logger.warning(f'Не отправлено файлов: {self.failed_files_count}. Они остаются в очереди отправки')
+            return 'partial'
+
+        self.logger.info('Файлы отправлены')
+
+        return 'success'
+
+
+    def finish_migration(self, pbo_files: dict[str, tuple[str, dict]]):
+        """Завершает перевод манифеста на новый алгоритм после проверки всей папки.\n
+        Манифест переводится, только если каждый найденный файл с отпечатком в манифесте был успешно
+        хэширован обоими алгоритмами (см. <code>check_file_hash</code>). Иначе отпечатки прежнего алгоритма
+        остались бы с меткой нового и неизменённые файлы были бы отправлены повторно. Проверка части файлов
+        (по изменениям в папке) манифест не переводит.
+        """
+
+        pending_files: list[str] = [file_name for file_name in pbo_files if file_name in self.files_hash and file_name not in self.hashed_files]
+        if pending_files:
+            self.logger.warning(f'Перевод манифеста на {self.hash_algorithm} отложен: не хэшировано файлов {len(pending_files)}')
+            return
+
+        self.files_hash_algorithm = self.hash_algorithm
+        self.store.set_meta('algorithm', self.files_hash_algorithm)
+        self.logger.info(f'Манифест хэшей переведён на {self.hash_algorithm}')
+
+
+    async def run_stage(self, workers_count: int, worker: Callable[[], Awaitable], output_queue: asyncio.Queue):
+        """Запускает обработчики этапа конвейера и закрывает выходную очередь после их завершения.
+
+        Parameters
+        ----------
+        workers_count : int
+            количество одновременно работающих обработчиков
+        worker : Callable[[], Awaitable]
+            функция, создающая обработчик
+        output_queue : Queue
+            очередь, в которую этап передаёт результаты
+        """
+
+        try:
+            async with asyncio.TaskGroup() as task_group:
+                for _ in range(workers_count):
+                    task_group.create_task(worker())
+        finally:
+            output_queue.shutdown()
+
+
+    async def hash_worker(self, hash_queue: asyncio.Queue, zip_queue: asyncio.Queue, executor: Executor):
+        """Обработчик этапа хэширования. Передаёт изменённые файлы на этап сжатия вместе с их записями PBO
+        и списком изменённых с прошлой отправки записей. Если включён кэш архивов, за тот же проход
+        вычисляется SHA256 файла целиком - ключ кэша (см. <code>read_cached_archive</code>).
+        """
+
+        loop = asyncio.get_running_loop()
+        algorithms: tuple[str, ...] = self.get_hash_algorithms()
+        if self.archive_cache is not None and 'sha256' not in algorithms:
+            algorithms += ('sha256',)
+
+        while True:
+            try:
+                file_name, file_path, file_stat = await hash_queue.get()
+            except asyncio.QueueShutDown:
+                return
+
+            hash_started_at = time.perf_counter()
+
+            try:
+                current_hash, entries, hashed_bytes = await loop.run_in_executor(executor, self.fingerprint_file, file_name, file_path, algorithms)
+            except Exception as e:
+                self.logger.error(f'Ошибка при хэшировании файла {file_name}! Ошибка:\n{str(e)}')
+                continue
+
+            self.run_metrics.record_hash(file_name, hashed_bytes, time.perf_counter() - hash_started_at)
+
+            if not self.check_file_hash(file_name, current_hash, entries):
+                self.save_file_stat(file_name, file_stat)
+                continue
+
+            digest: str = current_hash[self.hash_algorithm]
+            if self.outbox.is_waiting(file_name, digest):
+                self.save_file_stat(file_name, file_stat)
+                self.logger.info(f'Файл {file_name} ожидает повторной отправки')
+                continue
+
+            self.outbox.add(file_name, digest)
+            self.save_file_stat(file_name, file_stat)
+            self.outbox_changed.emit(len(self.outbox))
+
+            changes: dict[str, list[str]] | None = pbo.compare_entries(self.files_entries.get(file_name), entries) if entries else None
+            if changes:
+                self.logger.info(f'Изменённые записи {file_name}: {pbo.format_changes(changes, 20)}')
+
+            self.changed_files_count += 1
+            self.status_changed.emit(f'Сжатие {file_name}...')
+            await zip_queue.put((file_name, file_path, digest, current_hash.get('sha256'), entries, changes))
+
+
+    def save_file_stat(self, file_name: str, file_stat: dict):
+        """Запоминает метаданные хэшированного файла.\n
+        Вызывается только после записи изменённого файла в очередь отправки: если работа прервётся раньше,
+        по старым метаданным файл будет хэширован и поставлен в очередь заново.
+        """
+
+        self.files_stat['files'][file_name] = file_stat
+        self.store.set_stat(file_name, file_stat)
+
+
+    async def compress_worker(self, zip_queue: asyncio.Queue, upload_queue: asyncio.Queue, executor: Executor):
+        """Обработчик этапа сжатия. Передаёт готовые архивы на этап отправки.\n
+        Перед сжатием занимает место в <code>upload_slots</code>, поэтому ожидающих отправки
+        архивов в памяти не больше <code>max_pending_uploads</code>. При <code>delta_uploads</code>
+        вместо архива может быть передан патч (см. <code>prepare_delta</code>). Ранее созданный архив
+        того же содержимого берётся из кэша (см. <code>read_cached_archive</code>).
+        """
+
+        memory_cap: int = self.get_attachments_limit()
+        policy: str = self.user_config.get('compression_policy', compression.DEFAULT_POLICY)
+        split: bool = self.user_config.get('oversized_mode', 'notify') == 'split'
+        cache_settings: dict = {'policy': policy, 'split': split, 'part_size': memory_cap if split else None}
+
+        while True:
+            try:
+                file_name, file_path, digest, source_digest, entries, changes = await zip_queue.get()
+            except asyncio.QueueShutDown:
+                return
+
+            await self.upload_slots.acquire()
+
+            compress_started_at = time.perf_counter()
+
+            try:
+                staged_path, staged_digest, zip_result = await self.prepare_delta(file_name, file_path, executor, memory_cap)
+            except OSError as e:
+                self.upload_slots.release()
+                self.logger.error(f'Ошибка при копировании файла {file_name} в хранилище версий. Ошибка:\n{str(e)}')
+                self.fail_file(file_name, str(e))
+                continue
+
+            if zip_result is None:
+                zip_result = await self.read_cached_archive(file_name, staged_path or file_path, staged_digest or source_digest, cache_settings)
+                if zip_result is not None:
+                    self.run_metrics.add('files_cached')
+            else:
+                self.run_metrics.add('files_delta')
+
+            if zip_result is None:
+                compress_future = executor.submit(compression.compress_file, staged_path or file_path, memory_cap, policy, split)
+
+                try:
+                    zip_result = await asyncio.wrap_future(compress_future)
+                except asyncio.CancelledError:
+                    compress_future.add_done_callback(self.discard_compress_future)
+                    raise
+                except Exception as e:
+                    self.upload_slots.release()
+                    self.logger.error(f'Ошибка при создании ZIP архива для {file_name}. Ошибка:\n{str(e)}')
+                    self.fail_file(file_name, str(e))
+                    continue
+
+                await self.save_cached_archive(file_name, zip_result, cache_settings)
+
+            zip_result['file_name'] = file_name
+            zip_result['digest'] = digest
+            zip_result['staged_path'] = staged_path
+            zip_result['staged_digest'] = staged_digest
+            zip_result['entries'] = entries
+            zip_result['changes'] = changes
+            zip_result.setdefault('attachment_name', f'{path.basename(file_name)}.zip')
+            self.run_metrics.record_compress(
+                file_name, zip_result['original_size'], zip_result['compressed_size'], zip_result['method'],
+                time.perf_counter() - compress_started_at
+            )
+            await upload_queue.put(self.log_zip_result(zip_result))
+
+
+    async def read_cached_archive(self, file_name: str, source_path: str, source_digest: str | None, settings: dict) -> dict | None:
+        """Возвращает архив файла из кэша (см. <code>ArchiveCache</code>) или None, если его нужно сжать.\n
+        Ключ кэша строится по SHA256 файла целиком: отпечаток содержимого PBO для этого не подходит,
+        так как не учитывает время изменения записей. SHA256 вычисляется на этапе хэширования
+        (или при копировании в хранилище версий при <code>delta_uploads</code>), поэтому файл для поиска
+        в кэше не читается. Повреждённый архив удаляется из кэша.
+
+        Parameters
+        ----------
+        file_name : str
+            имя файла
+        source_path : str
+            путь к сжимаемому файлу
+        source_digest : str | None
+            SHA256 содержимого. Если он неизвестен, кэш не используется
+        settings : dict
+            настройки сжатия, от которых зависит архив
+        """
+
+        if self.archive_cache is None or source_digest is None:
+            return None
+
+        cache_key: str = self.archive_cache.get_key(source_digest, path.basename(source_path), settings)
+        archive: dict | None = self.archive_cache.get(cache_key)
+        if archive is None:
+            return None
+
+        try:
+            zip_result: dict = await asyncio.to_thread(self.archive_cache.read, cache_key, archive)
+        except ArchiveCacheError as e:
+            self.logger.warning(f'Архив {file_name} в кэше повреждён и удалён: {str(e)}')
+            self.archive_cache.remove(cache_key)
+            return None
+
+        self.logger.info(f'Архив {file_name} взят из кэша без сжатия')
+
+        return zip_result
+
+
+    async def save_cached_archive(self, file_name: str, zip_result: dict, settings: dict):
+        """Сохраняет созданный архив в кэш по SHA256 фактически сжатого содержимого.
+        Архив больше лимита, не разрезанный на части, не сохраняется. Ошибки записи только записываются в журнал.
+        """
+
+        if self.archive_cache is None or (zip_result['data'] is None and not zip_result['parts']):
+            return
+
+        cache_key: str = self.archive_cache.get_key(zip_result['source_sha256'], zip_result['file_name'], settings)
+        if cache_key in self.archive_cache.archives:
+            return
+
+        try:
+            archive: dict = await asyncio.to_thread(self.archive_cache.write, cache_key, zip_result)
+        except OSError as e:
+            self.logger.warning(f'Не удалось сохранить архив {file_name} в кэш: {str(e)}')
+            return
+
+        self.archive_cache.save(cache_key, archive)
+
+
+    async def prepare_delta(self, file_name: str, file_path: str, executor: Executor, memory_cap: int) -> tuple[str | None, str | None, dict | None]:
+        """Копирует файл в хранилище версий и создаёт патч относительно последней отправленной версии.\n
+        Патч отправляется вместо архива, только если он меньше оценки размера архива
+        (см. <code>compression.estimate_compression_ratio</code>) и помещается в сообщение.
+        Объём новых данных в патче ограничен <code>delta_max_literal_mb</code>. В режиме <code>balance</code> патч
+        создаётся, только если известен Webhook, получивший прошлую версию (см. <code>get_base_webhook</code>):
+        патч отправляется туда же.
+
+        Parameters
+        ----------
+        file_name : str
+            имя файла
+        file_path : str
+            путь к файлу
+        executor : Executor
+            пул, в котором создаётся патч
+        memory_cap : int
+            максимальный размер патча в байтах
+
+        Returns
+        -------
+        tuple[str | None, str | None, dict | None]
+            путь к копии файла и её SHA256 (None без <code>delta_uploads</code>) и данные патча
+            в формате <code>compression.compress_file</code> или None, если файл отправляется целиком
+        """
+
+        if self.base_store is None:
+            return None, None, None
+
+        staged_path, staged_digest = await asyncio.to_thread(self.base_store.stage, file_path)
+
+        base: dict | None = self.base_store.get(file_name)
+        if base is None:
+            return staged_path, staged_digest, None
+
+        base_webhook: Webhook | None = None if self.fanout else self.get_base_webhook(file_name)
+        if not self.fanout and base_webhook is None:
+            self.logger.info(f'Неизвестно, в какой Webhook отправлена прошлая версия {file_name}, файл будет отправлен целиком')
+            return staged_path, staged_digest, None
+
+        max_literal_bytes = int(self.user_config.get('delta_max_literal_mb', 8) * 1024 * 1024)
+
+        try:
+            patch: dict | None = await asyncio.wrap_future(executor.submit(delta.create_patch, base['path'], staged_path, max_literal_bytes, memory_cap))
+            compression_ratio: float = await asyncio.to_thread(compression.estimate_compression_ratio, staged_path)
+        except Exception as e:
+            self.logger.warning(f'Не удалось создать патч для {file_name}: {str(e)}')
+            return staged_path, staged_digest, None
+
+        if patch is None:
+            self.logger.info(f'Файл {file_name} сильно изменился и будет отправлен целиком')
+            return staged_path, staged_digest, None
+
+        if patch['base_digest'] != base['digest']:
+            self.logger.warning(f'Сохранённая версия файла {file_name} повреждена и удалена')
+            self.base_store.remove(file_name)
+            return staged_path, staged_digest, None
+
+        original_size: int = path.getsize(staged_path)
+        if len(patch['data']) >= original_size * compression_ratio:
+            self.logger.info(f'Патч для {file_name} не меньше архива, файл будет отправлен целиком')
+            return staged_path, staged_digest, None
+
+        return staged_path, staged_digest, {
+            'data': patch['data'],
+            'parts': [],
+            'archive_sha256': None,
+            'original_size': original_size,
+            'compressed_size': len(patch['data']),
+            'method': 'delta',
+            'created_at': datetime.now(),
+            'attachment_name': f'{path.basename(file_name)}.pbodelta',
+            'base_digest': base['digest'],
+            'webhook_id': base_webhook.id if base_webhook else None
+        }
+
+
+    async def iter_queue_batches(self, queue: asyncio.Queue, linger: float) -> AsyncIterator[list]:
+        """Возвращает элементы очереди группами до её закрытия.\n
+        В группу попадает первый элемент и всё, что поступило в течение <code>linger</code> секунд после него.
+        """
+
+        loop = asyncio.get_running_loop()
+
+        while True:
+            try:
+                batch: list = [await queue.get()]
+            except asyncio.QueueShutDown:
+                return
+
+            deadline: float = loop.time() + linger
+
+            while True:
+                try:
+                    timeout: float = deadline - loop.time()
+                    if timeout <= 0:
+                        batch.append(queue.get_nowait())
+                    else:
+                        batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except (asyncio.QueueEmpty, asyncio.QueueShutDown, TimeoutError):
+                    break
+
+            yield batch
+
+
+    async def send_files(self, session, files_batches: AsyncIterator[list[dict]]) -> int:
+        """Отправляет файлы используя Discord Webhook по мере их готовности.\n
+        Небольшие архивы, готовые одновременно, упаковываются в общие сообщения (см. <code>pack_batches</code>).
+
+        Parameters
+        ----------
+        session : ClientSession
+            сессия aiohttp
+        files_batches : AsyncIterator[list[dict]]
+            группы данных о сжатых файлах в порядке готовности
+
+        Returns
+        -------
+        int
+            количество обработанных архивов
+        """
+
+        send_tasks = []
+        oversized_files = []
+        files_count = 0
+
+        try:
+            async for ready_files in files_batches:
+                small_files: list[dict] = []
+
+                for file_data in ready_files:
+                    files_count += 1
+                    file_name: str = file_data['file_name']
+
+                    if file_data['parts']:
+                        self.logger.info(f'Файл {file_name} разрезан на части: {len(file_data['parts'])}')
+                        send_task = asyncio.create_task(self.send_file_parts(session, file_data))
+                        send_task.add_done_callback(lambda _: self.release_upload_slots(1))
+                        send_tasks.append(send_task)
+                        continue
+
+                    if file_data['compressed_bytes'] > self.get_attachments_limit():
+                        self.status_changed.emit(f'Пропуск {file_name} (большой размер)')
+                        self.logger.info(f'Пропуск отправки файла {file_name}. Превышает допустимый размер')
+                        oversized_files.append(file_data)
+                        self.release_upload_slots(1)
+                        continue
+
+                    small_files.append(file_data)
+
+                for batch in (batch for files_group in self.group_by_webhooks(small_files) for batch in self.pack_batches(files_group)):
+                    if len(batch) == 1:
+                        send_task = asyncio.create_task(self.send_file(session, batch[0]))
+                        self.status_changed.emit(f'Отправка {batch[0]['file_name']}...')
+                    else:
+                        send_task = asyncio.create_task(self.send_batch(session, batch))
+                        self.status_changed.emit(f'Отправка {len(batch)} файлов одним сообщением...')
+
+                    send_task.add_done_callback(lambda _, batch_size=len(batch): self.release_upload_slots(batch_size))
+                    send_tasks.append(send_task)
+
+            if oversized_files:
+                admin_id: str = self.user_config['discord_admin_id']
+
+                send_message_task = asyncio.create_task(self.send_message_about_oversized_files(session, admin_id, oversized_files))
+                send_tasks.append(send_message_task)
+
+            if send_tasks:
+                await asyncio.gather(*send_tasks, return_exceptions=False)
+        except asyncio.CancelledError:
+            for send_task in send_tasks:
+                send_task.cancel()
+            raise
+
+        return files_count
+
+
+    def group_by_webhooks(self, files_data: list[dict]) -> list[list[dict]]:
+        """Группирует архивы по набору Webhook, куда их ещё нужно доставить (см. <code>get_pending_webhooks</code>),
+        чтобы сообщение с несколькими файлами не отправлялось повторно туда, где часть из них уже есть.
+        В режиме <code>balance</code> группирует патчи по Webhook их базовых версий, а архивы возвращает одной группой.
+        """
+
+        if not self.fanout:
+            balance_groups: dict[str | None, list[dict]] = {}
+            for file_data in files_data:
+                balance_groups.setdefault(file_data.get('webhook_id'), []).append(file_data)
+
+            return list(balance_groups.values())
+
+        files_groups: dict[tuple[str, ...], list[dict]] = {}
+        for file_data in files_data:
+            webhooks_ids = tuple(webhook.id for webhook in self.get_pending_webhooks(file_data))
+            files_groups.setdefault(webhooks_ids, []).append(file_data)
+
+        return list(files_groups.values())
+
+
+    def pack_batches(self, files_data: list[dict]) -> list[list[dict]]:
+        """Упаковывает архивы в группы для отправки одним сообщением.\n
+        Использует упаковку "первый подходящий по убыванию размера": в группе не больше
+        <code>max_attachments</code> файлов (1 - отключить группировку), а их общий размер
+        не превышает <code>get_attachments_limit</code>.
+
+        Parameters
+        ----------
+        files_data : list[dict]
+            данные о сжатых файлах
+
+        Returns
+        -------
+        list[list[dict]]
+            группы файлов
+        """
+
+        max_count: int = max(1, min(self.user_config.get('max_attachments', 10), 10))
+        max_size: int = self.get_attachments_limit()
+
+        batches: list[list[dict]] = []
+        batches_sizes: list[int] = []
+
+        for file_data in sorted(files_data, key=lambda file_data: file_data['compressed_bytes'], reverse=True):
+            file_size: int = file_data['compressed_bytes']
+
+            for index, batch in enumerate(batches):
+                if len(batch) < max_count and batches_sizes[index] + file_size <= max_size:
+                    batch.append(file_data)
+                    batches_sizes[index] += file_size
+                    break
+            else:
+                batches.append([file_data])
+                batches_sizes.append(file_size)
+
+        return batches
+
+
+    def get_attachments_limit(self) -> int:
+        """Возвращает максимальный общий размер вложений одного сообщения в байтах.\n
+        Лимит <code>max_file_size_mb</code> относится ко всему запросу, поэтому из него вычитается запас
+        <code>MESSAGE_OVERHEAD_BYTES</code> на разметку multipart и <code>payload_json</code> (текст не длиннее
+        <code>MESSAGE_MAX_LENGTH</code> символов и заголовки вложений).
+        """
+
+        max_size = int(self.user_config['max_file_size_mb'] * 1024 * 1024)
+
+        return max(max_size - MESSAGE_OVERHEAD_BYTES, max_size // 2)
+
+
+    def release_upload_slots(self, count: int):
+        """Освобождает места ожидающих отправки архивов."""
+
+        for _ in range(count):
+            self.upload_slots.release()
+
+
+    def discard_queued_archives(self, upload_queue: asyncio.Queue):
+        """Удаляет временные части архивов, которые остались в очереди отправки после отмены проверки."""
+
+        while True:
+            try:
+                self.discard_zip_result(upload_queue.get_nowait())
+            except (asyncio.QueueEmpty, asyncio.QueueShutDown):
+                return
+
+
+    def discard_compress_future(self, compress_future: Future):
+        """Удаляет временные части архива, сжатие которого завершилось после отмены проверки."""
+
+        if not compress_future.cancelled() and compress_future.exception() is None:
+            self.discard_zip_result(compress_future.result())
+
+
+    def discard_zip_result(self, zip_result: dict):
+        """Удаляет временные части архива, который не будет отправлен."""
+
+        if zip_result['parts']:
+            shutil.rmtree(path.dirname(zip_result['parts'][0]), ignore_errors=True)
+
+
+    async def send_file(self, session, file_data: dict) -> bool:
+        """Отправляет сжатый в памяти файл на сервер через Discord Webhook.
+
+        Parameters
+        ----------
+        session : ClientSession
+            сессия aiohttp
+        file_data : dict
+            данные о файле, содержащие сжатый архив
+
+        Returns
+        -------
+        bool
+            True если отправка успешна, иначе False
+        """
+
+        original_filename: str = file_data['file_name']
+
+        try:
+            file_message_data = partial(
+                self.make_message_data,
+                text=self.get_message_line(file_data),
+                files=[(file_data['attachment_name'], file_data['data'])]
+            )
+
+            upload_started_at = time.perf_counter()
+            response: bool = await self.send_to_webhooks([file_data], partial(self.send_message, session, file_message_data, original_filename))
+            if not response:
+                self.status_changed.emit(f'Ошибка при отправке файла {original_filename}')
+                self.fail_file(original_filename, 'Сервер отклонил запрос')
+                return response
+
+            self.run_metrics.record_upload([original_filename], len(file_data['data']), time.perf_counter() - upload_started_at)
+            self.complete_file(file_data)
+
+            return response
+        except Exception as e:
+            self.status_changed.emit(f"Ошибка при отправке файла {original_filename}: {str(e)}")
+            self.fail_file(original_filename, str(e))
+            return False
+
+
+    async def send_batch(self, session, batch: list[dict]) -> bool:
+        """Отправляет несколько сжатых в памяти файлов одним сообщением через Discord Webhook.
+
+        Parameters
+        ----------
+        session : ClientSession
+            сессия aiohttp
+        batch : list[dict]
+            данные о файлах, содержащие сжатые архивы
+
+        Returns
+        -------
+        bool
+            True если отправка успешна, иначе False
+        """
+
+        files_names: str = ', '.join(file_data['file_name'] for file_data in batch)
+
+        try:
+            batch_message_data = partial(
+                self.make_message_data,
+                text='\n'.join(self.get_message_line(file_data) for file_data in batch),
+                files=[(file_data['attachment_name'], file_data['data']) for file_data in batch]
+            )
+
+            upload_started_at = time.perf_counter()
+            response: bool = await self.send_to_webhooks(batch, partial(self.send_message, session, batch_message_data, files_names))
+            if not response:
+                self.status_changed.emit(f'Ошибка при отправке файлов {files_names}')
+            else:
+                self.run_metrics.record_upload(
+                    [file_data['file_name'] for file_data in batch],
+                    sum(len(file_data['data']) for file_data in batch),
+                    time.perf_counter() - upload_started_at
+                )
+        except Exception as e:
+            self.status_changed.emit(f'Ошибка при отправке файлов {files_names}: {str(e)}')
+            response = False
+
+        for file_data in batch:
+            if response:
+                self.complete_file(file_data)
+            else:
+                self.fail_file(file_data['file_name'], 'Сервер отклонил запрос')
+
+        return response
+
+
+    def get_message_line(self, file_data: dict) -> str:
+        """Возвращает строку сообщения о файле: имя, время сжатия, для патча - базовую версию,
+        для PBO - изменённые с прошлой отправки записи.
+        """
+
+        message_line = f'{file_data['file_name']} — {file_data['created_at'].strftime('%d.%m %H:%M')}'
+        if file_data['method'] == 'delta':
+            message_line += f' — патч к версии {file_data['base_digest'][:12]}'
+        if file_data['changes']:
+            message_line += f'\nИзменено: {pbo.format_changes(file_data['changes'])}'
+
+        return message_line
+
+
+    async def send_file_parts(self, session, file_data: dict) -> bool:
+        """Последовательно отправляет части разрезанного архива через Discord Webhook.\n
+        Каждое сообщение содержит манифест: номер части, количество частей и SHA256 архива целиком,
+        по которому получатель проверяет собранный файл. После отправки части удаляются.
+
+        Parameters
+        ----------
+        session : ClientSession
+            сессия aiohttp
+        file_data : dict
+            данные о файле, содержащие пути к частям архива
+
+        Returns
+        -------
+        bool
+            True если отправлены все части, иначе False
+        """
+
+        original_filename: str = file_data['file_name']
+        parts: list[str] = file_data['parts']
+
+        try:
+            upload_started_at = time.perf_counter()
+
+            if not await self.send_to_webhooks([file_data], partial(self.send_parts, session, file_data)):
+                self.fail_file(original_filename, 'Сервер отклонил часть архива')
+                return False
+
+            self.run_metrics.record_upload([original_filename], file_data['compressed_bytes'], time.perf_counter() - upload_started_at)
+            self.complete_file(file_data)
+
+            return True
+        except Exception as e:
+            self.status_changed.emit(f"Ошибка при отправке файла {original_filename}: {str(e)}")
+            self.fail_file(original_filename, str(e))
+            return False
+        finally:
+            shutil.rmtree(path.dirname(parts[0]), ignore_errors=True)
+
+
+    async def send_parts(self, session, file_data: dict, webhook: Webhook | None = None) -> bool:
+        """Отправляет части архива по порядку в один Webhook (см. <code>send_message</code>).
+
+        Returns
+        -------
+        bool
+            True если отправлены все части, иначе False
+        """
+
+        original_filename: str = file_data['file_name']
+        parts: list[str] = file_data['parts']
+        timestamp_str = file_data['created_at'].strftime('%d.%m %H:%M')
+        webhook = webhook or self.webhook_pool.choose()
+
+        for part_index, part_path in enumerate(parts, start=1):
+            self.status_changed.emit(f'Отправка {original_filename} (часть {part_index}/{len(parts)})...')
+
+            part_manifest = {
+                'file': f'{path.basename(original_filename)}.zip',
+                'part': part_index,
+                'parts': len(parts),
+                'sha256': file_data['archive_sha256']
+            }
+
+            with open(part_path, 'rb') as part_file:
+                part_content: bytes = part_file.read()
+
+            part_message_data = partial(
+                self.make_message_data,
+                text=f'{original_filename} — {timestamp_str} — часть {part_index}/{len(parts)}\n```json\n{json.dumps(part_manifest)}\n```',
+                files=[(path.basename(part_path), part_content)]
+            )
+
+            if not await self.send_message(session, part_message_data, f'{original_filename} (часть {part_index}/{len(parts)})', webhook):
+                self.status_changed.emit(f'Ошибка при отправке части {part_index} файла {original_filename}')
+                self.logger.error(f'Сервер отклонил часть {part_index}/{len(parts)} файла {original_filename}')
+                return False
+
+        return True
+
+
+    async def send_to_webhooks(self, files_data: list[dict], send: Callable[[Webhook | None], Awaitable[bool]]) -> bool:
+        """Отправляет сообщение с файлами в зависимости от режима Webhook (см. <code>update_webhooks</code>).\n
+        В режиме <code>balance</code> сообщение отправляется один раз в один Webhook: для патча - туда, где есть
+        его базовая версия (см. <code>prepare_delta</code>), для остального - наименее загруженный. Части разрезанного
+        архива и повторы после 429 идут в тот же Webhook, а доставка записывается в базу, чтобы следующий патч
+        файла ушёл в канал с его базовой версией. В режиме <code>fanout</code> оно одновременно отправляется во все Webhook, куда ещё не доставлена текущая
+        версия файлов (см. <code>get_pending_webhooks</code>). Каждая доставка сразу записывается в базу,
+        поэтому при повторе файлы отправляются только в оставшиеся Webhook.
+
+        Parameters
+        ----------
+        files_data : list[dict]
+            данные о файлах сообщения
+        send : Callable[[Webhook | None], Awaitable[bool]]
+            функция, отправляющая сообщение в указанный Webhook (None - выбрать из набора)
+
+        Returns
+        -------
+        bool
+            True если сообщение доставлено во все нужные Webhook
+        """
+
+        if not self.fanout:
+            webhook: Webhook = self.get_balance_webhook(files_data)
+            if not await send(webhook):
+                return False
+
+            for file_data in files_data:
+                self.save_delivery(file_data, webhook)
+            return True
+
+        webhooks: list[Webhook] = self.get_pending_webhooks(files_data[0])
+        results: list = await asyncio.gather(*(send(webhook) for webhook in webhooks), return_exceptions=True)
+        delivered_count = 0
+
+        for webhook, result in zip(webhooks, results):
+            if isinstance(result, Exception):
+                self.logger.error(f'Ошибка при отправке в Webhook {webhook.id}! Ошибка:\n{str(result)}')
+            if result is not True:
+                continue
+
+            delivered_count += 1
+            for file_data in files_data:
+                self.save_delivery(file_data, webhook)
+
+        if delivered_count == len(webhooks):
+            return True
+
+        files_names: str = ', '.join(file_data['file_name'] for file_data in files_data)
+        self.logger.warning(f'{files_names}: доставлено в Webhook {delivered_count} из {len(webhooks)}, остальные получат файлы при повторе')
+
+        if delivered_count and self.base_store:
+            # Webhook получили разные версии, поэтому следующая версия отправляется целиком, а не патчем
+            for file_data in files_data:
+                self.base_store.remove(file_data['file_name'])
+
+        return False
+
+
+    def get_balance_webhook(self, files_data: list[dict]) -> Webhook:
+        """Возвращает Webhook для сообщения в режиме <code>balance</code>: Webhook базовой версии патча
+        (патчи с разными базовыми Webhook не попадают в одно сообщение, см. <code>group_by_webhooks</code>)
+        или наименее загруженный.
+        """
+
+        webhook_id: str | None = files_data[0].get('webhook_id')
+        for webhook in self.webhook_pool.webhooks:
+            if webhook.id == webhook_id:
+                return webhook
+
+        return self.webhook_pool.choose()
+
+
+    def get_base_webhook(self, file_name: str) -> Webhook | None:
+        """Возвращает Webhook, в который доставлена последняя отправленная версия файла, или None, если такого нет."""
+
+        digest: str | None = self.files_hash.get(file_name)
+        delivered: dict[str, str] = self.deliveries.get(file_name, {})
+
+        return next((webhook for webhook in self.webhook_pool.webhooks if digest and delivered.get(webhook.id) == digest), None)
+
+
+    def get_pending_webhooks(self, file_data: dict) -> list[Webhook]:
+        """Возвращает Webhook, куда ещё не доставлена текущая версия файла."""
+
+        delivered: dict[str, str] = self.deliveries.get(file_data['file_name'], {})
+
+        return [webhook for webhook in self.webhook_pool.webhooks if delivered.get(webhook.id) != file_data['digest']]
+
+
+    def save_delivery(self, file_data: dict, webhook: Webhook):
+        """Записывает доставку текущей версии файла в Webhook."""
+
+        self.deliveries.setdefault(file_data['file_name'], {})[webhook.id] = file_data['digest']
+        self.store.save_delivery(file_data['file_name'], webhook.id, file_data['digest'])
+
+
+    async def send_message(
+        self,
+        session,
+        make_message_data: Callable[[], aiohttp.FormData],
+        progress_label: str | None = None,
+        webhook: Webhook | None = None
+    ) -> bool:
+        """Отправляет сообщение с указанными данным используя Discrod Webhook.\n
+        Запросы проходят через планировщик ограничений частоты выбранного Webhook. После ответа 429 сообщение
+        отправляется повторно не более <code>max_rate_limit_retries</code> раз.
+        Данные отправляются с ограничением скорости (см. <code>get_request_body</code>).
+
+        Parameters
+        ----------
+        session : ClientSession
+            сессия aiohttp
+        make_message_data : Callable[[], FormData]
+            функция, создающая данные сообщения для каждой попытки
+        progress_label : str | None
+            что отправляется: если указано, ход отправки сообщается через <code>status_changed</code>
+        webhook : Webhook | None
+            Webhook для отправки. Если не указан, для каждой попытки выбирается наименее загруженный (см. <code>WebhookPool.choose</code>)
+        """
+
+        max_retries: int = self.user_config.get('max_rate_limit_retries', 5)
+
+        for _ in range(max_retries + 1):
+            request_webhook: Webhook = webhook or self.webhook_pool.choose()
+            rate_limiter = request_webhook.rate_limiter
+
+            async with rate_limiter.slot():
+                request_started_at = time.perf_counter()
+                self.run_metrics.add('upload_requests')
+
+                request_body, request_headers = await self.get_request_body(make_message_data(), progress_label)
+
+                async with session.post(request_webhook.url, data=request_body, headers=request_headers) as resp:
+                    self.run_metrics.add('upload_seconds', time.perf_counter() - request_started_at)
+                    rate_limiter.update(resp.headers)
+
+                    if resp.status == 429:
+                        self.run_metrics.add('upload_retries')
+                        retry_after: float = await self.get_retry_after(resp)
+                        rate_limiter.block(retry_after)
+                        self.logger.warning(f'Превышен лимит запросов Discord (Webhook {request_webhook.id}). Повтор через {retry_after:.2f} с')
+                        continue
+
+                    if not 200 <= resp.status < 300:
+                        self.logger.error(f'Ошибка {resp.status} при отправке сообщения в Webhook {request_webhook.id}!')
+                        return False
+
+                    return True
+
+        self.logger.error('Превышено количество повторов после ограничения частоты запросов!')
+        return False
+
+
+    async def get_request_body(self, message_data: aiohttp.FormData, progress_label: str | None) -> tuple:
+        """Возвращает тело запроса и его заголовки.\n
+        Если задано ограничение скорости или нужен ход отправки, данные сообщения собираются в память и отдаются
+        потоком блоков (см. <code>throttle.iter_throttled</code>) с известным <code>Content-Length</code>.
+        Иначе данные передаются aiohttp как есть.
+        """
+
+        if self.bandwidth_limiter is None and progress_label is None:
+            return message_data, None
+
+        multipart_writer = message_data()
+        body: bytes = await multipart_writer.as_bytes()
+        progress: throttle.UploadProgress | None = None
+        if progress_label is not None:
+            progress = throttle.UploadProgress(
+                progress_label,
+                len(body),
+                self.status_changed.emit,
+                self.user_config.get('progress_interval_seconds', 1.0)
+            )
+
+        request_body = throttle.iter_throttled(body, self.bandwidth_limiter, progress, partial(self.run_metrics.add, 'throttle_seconds'))
+        request_headers = {'Content-Type': multipart_writer.content_type, 'Content-Length': str(len(body))}
+
+        return request_body, request_headers
+
+
+    async def get_retry_after(self, resp: aiohttp.ClientResponse) -> float:
+        """Возвращает время ожидания в секундах из ответа 429.\n
+        Discord указывает его в теле ответа (<code>retry_after</code>) и в заголовке <code>Retry-After</code>.
+        """
+
+        try:
+            response_data: dict = await resp.json(content_type=None)
+            return float(response_data['retry_after'])
+        except Exception:
+            return float(resp.headers.get('Retry-After', 1))
+
+
+    async def send_message_about_oversized_files(self, session, admin_id: str, oversized_files: list):
+        """Отправляет сообщение о файлах, привыщающий допустимый для отправки размер.
+
+        Parameters
+        ----------
+        session : ClientSession
+            сессия aiohttp
+        admin_id : str
+            идентификатор Discord администратора
+        oversized_files : list
+            список файлов, которые при
+        """
+
+        embed_description = ''
+        for big_file in oversized_files:
+            embed_description += f'{big_file['file_name']} ({big_file['compressed_size']:.2f} MB)\n'
+
+        oversized_files_message_data = partial(
+            self.make_message_data,
+            text=f'<@{admin_id}> Следующие файлы превышают допустимый размер:',
+            embeds=[{'description': embed_description}]
+        )
+
+        response: bool = await self.send_message(session, oversized_files_message_data)
+        if not response:
+            self.status_changed.emit(f'Ошибка при отправке сообщения администратору')
+            self.logger.error('Ошибка при отправке сообщения администратору!')
+
+        for big_file in oversized_files:
+            if response:
+                self.commit_file(big_file['file_name'], big_file['digest'], 'notified', entries=big_file['entries'])
+            else:
+                self.fail_file(big_file['file_name'], 'Не отправлено сообщение администратору')
+
+
+    def make_message_data(self, text: str, embeds: list = None, files: list[tuple[str, bytes]] = None) -> aiohttp.FormData:
+        """Создаёт и возвращает данные сообщения в формате multipart.\n
+        Текст и Embeds передаются в поле <code>payload_json</code>. Поддерживает добавление файлов из памяти.
+        Текст длиннее лимита Discord (<code>MESSAGE_MAX_LENGTH</code>) обрезается.
+
+        Parameters
+        ----------
+        text : str
+            текст сообщения
+        embeds : list
+            эмбеды
+        files : list[tuple[str, bytes]]
+            имена и содержимое прикрепляемых файлов (не больше 10)
+        """
+
+        if len(text) > MESSAGE_MAX_LENGTH:
+            text = f'{text[:MESSAGE_MAX_LENGTH - 1]}…'
+
+        payload = {'content': text}
+        if embeds:
+            payload['embeds'] = embeds
+
+        message_data = aiohttp.FormData()
+        message_data.add_field('payload_json', json.dumps(payload, ensure_ascii=False), content_type='application/json')
+        for index, (file_name, file_content) in enumerate(files or []):
+            message_data.add_field(f'files[{index}]', file_content, filename=file_name, content_type='application/zip')
+
+        return message_data
+
+
+    def get_hash_candidates(self, files: dict[str, tuple[str, dict]], full_scan: bool) -> dict[str, tuple[str, dict]]:
+        """Возвращает файлы, которые нужно хэшировать.\n
+        Файлы, метаданные которых не изменились с прошлой проверки, пропускаются, кроме
+        полной перепроверки и перевода манифеста на другой алгоритм. Полная перепроверка
+        учитывается только при проверке всей папки (<code>full_scan</code>).
+
+        Новые метаданные не записываются в манифест: это делается после хэширования файла,
+        чтобы файл, проверка которого прервалась, был проверен снова.
+
+        Parameters
+        ----------
+        files : dict[str, tuple[str, dict]]
+            файлы в формате <code>FileScanner.scan</code>
+        full_scan : bool
+            проверяется ли вся папка
+
+        Returns
+        -------
+        dict[str, tuple[str, dict]]
+            имена файлов, пути к ним и их метаданные
+        """
+
+        candidate_files: dict[str, tuple[str, dict]] = {}
+
+        full_rehash: bool = full_scan and self.is_full_rehash_run()
+        migrate: bool = self.files_hash_algorithm != self.hash_algorithm
+        self.full_rehash = full_rehash
+
+        if migrate:
+            self.logger.info(f'Перевод манифеста хэшей с {self.files_hash_algorithm} на {self.hash_algorithm}')
+        elif full_rehash:
+            self.logger.info('Полная перепроверка хэшей всех файлов')
+
+        for file_name, (file_path, file_stat) in files.items():
+            prev_file_stat: dict | None = self.files_stat['files'].get(file_name)
+
+            if not (full_rehash or migrate) and file_stat == prev_file_stat:
+                if file_name in self.outbox:
+                    if self.outbox.is_waiting(file_name):
+                        continue
+                elif self.files_hash.get(file_name):
+                    continue
+
+            candidate_files[file_name] = (file_path, file_stat)
+
+        return candidate_files
+
+
+    def fingerprint_file(self, file_name: str, file_path: str, algorithms: tuple[str, ...]) -> tuple[dict[str, str], dict | None, int]:
+        """Создаёт отпечатки файла указанными алгоритмами (см. <code>get_hash_algorithms</code>).\n
+        Для алгоритмов <code>pbo-*</code> файл разбирается как PBO (см. <code>pbo.fingerprint_pbo</code>),
+        а если SHA1 в конце PBO не изменилась с последней отправки, записи не читаются (кроме полной перепроверки).
+        Если файл не является PBO, для этих алгоритмов используется отпечаток файла целиком.
+
+        Returns
+        -------
+        tuple[dict[str, str], dict | None, int]
+            отпечатки по алгоритмам, записи PBO (None, если файл не разобран как PBO) и объём прочитанных данных
+        """
+
+        if any(pbo.is_content_algorithm(algorithm) for algorithm in algorithms):
+            previous_entries: dict | None = None if self.full_rehash else self.files_entries.get(file_name)
+
+            try:
+                return pbo.fingerprint_pbo(file_path, algorithms, previous_entries)
+            except pbo.PboError as e:
+                self.logger.debug(f'Файл {file_name} хэшируется целиком: {str(e)}')
+
+        file_hash: dict[str, str] = fingerprint.fingerprint_file(file_path, tuple(dict.fromkeys(map(pbo.get_file_algorithm, algorithms))))
+
+        return {algorithm: file_hash[pbo.get_file_algorithm(algorithm)] for algorithm in algorithms}, None, path.getsize(file_path)
+
+
+    def get_hash_algorithms(self) -> tuple[str, ...]:
+        """Возвращает алгоритмы, которыми хэшируются файлы.\n
+        Если манифест записан другим алгоритмом, файлы хэшируются за один проход обоими
+        алгоритмами: старый отпечаток (последний в кортеже) используется для сравнения,
+        новый сохраняется в манифест.
+        """
+
+        if self.files_hash_algorithm != self.hash_algorithm:
+            return (self.hash_algorithm, self.files_hash_algorithm)
+
+        return (self.hash_algorithm,)
+
+
+    def check_file_hash(self, file_name: str, current_hash: dict, entries: dict | None = None) -> bool:
+        """Сверяет отпечаток файла с отпечатком последней успешной отправки.\n
+        Отпечаток изменённого файла попадает в манифест только после его отправки (см. <code>commit_file</code>).
+        Во время перевода манифеста на другой алгоритм в нём могут быть отпечатки обоих алгоритмов
+        (файлы, проверенные или отправленные после начала перевода), поэтому сверяются оба.
+        Если файл не изменился, он убирается из очереди отправки, а его записи PBO сохраняются: у них могли
+        измениться только время и смещения, по которым следующая проверка пропустит чтение записей.
+
+        Parameters
+        ----------
+        file_name : str
+            имя файла
+        current_hash : dict
+            отпечатки файла по алгоритмам из <code>get_hash_algorithms</code>
+        entries : dict | None
+            записи PBO файла (см. <code>fingerprint_file</code>)
+
+        Returns
+        -------
+        bool
+            True если файл изменился с прошлой отправки
+        """
+
+        self.hashed_files.add(file_name)
+
+        prev_hash: str = self.files_hash.get(file_name, '')
+        if prev_hash not in (current_hash[algorithm] for algorithm in self.get_hash_algorithms()):
+            return True
+
+        digest: str = current_hash[self.hash_algorithm]
+        if digest != prev_hash:
+            self.files_hash[file_name] = digest
+            self.store.set_digest(file_name, digest)
+
+        if entries and entries != self.files_entries.get(file_name):
+            self.store.set_entries(file_name, entries)
+            self.set_entries(file_name, entries)
+
+        if file_name in self.outbox:
+            self.outbox.remove(file_name)
+            self.outbox_changed.emit(len(self.outbox))
+
+        return False
+
+
+    def set_entries(self, file_name: str, entries: dict | None):
+        """Запоминает записи PBO последней отправленной версии файла."""
+
+        if entries is None:
+            self.files_entries.pop(file_name, None)
+        else:
+            self.files_entries[file_name] = entries
+
+
+    def complete_file(self, file_data: dict):
+        """Записывает отправку файла в историю, сохраняет его отпечаток в манифест и,
+        при <code>delta_uploads</code>, отправленную копию как базовую версию для следующего патча.
+        """
+
+        record = {
+            'sent_at': file_data['created_at'].isoformat(timespec='seconds'),
+            'method': file_data['method'],
+            'original_size': file_data['original_size'],
+            'compressed_size': file_data['compressed_bytes'],
+            'compression_ratio': round(file_data['compression_ratio'], 1),
+            'parts': len(file_data['parts']) or 1
+        }
+
+        self.commit_file(file_data['file_name'], file_data['digest'], record=record, entries=file_data['entries'])
+
+        if self.base_store and file_data['staged_path']:
+            try:
+                self.base_store.save(file_data['file_name'], file_data['staged_path'], file_data['staged_digest'])
+            except OSError as e:
+                self.logger.error(f'Ошибка сохранения версии файла {file_data['file_name']}: {str(e)}')
+                self.base_store.remove(file_data['file_name'])
+
+
+    def commit_file(self, file_name: str, digest: str, outcome: str = 'sent', record: dict | None = None, entries: dict | None = None):
+        """Одной транзакцией сохраняет отпечаток и записи PBO отправленного файла в манифест, добавляет запись
+        в историю и убирает файл из очереди отправки.
+        """
+
+        self.files_hash[file_name] = digest
+        self.store.commit_file(file_name, digest, outcome, record, entries)
+        self.set_entries(file_name, entries)
+
+        self.outbox.forget(file_name)
+        self.outbox_changed.emit(len(self.outbox))
+
+
+    def fail_file(self, file_name: str, error: str):
+        """Откладывает повторную отправку файла, которую не удалось выполнить."""
+
+        self.failed_files_count += 1
+        self.run_metrics.add('files_failed')
+        self.store.add_history(file_name, 'failed', {'error': error})
+        self.outbox.fail(file_name, error)
+        self.outbox_changed.emit(len(self.outbox))
+
+
+    def prune_store(self):
+        """Удаляет устаревшую историю отправок и забывает файлы, которых давно нет в папке."""
+
+        forgotten_files: list[str] = self.store.prune(
+            self.user_config.get('history_retention_days', 365),
+            self.user_config.get('history_max_records', 100),
+            self.user_config.get('forget_missing_days', 90)
+        )
+
+        for file_name in forgotten_files:
+            self.files_hash.pop(file_name, None)
+            self.files_stat['files'].pop(file_name, None)
+            self.files_entries.pop(file_name, None)
+            self.deliveries.pop(file_name, None)
+            if self.base_store:
+                self.base_store.remove(file_name)
+
+
+    def is_full_rehash_run(self) -> bool:
+        """Увеличивает счётчик проверок и определяет, нужна ли полная перепроверка хэшей.\n
+        Полная перепроверка выполняется каждые <code>paranoid_rehash_runs</code> проверок (0 - никогда).
+        """
+
+        self.files_stat['runs'] += 1
+
+        rehash_runs: int = self.user_config.get('paranoid_rehash_runs', 0)
+        if rehash_runs <= 0:
+            return False
+
+        return self.files_stat['runs'] % rehash_runs == 0
+
+
+    def create_compress_executor(self) -> Executor:
+        """Создаёт пул для сжатия файлов.\n
+        Тип пула задаётся <code>compress_executor</code> (thread или process), размер - <code>compress_workers</code>.
+        """
+
+        workers: int = max(1, self.user_config.get('compress_workers', 2))
+
+        if self.user_config.get('compress_executor', 'thread') == 'process':
+            return ProcessPoolExecutor(max_workers=workers)
+
+        return ThreadPoolExecutor(max_workers=workers, thread_name_prefix='pbo_zip')
+
+
+    def log_zip_result(self, zip_result: dict) -> dict:
+        """Записывает в лог степень сжатия файла и переводит размер архива в MB."""
+
+        original_size = zip_result['original_size'] / (1024 * 1024)
+        compressed_size = zip_result['compressed_size'] / (1024 * 1024)
+        compression_ratio = (1 - (compressed_size / original_size)) * 100 if original_size else 0
+
+        zip_result['compression_ratio'] = compression_ratio
+        self.logger.info(f'Файл {zip_result['file_name']} сжат методом {zip_result['method']}: {original_size:.2f}MB -> {compressed_size:.2f}MB ({compression_ratio:.1f}%)')
+
+        zip_result['compressed_bytes'] = zip_result['compressed_size']
+        zip_result['compressed_size'] = compressed_size
+        return zip_result
@@ -0,0 +1,79 @@
+import hashlib
+import mmap
+from os import path
+from typing import Callable
+
+
+DEFAULT_ALGORITHM = 'sha256'
+LEGACY_ALGORITHM = 'sha256'
+
+MIN_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 8 * 1024 * 1024
+
+ALGORITHMS: dict[str, Callable] = {
+    'sha256': hashlib.sha256,
+    'blake2b': hashlib.blake2b
+}
+
+
+def register_algorithm(name: str, factory: Callable):
+    """Регистрирует алгоритм отпечатка файлов.
+
+    Parameters
+    ----------
+    name : str
+        имя алгоритма, которое указывается в конфигурации и манифесте хэшей
+    factory : Callable
+        функция без аргументов, возвращающая объект с методами <code>update</code> и <code>hexdigest</code>
+    """
+
+    ALGORITHMS[name] = factory
+
+
+try:
+    import xxhash
+
+    register_algorithm('xxh3_128', xxhash.xxh3_128)
+except ImportError:
+    pass
+
+
+def get_chunk_size(file_size: int) -> int:
+    """Возвращает размер блока для хэширования файла указанного размера.\n
+    Блок равен 1/16 размера файла, но не меньше 64 KiB и не больше 8 MiB.
+    """
+
+    return min(max(file_size // 16, MIN_CHUNK_SIZE), MAX_CHUNK_SIZE)
+
+
+def fingerprint_file(file_path: str, algorithms: tuple[str, ...] = (DEFAULT_ALGORITHM,)) -> dict[str, str]:
+    """Создаёт отпечатки файла указанными алгоритмами за один проход.\n
+    Файл читается через <code>mmap</code>, поэтому блоки передаются в хэш без копирования.
+
+    Parameters
+    ----------
+    file_path : str
+        путь к файлу
+    algorithms : tuple[str, ...]
+        имена алгоритмов из <code>ALGORITHMS</code>
+
+    Returns
+    -------
+    dict[str, str]
+        имена алгоритмов и отпечатки файла
+    """
+
+    hashers = {algorithm: ALGORITHMS[algorithm]() for algorithm in algorithms}
+    file_size = path.getsize(file_path)
+
+    if file_size:
+        chunk_size = get_chunk_size(file_size)
+
+        with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+            with memoryview(mapped_file) as file_view:
+                for offset in range(0, len(file_view), chunk_size):
+                    with file_view[offset:offset + chunk_size] as chunk:
+                        for hasher in hashers.values():
+                            hasher.update(chunk)
+
+    return {algorithm: hasher.hexdigest() for algorithm, hasher in hashers.items()}
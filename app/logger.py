@@ -1,4 +1,104 @@
+import atexit
+import json
 import logging
+import queue
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+
+
+LOG_FILE_PATH = 'pbo_sender.log'
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+log_queue = queue.SimpleQueue()
+listener: QueueListener | None = None
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Форматирует записи журнала как JSON, по одному объекту в строке. Наследует <code>Formatter</code>."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        log_entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage()
+        }
+
+        return json.dumps(log_entry, ensure_ascii=False)
+
+
+def create_file_handler(config: dict) -> logging.Handler:
+    """Создаёт обработчик файла журнала с ротацией.\n
+    При <code>log_rotation</code> size файл сменяется по достижении <code>log_max_bytes</code>,
+    при time - по расписанию <code>log_rotation_when</code> (например, midnight).
+    Хранится <code>log_backup_count</code> старых файлов.
+    """
+
+    backup_count: int = config.get('log_backup_count', 5)
+
+    if config.get('log_rotation', 'size') == 'time':
+        file_handler = TimedRotatingFileHandler(LOG_FILE_PATH, when=config.get('log_rotation_when', 'midnight'), backupCount=backup_count, encoding='utf-8')
+    else:
+        file_handler = RotatingFileHandler(LOG_FILE_PATH, maxBytes=config.get('log_max_bytes', 5 * 1024 * 1024), backupCount=backup_count, encoding='utf-8')
+
+    if config.get('log_format', 'text') == 'json':
+        file_handler.setFormatter(JsonLinesFormatter())
+    else:
+        file_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    return file_handler
+
+
+def configure_logging(config: dict):
+    """Настраивает журнал приложения. Может вызываться повторно, например после чтения конфигурации.\n
+    Логгеры только помещают записи в очередь, а в файл их записывает отдельный поток
+    <code>QueueListener</code>, поэтому журналирование не блокирует рабочие потоки.
+
+    Parameters
+    ----------
+    config : dict
+        конфигурация пользователя: <code>log_level</code>, <code>log_levels</code> (уровни отдельных модулей),
+        <code>log_format</code> (text или json), параметры ротации (см. <code>create_file_handler</code>)
+    """
+
+    global listener
+
+    root_logger = logging.getLogger()
+
+    if listener is None:
+        root_logger.addHandler(QueueHandler(log_queue))
+    else:
+        shutdown_logging()
+
+    listener = QueueListener(log_queue, create_file_handler(config), respect_handler_level=True)
+    listener.start()
+
+    invalid_levels: list[str] = []
+
+    for module_name, level in {'': config.get('log_level', 'INFO'), **config.get('log_levels', {})}.items():
+        try:
+            logging.getLogger(module_name).setLevel(level)
+        except (TypeError, ValueError):
+            invalid_levels.append(f'{module_name or "root"}={level}')
+
+    if invalid_levels:
+        root_logger.warning(f'Неизвестные уровни журнала: {', '.join(invalid_levels)}')
+
+
+def shutdown_logging():
+    """Записывает оставшиеся в очереди записи и закрывает файл журнала."""
+
+    if listener is None:
+        return
+
+    listener.stop()
+
+    for handler in listener.handlers:
+        handler.close()
+
+
+atexit.register(shutdown_logging)
 
 
 def setup_logging(module_name: str):
@@ -15,12 +115,7 @@ def setup_logging(module_name: str):
         логгер модуля
     """
 
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler('pbo_sender.log', encoding='utf-8')
-        ]
-    )
+    if listener is None:
+        configure_logging({})
 
-    return logging.getLogger(module_name)
\ No newline at end of file
+    return logging.getLogger(module_name)
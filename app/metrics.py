@@ -0,0 +1,186 @@
+import json
+import os
+import time
+from datetime import datetime
+
+
+MB = 1024 * 1024
+
+# Имя метрики Prometheus (без префикса pbo_sender_): (ключ сводки, описание)
+PROMETHEUS_METRICS: dict[str, tuple[str, str]] = {
+    'run_duration_seconds': ('run_seconds', 'Длительность проверки'),
+    'run_success': ('successful', 'Успешна ли проверка (1 - да)'),
+    'last_run_timestamp_seconds': ('finished_at_timestamp', 'Время завершения проверки (Unix)'),
+    'scan_duration_seconds': ('scan_seconds', 'Время поиска файлов'),
+    'files_scanned': ('files_scanned', 'Найдено файлов'),
+    'files_hashed': ('files_hashed', 'Хэшировано файлов'),
+    'hashed_bytes': ('hashed_bytes', 'Хэшировано байт'),
+    'hash_duration_seconds': ('hash_seconds', 'Суммарное время хэширования по обработчикам'),
+    'files_compressed': ('files_compressed', 'Сжато файлов'),
+    'files_delta': ('files_delta', 'Файлов отправлено патчами'),
+    'files_cached': ('files_cached', 'Архивов взято из кэша без сжатия'),
+    'compress_duration_seconds': ('compress_seconds', 'Суммарное время сжатия по обработчикам'),
+    'original_bytes': ('original_bytes', 'Размер сжатых файлов до сжатия'),
+    'compressed_bytes': ('compressed_bytes', 'Размер архивов'),
+    'compression_ratio': ('compression_ratio', 'Отношение размера архивов к исходному'),
+    'upload_requests': ('upload_requests', 'Запросов к Webhook'),
+    'upload_retries': ('upload_retries', 'Повторов запросов после ответа 429'),
+    'uploaded_bytes': ('uploaded_bytes', 'Отправлено байт архивов'),
+    'upload_duration_seconds': ('upload_seconds', 'Суммарная длительность запросов к Webhook'),
+    'rate_limit_wait_seconds': ('rate_limit_wait_seconds', 'Время ожидания из-за ограничений частоты'),
+    'throttle_wait_seconds': ('throttle_seconds', 'Время ожидания из-за ограничения скорости отправки'),
+    'files_failed': ('files_failed', 'Файлов с неудачной отправкой')
+}
+
+
+class RunMetrics:
+    """Метрики производительности одной проверки: по этапам конвейера и по отдельным файлам.\n
+    Время этапов хэширования и сжатия суммируется по обработчикам, поэтому скорость
+    (<code>hash_mb_per_second</code>) показывает скорость одного обработчика.
+    """
+
+    def __init__(self, rate_limit_wait: float = 0.0):
+        """Начинает сбор метрик проверки.
+
+        Parameters
+        ----------
+        rate_limit_wait : float
+            значение <code>WebhookRateLimiter.total_wait</code> в начале проверки
+        """
+
+        self.started_at = time.perf_counter()
+        self.started_at_time = datetime.now()
+        self.rate_limit_wait_start = rate_limit_wait
+        self.outcome = 'interrupted'
+        self.totals: dict[str, float] = dict.fromkeys((
+            'scan_seconds', 'files_scanned', 'files_hashed', 'hashed_bytes', 'hash_seconds',
+            'files_compressed', 'files_delta', 'files_cached', 'compress_seconds', 'original_bytes', 'compressed_bytes',
+            'upload_requests', 'upload_retries', 'uploaded_bytes', 'upload_seconds', 'throttle_seconds', 'files_failed'
+        ), 0)
+        self.files: dict[str, dict] = {}
+
+
+    def add(self, key: str, value: float = 1):
+        """Увеличивает итоговое значение метрики."""
+
+        self.totals[key] += value
+
+
+    def add_file(self, file_name: str, **values):
+        """Записывает метрики файла. Числовые значения суммируются с уже записанными."""
+
+        file_metrics: dict = self.files.setdefault(file_name, {})
+
+        for key, value in values.items():
+            file_metrics[key] = file_metrics.get(key, 0) + value if isinstance(value, (int, float)) else value
+
+
+    def record_hash(self, file_name: str, size: int, seconds: float):
+        """Записывает хэширование файла."""
+
+        self.add('files_hashed')
+        self.add('hashed_bytes', size)
+        self.add('hash_seconds', seconds)
+        self.add_file(file_name, size=size, hash_seconds=seconds)
+
+
+    def record_compress(self, file_name: str, original_size: int, compressed_size: int, method: str, seconds: float):
+        """Записывает сжатие файла."""
+
+        self.add('files_compressed')
+        self.add('original_bytes', original_size)
+        self.add('compressed_bytes', compressed_size)
+        self.add('compress_seconds', seconds)
+        self.add_file(file_name, compressed_size=compressed_size, method=method, compress_seconds=seconds)
+
+
+    def record_upload(self, file_names: list[str], uploaded_bytes: int, seconds: float):
+        """Записывает отправку файлов одним или несколькими запросами (части архива)."""
+
+        self.add('uploaded_bytes', uploaded_bytes)
+
+        for file_name in file_names:
+            self.add_file(file_name, upload_seconds=seconds)
+
+
+    def finish(self, rate_limit_wait: float) -> dict:
+        """Завершает сбор метрик и возвращает сводку проверки.
+
+        Parameters
+        ----------
+        rate_limit_wait : float
+            значение <code>WebhookRateLimiter.total_wait</code> в конце проверки
+
+        Returns
+        -------
+        dict
+            итоговые значения, производные показатели и метрики файлов (<code>files</code>)
+        """
+
+        totals = self.totals
+        finished_at = datetime.now()
+
+        return {
+            'started_at': self.started_at_time.isoformat(timespec='seconds'),
+            'finished_at': finished_at.isoformat(timespec='seconds'),
+            'finished_at_timestamp': round(finished_at.timestamp(), 3),
+            'outcome': self.outcome,
+            'successful': int(self.outcome in ('success', 'no_files')),
+            'run_seconds': round(time.perf_counter() - self.started_at, 3),
+            **{key: round(value, 3) if isinstance(value, float) else value for key, value in totals.items()},
+            'hash_mb_per_second': round(totals['hashed_bytes'] / MB / totals['hash_seconds'], 2) if totals['hash_seconds'] else 0.0,
+            'compress_mb_per_second': round(totals['original_bytes'] / MB / totals['compress_seconds'], 2) if totals['compress_seconds'] else 0.0,
+            'compression_ratio': round(totals['compressed_bytes'] / totals['original_bytes'], 4) if totals['original_bytes'] else 0.0,
+            'average_upload_latency_seconds': round(totals['upload_seconds'] / totals['upload_requests'], 3) if totals['upload_requests'] else 0.0,
+            'rate_limit_wait_seconds': round(rate_limit_wait - self.rate_limit_wait_start, 3),
+            'files': {
+                file_name: {key: round(value, 4) if isinstance(value, float) else value for key, value in file_metrics.items()}
+                for file_name, file_metrics in self.files.items()
+            }
+        }
+
+
+def format_summary(summary: dict) -> str:
+    """Возвращает краткую сводку метрик для журнала и интерфейса."""
+
+    summary_text = (
+        f'{summary['run_seconds']:.1f} с: поиск {summary['scan_seconds']:.1f} с, '
+        f'хэш {summary['hashed_bytes'] / MB:.1f} MB ({summary['hash_mb_per_second']:.0f} MB/s), '
+        f'сжатие {summary['files_compressed']} ({summary['compression_ratio'] * 100:.1f}%), '
+        f'отправка {summary['uploaded_bytes'] / MB:.2f} MB за {summary['upload_requests']} запр. '
+        f'(повторов {summary['upload_retries']}, ожидание {summary['rate_limit_wait_seconds']:.1f} с)'
+    )
+    if summary['throttle_seconds']:
+        summary_text += f', ограничение скорости {summary['throttle_seconds']:.1f} с'
+
+    return summary_text
+
+
+def write_prometheus_textfile(file_path: str, summary: dict):
+    """Записывает итоговые значения проверки в текстовый формат Prometheus (для node_exporter textfile collector).\n
+    Файл заменяется целиком, поэтому сборщик не прочитает его наполовину записанным.
+    """
+
+    lines: list[str] = []
+
+    for metric_name, (summary_key, description) in PROMETHEUS_METRICS.items():
+        lines.append(f'# HELP pbo_sender_{metric_name} {description}')
+        lines.append(f'# TYPE pbo_sender_{metric_name} gauge')
+        lines.append(f'pbo_sender_{metric_name} {summary[summary_key]}')
+
+    write_atomic(file_path, '\n'.join(lines) + '\n')
+
+
+def write_json_summary(file_path: str, summary: dict):
+    """Записывает сводку последней проверки в файл формата JSON."""
+
+    write_atomic(file_path, json.dumps(summary, indent=2, ensure_ascii=False))
+
+
+def write_atomic(file_path: str, content: str):
+    temp_file_path = f'{file_path}.tmp'
+
+    with open(temp_file_path, 'w', encoding='utf-8') as temp_file:
+        temp_file.write(content)
+
+    os.replace(temp_file_path, file_path)
@@ -0,0 +1,107 @@
+import random
+import time
+
+import app.logger as logger
+from app.store import ManifestStore
+
+
+class Outbox:
+    """Очередь файлов, ожидающих отправки, которая хранится в базе (см. <code>ManifestStore</code>).\n
+    Файл находится в очереди с момента обнаружения изменений до успешной отправки.
+    После неудачной отправки следующая попытка откладывается по экспоненте со случайным разбросом.
+    """
+
+    def __init__(self, store: ManifestStore, base_delay: float, max_delay: float):
+        """Инициализирует очередь и считывает её из базы.
+
+        Parameters
+        ----------
+        store : ManifestStore
+            хранилище состояния отправщика
+        base_delay : float
+            задержка перед первым повтором в секундах
+        max_delay : float
+            максимальная задержка между повторами в секундах
+        """
+
+        self.logger = logger.setup_logging(__name__)
+        self.store = store
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.items: dict[str, dict] = self.store.read_outbox()
+
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+
+    def __contains__(self, file_name: str) -> bool:
+        return file_name in self.items
+
+
+    def add(self, file_name: str, digest: str):
+        """Добавляет файл в очередь. Счётчик попыток сбрасывается, если содержимое файла изменилось."""
+
+        item: dict | None = self.items.get(file_name)
+        if item and item['digest'] == digest:
+            return
+
+        self.items[file_name] = {'digest': digest, 'attempts': 0, 'next_attempt_at': 0.0, 'last_error': ''}
+        self.store.save_outbox_item(file_name, self.items[file_name])
+
+
+    def remove(self, file_name: str):
+        """Удаляет файл из очереди после успешной отправки или если он больше не требует отправки."""
+
+        if self.items.pop(file_name, None) is not None:
+            self.store.remove_outbox_item(file_name)
+
+
+    def forget(self, file_name: str):
+        """Убирает файл из очереди в памяти, когда он уже удалён из базы (см. <code>ManifestStore.commit_file</code>)."""
+
+        self.items.pop(file_name, None)
+
+
+    def fail(self, file_name: str, error: str):
+        """Откладывает следующую попытку отправки файла.
+
+        Parameters
+        ----------
+        file_name : str
+            имя файла
+        error : str
+            описание ошибки
+        """
+
+        item: dict | None = self.items.get(file_name)
+        if not item:
+            return
+
+        item['attempts'] += 1
+        delay = min(self.base_delay * 2 ** (item['attempts'] - 1), self.max_delay)
+        delay = delay / 2 + random.uniform(0, delay / 2)
+
+        item['next_attempt_at'] = time.time() + delay
+        item['last_error'] = error
+        self.store.save_outbox_item(file_name, item)
+
+        self.logger.warning(f'Отправка файла {file_name} не удалась (попытка {item['attempts']}). Повтор через {delay:.0f} с')
+
+
+    def is_waiting(self, file_name: str, digest: str | None = None) -> bool:
+        """Ожидает ли файл повторной отправки, время которой ещё не наступило.
+
+        Parameters
+        ----------
+        file_name : str
+            имя файла
+        digest : str | None
+            текущий отпечаток файла. Если он отличается от отпечатка в очереди, файл не ожидает
+        """
+
+        item: dict | None = self.items.get(file_name)
+        if not item or (digest is not None and item['digest'] != digest):
+            return False
+
+        return item['next_attempt_at'] > time.time()
@@ -0,0 +1,282 @@
+"""Разбор архивов PBO и отпечатки их содержимого по записям.
+
+Заголовок PBO - последовательность записей: имя (строка с нулём в конце) и пять чисел uint32 LE
+(способ упаковки, исходный размер, зарезервировано, время изменения, размер данных). Первая запись
+с пустым именем и способом упаковки <code>Vers</code> содержит свойства архива (пары строк до пустой строки),
+запись с пустым именем и нулями завершает заголовок. За заголовком подряд идут данные записей,
+в конце файла - нулевой байт и SHA1 всего предшествующего содержимого.
+"""
+
+import json
+import mmap
+import struct
+
+import app.fingerprint as fingerprint
+
+
+ALGORITHM_PREFIX = 'pbo-'
+
+ENTRY_STRUCT = struct.Struct('<5I')
+VERSION_METHOD = 0x56657273
+CHECKSUM_SIZE = 20
+
+MAX_NAME_LENGTH = 1024
+CONTENT_PROPERTIES = ('prefix',)
+
+
+class PboError(Exception):
+    """Файл не является архивом PBO или его заголовок повреждён."""
+
+
+def is_content_algorithm(algorithm: str) -> bool:
+    """Является ли алгоритм отпечатком содержимого PBO (<code>pbo-sha256</code> и т.п.)."""
+
+    return algorithm.startswith(ALGORITHM_PREFIX)
+
+
+def get_file_algorithm(algorithm: str) -> str:
+    """Возвращает алгоритм хэширования, на котором основан алгоритм отпечатка."""
+
+    return algorithm.removeprefix(ALGORITHM_PREFIX)
+
+
+def decode_name(name: bytes) -> str:
+    """Декодирует имя записи. Имена не в UTF-8 (старые архивы в кодировке Windows) декодируются побайтно."""
+
+    try:
+        return name.decode('utf-8')
+    except UnicodeDecodeError:
+        return name.decode('latin-1')
+
+
+def read_string(file_map: mmap.mmap, position: int) -> tuple[bytes, int]:
+    """Читает строку с нулём в конце. Возвращает строку и позицию после неё."""
+
+    string_end: int = file_map.find(b'\0', position, position + MAX_NAME_LENGTH + 1)
+    if string_end < 0:
+        raise PboError(f'Строка заголовка в позиции {position} не завершена')
+
+    return file_map[position:string_end], string_end + 1
+
+
+def read_header(file_map: mmap.mmap) -> dict:
+    """Разбирает заголовок PBO, не читая данные записей.
+
+    Returns
+    -------
+    dict
+        <code>properties</code> (свойства архива), <code>entries</code> (записи в порядке данных:
+        <code>name</code>, <code>offset</code>, <code>data_size</code>, <code>original_size</code>, <code>timestamp</code>),
+        <code>data_offset</code> и <code>data_end</code> (границы данных), <code>checksum</code> (SHA1 из конца файла или None)
+
+    Raises
+    ------
+    PboError
+        если заголовок повреждён или данные записей выходят за конец файла
+    """
+
+    file_size: int = len(file_map)
+    properties: dict[str, str] = {}
+    entries: list[dict] = []
+    position = 0
+
+    while True:
+        name, position = read_string(file_map, position)
+        if position + ENTRY_STRUCT.size > file_size:
+            raise PboError('Заголовок PBO обрывается')
+
+        method, original_size, _, timestamp, data_size = ENTRY_STRUCT.unpack_from(file_map, position)
+        position += ENTRY_STRUCT.size
+
+        if name:
+            entries.append({'name': decode_name(name), 'data_size': data_size, 'original_size': original_size, 'timestamp': timestamp})
+            continue
+
+        if method != VERSION_METHOD or entries or properties:
+            break
+
+        while True:
+            key, position = read_string(file_map, position)
+            if not key:
+                break
+
+            value, position = read_string(file_map, position)
+            properties[decode_name(key)] = decode_name(value)
+
+    offset: int = position
+    for entry in entries:
+        entry['offset'] = offset
+        offset += entry['data_size']
+
+    if offset > file_size:
+        raise PboError('Данные записей PBO выходят за конец файла')
+
+    checksum: str | None = None
+    if file_size == offset + 1 + CHECKSUM_SIZE and file_map[offset] == 0:
+        checksum = file_map[offset + 1:file_size].hex()
+        if not checksum.strip('0'):
+            checksum = None
+
+    return {'properties': properties, 'entries': entries, 'data_offset': position, 'data_end': offset, 'checksum': checksum}
+
+
+def get_content_digest(algorithm: str, properties: dict[str, str], entry_digests: list[tuple[str, str]]) -> str:
+    """Возвращает отпечаток содержимого PBO: имён и отпечатков записей без учёта их порядка и времени изменения.\n
+    Из свойств архива учитываются только влияющие на игру (<code>CONTENT_PROPERTIES</code>), а не сведения об упаковщике.
+    """
+
+    content_hash = fingerprint.ALGORITHMS[algorithm]()
+    content_properties = {key: value for key, value in properties.items() if key.lower() in CONTENT_PROPERTIES}
+    content_hash.update(json.dumps(content_properties, sort_keys=True).encode())
+
+    for name, digest in sorted(entry_digests):
+        content_hash.update(f'\0{name}\0{digest}'.encode())
+
+    return content_hash.hexdigest()
+
+
+def can_reuse_digest(entry: dict, previous_entry: dict | None, same_checksum: bool) -> bool:
+    """Можно ли взять отпечаток записи из прошлой проверки, не читая её данные.\n
+    Это возможно, только если SHA1 в конце файла не изменилась. Размеры и время изменения записи
+    не гарантируют, что её данные те же: при правке на месте они сохраняются, поэтому после
+    изменения SHA1 (или в PBO без неё) читаются все записи.
+    """
+
+    if not same_checksum or previous_entry is None:
+        return False
+
+    return previous_entry['data_size'] == entry['data_size'] and previous_entry['offset'] == entry['offset']
+
+
+def fingerprint_pbo(file_path: str, algorithms: tuple[str, ...], previous: dict | None = None) -> tuple[dict[str, str], dict, int]:
+    """Создаёт отпечатки PBO за один проход.\n
+    Для алгоритмов <code>pbo-*</code> хэшируется каждая запись и вычисляется отпечаток содержимого
+    (см. <code>get_content_digest</code>), поэтому перепаковка с новым временем изменения файлов не меняет отпечаток.
+    Для остальных алгоритмов хэшируется файл целиком, как в <code>fingerprint.fingerprint_file</code>.
+
+    Если переданы записи прошлой проверки, неизменённые записи (см. <code>can_reuse_digest</code>) не читаются.
+    Это возможно, только если вычисляется один отпечаток содержимого тем же алгоритмом.
+
+    Parameters
+    ----------
+    file_path : str
+        путь к файлу
+    algorithms : tuple[str, ...]
+        имена алгоритмов
+    previous : dict | None
+        данные записей прошлой проверки в формате результата
+
+    Returns
+    -------
+    tuple[dict[str, str], dict, int]
+        отпечатки по алгоритмам, данные записей (<code>algorithm</code> - алгоритм отпечатков записей,
+        <code>size</code>, <code>checksum</code>, <code>entries</code> - записи из <code>read_header</code>
+        с отпечатком <code>digest</code>) и объём прочитанных данных записей
+
+    Raises
+    ------
+    PboError
+        если файл не является архивом PBO
+    """
+
+    content_algorithms: list[str] = [get_file_algorithm(algorithm) for algorithm in algorithms if is_content_algorithm(algorithm)]
+    file_algorithms: list[str] = [algorithm for algorithm in algorithms if not is_content_algorithm(algorithm)]
+    entry_algorithm: str = content_algorithms[0]
+
+    with open(file_path, 'rb') as f:
+        try:
+            file_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError as e:
+            raise PboError('Пустой файл') from e
+
+    with file_map, memoryview(file_map) as file_view:
+        header: dict = read_header(file_map)
+        file_size: int = len(file_map)
+
+        if previous is None or file_algorithms or len(content_algorithms) > 1 or previous['algorithm'] != entry_algorithm:
+            previous = {'size': None, 'checksum': None, 'entries': []}
+
+        same_checksum: bool = header['checksum'] is not None and previous['checksum'] == header['checksum'] and previous['size'] == file_size
+        previous_entries: dict[str, dict] = {entry['name']: entry for entry in previous['entries']}
+
+        file_hashers = {algorithm: fingerprint.ALGORITHMS[algorithm]() for algorithm in file_algorithms}
+        entry_digests: dict[str, list[tuple[str, str]]] = {algorithm: [] for algorithm in content_algorithms}
+        hashed_bytes = 0
+
+        update_hashers(file_hashers.values(), file_view, 0, header['data_offset'])
+
+        for entry in header['entries']:
+            previous_entry: dict | None = previous_entries.get(entry['name'])
+
+            if can_reuse_digest(entry, previous_entry, same_checksum):
+                entry['digest'] = previous_entry['digest']
+                entry_digests[entry_algorithm].append((entry['name'], entry['digest']))
+                continue
+
+            entry_hashers = {algorithm: fingerprint.ALGORITHMS[algorithm]() for algorithm in content_algorithms}
+            update_hashers([*entry_hashers.values(), *file_hashers.values()], file_view, entry['offset'], entry['data_size'])
+            hashed_bytes += entry['data_size']
+
+            for algorithm, entry_hasher in entry_hashers.items():
+                entry_digests[algorithm].append((entry['name'], entry_hasher.hexdigest()))
+            entry['digest'] = entry_digests[entry_algorithm][-1][1]
+
+        update_hashers(file_hashers.values(), file_view, header['data_end'], file_size - header['data_end'])
+
+    digests: dict[str, str] = {algorithm: file_hasher.hexdigest() for algorithm, file_hasher in file_hashers.items()}
+    for algorithm in content_algorithms:
+        digests[f'{ALGORITHM_PREFIX}{algorithm}'] = get_content_digest(algorithm, header['properties'], entry_digests[algorithm])
+
+    return digests, {'algorithm': entry_algorithm, 'size': file_size, 'checksum': header['checksum'], 'entries': header['entries']}, hashed_bytes
+
+
+def update_hashers(hashers, file_view: memoryview, offset: int, size: int):
+    """Передаёт участок файла в хэши блоками, не копируя данные."""
+
+    hashers = list(hashers)
+    if not hashers:
+        return
+
+    chunk_size: int = fingerprint.get_chunk_size(size)
+
+    for chunk_offset in range(offset, offset + size, chunk_size):
+        with file_view[chunk_offset:min(chunk_offset + chunk_size, offset + size)] as chunk:
+            for hasher in hashers:
+                hasher.update(chunk)
+
+
+def compare_entries(previous: dict | None, current: dict) -> dict[str, list[str]] | None:
+    """Сравнивает записи двух версий PBO.
+
+    Returns
+    -------
+    dict[str, list[str]] | None
+        имена записей <code>modified</code>, <code>added</code> и <code>removed</code> или None,
+        если записи прошлой версии неизвестны
+    """
+
+    if previous is None or previous['algorithm'] != current['algorithm']:
+        return None
+
+    previous_digests: dict[str, str] = {entry['name']: entry['digest'] for entry in previous['entries']}
+    current_digests: dict[str, str] = {entry['name']: entry['digest'] for entry in current['entries']}
+
+    return {
+        'modified': sorted(name for name in current_digests.keys() & previous_digests.keys() if current_digests[name] != previous_digests[name]),
+        'added': sorted(current_digests.keys() - previous_digests.keys()),
+        'removed': sorted(previous_digests.keys() - current_digests.keys())
+    }
+
+
+def format_changes(changes: dict[str, list[str]], limit: int = 5) -> str:
+    """Возвращает список изменённых записей для сообщения: добавленные отмечаются <code>+</code>, удалённые <code>-</code>."""
+
+    names: list[str] = [*changes['modified'], *(f'+{name}' for name in changes['added']), *(f'-{name}' for name in changes['removed'])]
+    if not names:
+        return 'только свойства архива'
+
+    changes_text: str = ', '.join(names[:limit])
+    if len(names) > limit:
+        changes_text += f' и ещё {len(names) - limit}'
+
+    return changes_text
@@ -0,0 +1,165 @@
+import asyncio
+import hashlib
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Mapping
+
+
+class WebhookRateLimiter:
+    """Планировщик запросов к Discord Webhook с учётом ограничений частоты.\n
+    Следит за заголовками <code>X-RateLimit-Remaining</code> и <code>X-RateLimit-Reset-After</code>,
+    выдерживает паузу после ответа 429 и ограничивает количество одновременных запросов.
+    """
+
+    def __init__(self, concurrency: int):
+        """Инициализирует новый планировщик.
+
+        Parameters
+        ----------
+        concurrency : int
+            максимальное количество одновременных запросов
+        """
+
+        self.semaphore = asyncio.Semaphore(max(1, concurrency))
+        self.lock = asyncio.Lock()
+        self.remaining: int | None = None
+        self.reset_at: float = 0.0
+        self.blocked_until: float = 0.0
+        self.total_wait: float = 0.0
+        self.active: int = 0
+
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Ожидает разрешения на запрос и удерживает место на время его выполнения."""
+
+        self.active += 1
+
+        try:
+            async with self.semaphore:
+                await self.wait_for_bucket()
+                yield
+        finally:
+            self.active -= 1
+
+
+    def get_delay(self) -> float:
+        """Возвращает, сколько секунд осталось до разрешения следующего запроса по известному состоянию окна."""
+
+        now = time.monotonic()
+        delay: float = self.blocked_until - now
+        if self.remaining is not None and self.remaining <= 0:
+            delay = max(delay, self.reset_at - now)
+
+        return max(0.0, delay)
+
+
+    async def wait_for_bucket(self):
+        """Ожидает, пока в текущем окне ограничения не появится свободный запрос, и резервирует его."""
+
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+
+                if self.remaining is not None and now >= self.reset_at:
+                    self.remaining = None
+
+                wait_time = self.blocked_until - now
+                if self.remaining is not None and self.remaining <= 0:
+                    wait_time = max(wait_time, self.reset_at - now)
+
+                if wait_time <= 0:
+                    break
+
+                self.total_wait += wait_time
+                await asyncio.sleep(wait_time)
+
+            if self.remaining is not None:
+                self.remaining -= 1
+
+
+    def update(self, headers: Mapping[str, str]):
+        """Обновляет состояние окна ограничения по заголовкам ответа Discord."""
+
+        remaining = headers.get('X-RateLimit-Remaining')
+        reset_after = headers.get('X-RateLimit-Reset-After')
+
+        if remaining is None or reset_after is None:
+            return
+
+        self.remaining = int(remaining)
+        self.reset_at = time.monotonic() + float(reset_after)
+
+
+    def block(self, retry_after: float):
+        """Приостанавливает все запросы после ответа 429.
+
+        Parameters
+        ----------
+        retry_after : float
+            время ожидания в секундах из <code>Retry-After</code> или тела ответа
+        """
+
+        self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+
+class Webhook:
+    """Discord Webhook со своим состоянием ограничений частоты.\n
+    Идентификатор - начало SHA256 адреса: адрес содержит токен, поэтому в журнал и базу записывается только идентификатор.
+    """
+
+    def __init__(self, url: str, concurrency: int):
+        self.url = url
+        self.id: str = hashlib.sha256(url.encode()).hexdigest()[:12]
+        self.rate_limiter = WebhookRateLimiter(concurrency)
+
+
+class WebhookPool:
+    """Набор Webhook, между которыми распределяются запросы.\n
+    Каждый запрос получает Webhook, который раньше других сможет его принять по своим ограничениям частоты,
+    а при равенстве - с меньшим количеством запросов в работе. Оставшиеся равные перебираются по кругу.
+    """
+
+    def __init__(self, urls: list[str], concurrency: int):
+        """Инициализирует набор.
+
+        Parameters
+        ----------
+        urls : list[str]
+            адреса Webhook
+        concurrency : int
+            максимальное количество одновременных запросов к одному Webhook
+        """
+
+        self.concurrency = concurrency
+        self.webhooks: list[Webhook] = []
+        self.next_index = 0
+        self.update(urls)
+
+
+    def update(self, urls: list[str]):
+        """Обновляет список адресов. Webhook с прежними адресами сохраняют состояние ограничений частоты."""
+
+        webhooks: dict[str, Webhook] = {webhook.url: webhook for webhook in self.webhooks}
+        self.webhooks = [webhooks.get(url) or Webhook(url, self.concurrency) for url in urls]
+        self.next_index = 0
+
+
+    @property
+    def total_wait(self) -> float:
+        """Суммарное время ожидания из-за ограничений частоты по всем Webhook."""
+
+        return sum(webhook.rate_limiter.total_wait for webhook in self.webhooks)
+
+
+    def choose(self) -> Webhook:
+        """Возвращает наименее загруженный Webhook для следующего запроса."""
+
+        if not self.webhooks:
+            raise RuntimeError('Не указан ни один Webhook')
+
+        start_index: int = self.next_index
+        self.next_index = (self.next_index + 1) % len(self.webhooks)
+        webhooks: list[Webhook] = self.webhooks[start_index:] + self.webhooks[:start_index]
+
+        return min(webhooks, key=lambda webhook: (webhook.rate_limiter.get_delay(), webhook.rate_limiter.active))
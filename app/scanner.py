@@ -0,0 +1,198 @@
+import os
+from fnmatch import fnmatchcase
+from pathlib import PurePosixPath
+
+import app.logger as logger
+
+
+def get_file_stat(file_path: str) -> dict:
+    """Возвращает метаданные файла, по которым определяется его изменение без хэширования."""
+
+    file_stat = os.stat(file_path)
+    return {
+        'size': file_stat.st_size,
+        'mtime_ns': file_stat.st_mtime_ns,
+        'inode': file_stat.st_ino
+    }
+
+
+def get_entry_stat(entry: os.DirEntry) -> dict:
+    """Возвращает метаданные файла из записи <code>os.scandir</code>.\n
+    Результат совпадает с <code>get_file_stat</code>, но использует данные, уже полученные при чтении папки.
+    """
+
+    entry_stat = entry.stat()
+    return {
+        'size': entry_stat.st_size,
+        'mtime_ns': entry_stat.st_mtime_ns,
+        'inode': entry.inode()
+    }
+
+
+def create_scanner(user_config: dict) -> 'FileScanner':
+    """Создаёт сканер по конфигурации пользователя.\n
+    Если шаблоны <code>include_patterns</code> не заданы, ищутся файлы <code>{target_files_prefix}*.pbo</code>.
+    """
+
+    roots: list[str] = [user_config['search_folder'], *user_config.get('extra_search_folders', [])]
+    include: list[str] = user_config.get('include_patterns') or [f'{user_config['target_files_prefix']}*.pbo']
+
+    return FileScanner(roots, include, user_config.get('exclude_patterns', []), user_config.get('recursive_scan', True))
+
+
+class FileScanner:
+    """Сканер файлов в нескольких папках по шаблонам включения и исключения.\n
+    Файл определяется путём относительно своей папки через <code>/</code> (для файлов в корне папки - просто
+    именем). Если такой путь есть в нескольких папках, используется файл из первой.
+    Шаблон без <code>/</code> сравнивается с именем файла или папки, шаблон с <code>/</code> - с относительным
+    путём целиком (поддерживается <code>**</code>). Исключённые папки не обходятся.
+    """
+
+    def __init__(self, roots: list[str], include: list[str], exclude: list[str], recursive: bool = True):
+        """Инициализирует новый сканер.
+
+        Parameters
+        ----------
+        roots : list[str]
+            папки для поиска
+        include : list[str]
+            шаблоны файлов, которые нужно найти
+        exclude : list[str]
+            шаблоны файлов и папок, которые нужно пропустить
+        recursive : bool
+            искать ли файлы во вложенных папках
+        """
+
+        self.logger = logger.setup_logging(__name__)
+        self.roots = [root for root in roots if root]
+        self.include = include
+        self.exclude = exclude
+        self.recursive = recursive
+        self.directories: list[str] = []
+        self.counters: dict[str, int] = {}
+
+
+    def scan(self) -> dict[str, tuple[str, dict]]:
+        """Обходит папки и возвращает подходящие файлы.\n
+        Пропущенные файлы не записываются в журнал по отдельности, а учитываются в <code>counters</code>.
+        Обойдённые папки сохраняются в <code>directories</code>.
+
+        Returns
+        -------
+        dict[str, tuple[str, dict]]
+            относительные пути файлов, полные пути к ним и их метаданные (см. <code>get_file_stat</code>)
+        """
+
+        self.counters = dict.fromkeys(('directories', 'matched', 'skipped', 'excluded', 'duplicates', 'errors'), 0)
+        self.directories = []
+        files: dict[str, tuple[str, dict]] = {}
+
+        for root in self.roots:
+            folders: list[tuple[str, str]] = [(root, '')]
+
+            while folders:
+                folder, relative_folder = folders.pop()
+                self.directories.append(folder)
+                self.counters['directories'] += 1
+
+                try:
+                    with os.scandir(folder) as entries:
+                        for entry in entries:
+                            self.scan_entry(entry, f'{relative_folder}{entry.name}', files, folders)
+                except OSError as e:
+                    self.counters['errors'] += 1
+                    self.logger.warning(f'Папка {folder} недоступна: {str(e)}')
+
+        self.counters['matched'] = len(files)
+
+        return files
+
+
+    def scan_entry(self, entry: os.DirEntry, relative_path: str, files: dict, folders: list):
+        """Обрабатывает запись папки: добавляет подходящий файл в <code>files</code> или вложенную папку в <code>folders</code>."""
+
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                if not self.recursive:
+                    return
+                if self.match(relative_path, self.exclude):
+                    self.counters['excluded'] += 1
+                    return
+
+                folders.append((entry.path, f'{relative_path}/'))
+                return
+
+            if not entry.is_file():
+                return
+            if self.match(relative_path, self.exclude):
+                self.counters['excluded'] += 1
+                return
+            if not self.match(relative_path, self.include):
+                self.counters['skipped'] += 1
+                return
+            if relative_path in files:
+                self.counters['duplicates'] += 1
+                return
+
+            files[relative_path] = (entry.path, get_entry_stat(entry))
+        except OSError:
+            self.counters['errors'] += 1
+
+
+    def resolve(self, file_names: list[str]) -> dict[str, tuple[str, dict]]:
+        """Находит указанные файлы без обхода папок.
+
+        Parameters
+        ----------
+        file_names : list[str]
+            относительные пути файлов, как их возвращает <code>scan</code>
+
+        Returns
+        -------
+        dict[str, tuple[str, dict]]
+            найденные подходящие файлы в формате <code>scan</code>
+        """
+
+        files: dict[str, tuple[str, dict]] = {}
+
+        for file_name in file_names:
+            if self.match(file_name, self.exclude) or not self.match(file_name, self.include):
+                continue
+
+            for root in self.roots:
+                file_path = os.path.join(root, *file_name.split('/'))
+
+                try:
+                    files[file_name] = (file_path, get_file_stat(file_path))
+                    break
+                except OSError:
+                    continue
+            else:
+                self.logger.warning(f'Файл {file_name} недоступен')
+
+        return files
+
+
+    def match(self, relative_path: str, patterns: list[str]) -> bool:
+        """Подходит ли путь хотя бы под один из шаблонов."""
+
+        name: str = relative_path.rsplit('/', 1)[-1]
+
+        for pattern in patterns:
+            if '/' in pattern:
+                if PurePosixPath(relative_path).full_match(pattern):
+                    return True
+            elif fnmatchcase(name, pattern):
+                return True
+
+        return False
+
+
+    def get_summary(self) -> str:
+        """Возвращает сводку последнего обхода для журнала."""
+
+        return (
+            f'Найдено файлов: {self.counters['matched']} '
+            f'(папок: {self.counters['directories']}, не подходят: {self.counters['skipped']}, '
+            f'исключены: {self.counters['excluded']}, повторы: {self.counters['duplicates']}, ошибки: {self.counters['errors']})'
+        )
@@ -0,0 +1,491 @@
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from os import path
+
+import app.logger as logger
+
+
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS files (
+    name TEXT PRIMARY KEY,
+    digest TEXT,
+    size INTEGER,
+    mtime_ns INTEGER,
+    inode INTEGER,
+    last_seen_at REAL NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    sent_at TEXT NOT NULL,
+    outcome TEXT NOT NULL,
+    method TEXT,
+    original_size INTEGER,
+    compressed_size INTEGER,
+    compression_ratio REAL,
+    parts INTEGER,
+    error TEXT
+);
+
+CREATE INDEX IF NOT EXISTS history_name ON history (name, id);
+CREATE INDEX IF NOT EXISTS history_sent_at ON history (sent_at);
+
+CREATE TABLE IF NOT EXISTS outbox (
+    name TEXT PRIMARY KEY,
+    digest TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS entries (
+    name TEXT PRIMARY KEY,
+    entries TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS deliveries (
+    name TEXT NOT NULL,
+    webhook TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    delivered_at REAL NOT NULL,
+    PRIMARY KEY (name, webhook)
+);
+
+CREATE TABLE IF NOT EXISTS bases (
+    name TEXT PRIMARY KEY,
+    digest TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS archives (
+    key TEXT PRIMARY KEY,
+    archive TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used_at REAL NOT NULL
+);
+"""
+
+
+class ManifestStore:
+    """Хранилище состояния отправщика в базе SQLite.\n
+    Хранит текущий отпечаток и метаданные каждого файла, записи отправленных версий PBO,
+    историю отправок, очередь отправки, версии, доставленные в каждый Webhook,
+    список базовых версий для патчей (см. <code>BaseStore</code>) и кэша архивов (см. <code>ArchiveCache</code>).
+    Каждое изменение файла записывается отдельной транзакцией, поэтому сбой во время записи
+    не затрагивает остальные файлы. База работает в режиме WAL.
+    """
+
+    def __init__(self, file_path: str):
+        """Открывает базу и создаёт её таблицы, если их нет.
+
+        Parameters
+        ----------
+        file_path : str
+            путь к файлу базы
+        """
+
+        self.logger = logger.setup_logging(__name__)
+        self.FILE_PATH = file_path
+        self.connection = sqlite3.connect(file_path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+
+        with self.connection:
+            self.connection.executescript(SCHEMA)
+
+
+    def close(self):
+        """Закрывает соединение с базой."""
+
+        self.connection.close()
+
+
+    def is_initialized(self) -> bool:
+        """Заполнялась ли база раньше (см. <code>import_json</code>)."""
+
+        return self.get_meta('version') is not None
+
+
+    def get_meta(self, key: str, default: str | None = None) -> str | None:
+        """Возвращает служебное значение базы."""
+
+        row = self.connection.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row['value'] if row else default
+
+
+    def set_meta(self, key: str, value):
+        """Записывает служебное значение базы."""
+
+        with self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, str(value)))
+
+
+    def read_digests(self) -> dict[str, str]:
+        """Возвращает отпечатки последней успешной отправки файлов."""
+
+        rows = self.connection.execute('SELECT name, digest FROM files WHERE digest IS NOT NULL')
+        return {row['name']: row['digest'] for row in rows}
+
+
+    def read_stats(self) -> dict[str, dict]:
+        """Возвращает метаданные файлов (размер, mtime_ns, inode) на момент их последнего хэширования."""
+
+        rows = self.connection.execute('SELECT name, size, mtime_ns, inode FROM files WHERE size IS NOT NULL')
+        return {row['name']: {'size': row['size'], 'mtime_ns': row['mtime_ns'], 'inode': row['inode']} for row in rows}
+
+
+    def set_digest(self, file_name: str, digest: str):
+        """Записывает отпечаток файла без записи в историю."""
+
+        with self.connection:
+            self.upsert_digest(file_name, digest)
+
+
+    def set_stat(self, file_name: str, file_stat: dict):
+        """Записывает метаданные хэшированного файла."""
+
+        with self.connection:
+            self.connection.execute(
+                'INSERT INTO files (name, size, mtime_ns, inode, last_seen_at) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT (name) DO UPDATE SET size = excluded.size, mtime_ns = excluded.mtime_ns, '
+                'inode = excluded.inode, last_seen_at = excluded.last_seen_at',
+                (file_name, file_stat['size'], file_stat['mtime_ns'], file_stat['inode'], time.time())
+            )
+
+
+    def touch_files(self, file_names: list[str]):
+        """Отмечает файлы, найденные при проверке всей папки (см. <code>prune</code>)."""
+
+        with self.connection:
+            now = time.time()
+            self.connection.executemany('UPDATE files SET last_seen_at = ? WHERE name = ?', ((now, file_name) for file_name in file_names))
+
+
+    def commit_file(self, file_name: str, digest: str, outcome: str = 'sent', record: dict | None = None, entries: dict | None = None):
+        """Одной транзакцией сохраняет отпечаток и записи PBO отправленного файла, добавляет запись
+        в историю и убирает файл из очереди отправки.
+
+        Parameters
+        ----------
+        file_name : str
+            имя файла
+        digest : str
+            отпечаток отправленного содержимого
+        outcome : str
+            результат для истории (см. <code>add_history</code>)
+        record : dict | None
+            данные отправки для истории (см. <code>add_history</code>)
+        entries : dict | None
+            записи PBO (см. <code>pbo.fingerprint_pbo</code>) или None, если файл не разобран как PBO
+        """
+
+        with self.connection:
+            self.upsert_digest(file_name, digest)
+            self.upsert_entries(file_name, entries)
+            self.insert_history(file_name, outcome, record or {})
+            self.connection.execute('DELETE FROM outbox WHERE name = ?', (file_name,))
+
+
+    def read_entries(self) -> dict[str, dict]:
+        """Возвращает записи PBO последних отправленных версий файлов."""
+
+        rows = self.connection.execute('SELECT name, entries FROM entries')
+        return {row['name']: json.loads(row['entries']) for row in rows}
+
+
+    def set_entries(self, file_name: str, entries: dict | None):
+        """Записывает записи PBO файла без записи в историю."""
+
+        with self.connection:
+            self.upsert_entries(file_name, entries)
+
+
+    def add_history(self, file_name: str, outcome: str, record: dict | None = None):
+        """Добавляет запись в историю отправок.
+
+        Parameters
+        ----------
+        file_name : str
+            имя файла
+        outcome : str
+            результат: sent, notified (отправлено уведомление о большом файле) или failed
+        record : dict | None
+            данные отправки: <code>sent_at</code>, <code>method</code>, <code>original_size</code>,
+            <code>compressed_size</code>, <code>compression_ratio</code>, <code>parts</code>, <code>error</code>
+        """
+
+        with self.connection:
+            self.insert_history(file_name, outcome, record or {})
+
+
+    def read_history(self, file_name: str, limit: int = 20) -> list[dict]:
+        """Возвращает последние записи истории отправок файла, начиная с новых."""
+
+        rows = self.connection.execute('SELECT * FROM history WHERE name = ? ORDER BY id DESC LIMIT ?', (file_name, limit))
+        return [dict(row) for row in rows]
+
+
+    def upsert_digest(self, file_name: str, digest: str):
+        self.connection.execute(
+            'INSERT INTO files (name, digest, last_seen_at) VALUES (?, ?, ?) '
+            'ON CONFLICT (name) DO UPDATE SET digest = excluded.digest, last_seen_at = excluded.last_seen_at',
+            (file_name, digest, time.time())
+        )
+
+
+    def upsert_entries(self, file_name: str, entries: dict | None):
+        if entries is None:
+            self.connection.execute('DELETE FROM entries WHERE name = ?', (file_name,))
+            return
+
+        self.connection.execute('INSERT OR REPLACE INTO entries (name, entries) VALUES (?, ?)', (file_name, json.dumps(entries, ensure_ascii=False)))
+
+
+    def insert_history(self, file_name: str, outcome: str, record: dict):
+        self.connection.execute(
+            'INSERT INTO history (name, sent_at, outcome, method, original_size, compressed_size, compression_ratio, parts, error) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (
+                file_name,
+                record.get('sent_at') or datetime.now().isoformat(timespec='seconds'),
+                outcome,
+                record.get('method'),
+                record.get('original_size'),
+                record.get('compressed_size'),
+                record.get('compression_ratio'),
+                record.get('parts'),
+                record.get('error')
+            )
+        )
+
+
+    def read_outbox(self) -> dict[str, dict]:
+        """Возвращает файлы очереди отправки."""
+
+        rows = self.connection.execute('SELECT name, digest, attempts, next_attempt_at, last_error FROM outbox')
+        return {row['name']: {key: row[key] for key in ('digest', 'attempts', 'next_attempt_at', 'last_error')} for row in rows}
+
+
+    def save_outbox_item(self, file_name: str, item: dict):
+        """Записывает файл очереди отправки."""
+
+        with self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO outbox (name, digest, attempts, next_attempt_at, last_error) VALUES (?, ?, ?, ?, ?)',
+                (file_name, item['digest'], item['attempts'], item['next_attempt_at'], item['last_error'])
+            )
+
+
+    def remove_outbox_item(self, file_name: str):
+        """Удаляет файл из очереди отправки."""
+
+        with self.connection:
+            self.connection.execute('DELETE FROM outbox WHERE name = ?', (file_name,))
+
+
+    def read_deliveries(self) -> dict[str, dict[str, str]]:
+        """Возвращает отпечатки версий файлов, доставленных в каждый Webhook: имя файла -> идентификатор Webhook -> отпечаток."""
+
+        deliveries: dict[str, dict[str, str]] = {}
+        for row in self.connection.execute('SELECT name, webhook, digest FROM deliveries'):
+            deliveries.setdefault(row['name'], {})[row['webhook']] = row['digest']
+
+        return deliveries
+
+
+    def save_delivery(self, file_name: str, webhook_id: str, digest: str):
+        """Записывает доставку версии файла в Webhook."""
+
+        with self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO deliveries (name, webhook, digest, delivered_at) VALUES (?, ?, ?, ?)',
+                (file_name, webhook_id, digest, time.time())
+            )
+
+
+    def read_bases(self) -> dict[str, dict]:
+        """Возвращает сохранённые базовые версии файлов."""
+
+        rows = self.connection.execute('SELECT name, digest, size, last_used_at FROM bases')
+        return {row['name']: {key: row[key] for key in ('digest', 'size', 'last_used_at')} for row in rows}
+
+
+    def save_base(self, file_name: str, base: dict):
+        """Записывает базовую версию файла."""
+
+        with self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO bases (name, digest, size, last_used_at) VALUES (?, ?, ?, ?)',
+                (file_name, base['digest'], base['size'], base['last_used_at'])
+            )
+
+
+    def remove_base(self, file_name: str):
+        """Удаляет базовую версию файла из списка."""
+
+        with self.connection:
+            self.connection.execute('DELETE FROM bases WHERE name = ?', (file_name,))
+
+
+    def read_archives(self) -> dict[str, dict]:
+        """Возвращает архивы из кэша: ключ -> данные архива с размером <code>size</code> и временем использования <code>last_used_at</code>."""
+
+        rows = self.connection.execute('SELECT key, archive, size, last_used_at FROM archives')
+        return {row['key']: {**json.loads(row['archive']), 'size': row['size'], 'last_used_at': row['last_used_at']} for row in rows}
+
+
+    def save_archive(self, key: str, archive: dict):
+        """Записывает архив кэша."""
+
+        archive_data: dict = {name: value for name, value in archive.items() if name not in ('size', 'last_used_at')}
+
+        with self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO archives (key, archive, size, last_used_at) VALUES (?, ?, ?, ?)',
+                (key, json.dumps(archive_data, ensure_ascii=False), archive['size'], archive['last_used_at'])
+            )
+
+
+    def remove_archive(self, key: str):
+        """Удаляет архив из списка кэша."""
+
+        with self.connection:
+            self.connection.execute('DELETE FROM archives WHERE key = ?', (key,))
+
+
+    def prune(self, history_days: int, history_max_records: int, forget_missing_days: int) -> list[str]:
+        """Удаляет устаревшие данные. Значение 0 отключает соответствующее ограничение.
+
+        Parameters
+        ----------
+        history_days : int
+            срок хранения записей истории в днях
+        history_max_records : int
+            максимальное количество записей истории одного файла
+        forget_missing_days : int
+            через сколько дней отсутствия в папке забывается отпечаток файла.
+            Файлы из очереди отправки не забываются
+
+        Returns
+        -------
+        list[str]
+            имена забытых файлов
+        """
+
+        with self.connection:
+            if history_days > 0:
+                history_cutoff = (datetime.now() - timedelta(days=history_days)).isoformat(timespec='seconds')
+                self.connection.execute('DELETE FROM history WHERE sent_at < ?', (history_cutoff,))
+
+            if history_max_records > 0:
+                self.connection.execute(
+                    'DELETE FROM history WHERE id IN ('
+                    'SELECT id FROM (SELECT id, ROW_NUMBER() OVER (PARTITION BY name ORDER BY id DESC) AS position FROM history) '
+                    'WHERE position > ?)',
+                    (history_max_records,)
+                )
+
+            if forget_missing_days <= 0:
+                return []
+
+            missing_cutoff = time.time() - forget_missing_days * 24 * 60 * 60
+            rows = self.connection.execute(
+                'DELETE FROM files WHERE last_seen_at < ? AND name NOT IN (SELECT name FROM outbox) RETURNING name',
+                (missing_cutoff,)
+            ).fetchall()
+            self.connection.execute('DELETE FROM entries WHERE name NOT IN (SELECT name FROM files)')
+            self.connection.execute('DELETE FROM deliveries WHERE name NOT IN (SELECT name FROM files)')
+
+        forgotten_files: list[str] = [row['name'] for row in rows]
+        if forgotten_files:
+            self.logger.info(f'Забыты давно отсутствующие файлы: {len(forgotten_files)}')
+
+        return forgotten_files
+
+
+    def import_json(self, hash_file_path: str, stat_file_path: str, outbox_file_path: str, legacy_algorithm: str):
+        """Однократно переносит состояние из файлов JSON прежних версий в пустую базу.\n
+        Перенесённые файлы переименовываются в <code>*.json.bak</code>.
+
+        Parameters
+        ----------
+        hash_file_path : str
+            путь к манифесту хэшей
+        stat_file_path : str
+            путь к манифесту метаданных
+        outbox_file_path : str
+            путь к очереди отправки
+        legacy_algorithm : str
+            алгоритм манифеста хэшей старого формата (имя файла -> хэш)
+        """
+
+        if self.is_initialized():
+            return
+
+        hash_manifest: dict = self.read_json(hash_file_path)
+        if hash_manifest and 'version' not in hash_manifest:
+            hash_manifest = {'algorithm': legacy_algorithm, 'files': hash_manifest}
+
+        files_stat: dict = self.read_json(stat_file_path)
+        outbox_items: dict = self.read_json(outbox_file_path)
+        now = time.time()
+
+        with self.connection:
+            for file_name, digest in hash_manifest.get('files', {}).items():
+                self.connection.execute('INSERT INTO files (name, digest, last_seen_at) VALUES (?, ?, ?)', (file_name, digest, now))
+
+            for file_name, file_stat in files_stat.get('files', {}).items():
+                self.connection.execute(
+                    'INSERT INTO files (name, size, mtime_ns, inode, last_seen_at) VALUES (?, ?, ?, ?, ?) '
+                    'ON CONFLICT (name) DO UPDATE SET size = excluded.size, mtime_ns = excluded.mtime_ns, inode = excluded.inode',
+                    (file_name, file_stat['size'], file_stat['mtime_ns'], file_stat['inode'], now)
+                )
+
+            for file_name, record in hash_manifest.get('history', {}).items():
+                self.insert_history(file_name, 'sent', record)
+
+            for file_name, item in outbox_items.items():
+                self.connection.execute(
+                    'INSERT INTO outbox (name, digest, attempts, next_attempt_at, last_error) VALUES (?, ?, ?, ?, ?)',
+                    (file_name, item['digest'], item['attempts'], item['next_attempt_at'], item['last_error'])
+                )
+
+            if 'algorithm' in hash_manifest:
+                self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('algorithm', ?)", (hash_manifest['algorithm'],))
+
+            self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('runs', ?)", (str(files_stat.get('runs', 0)),))
+            self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (str(SCHEMA_VERSION),))
+
+        for file_path in (hash_file_path, stat_file_path, outbox_file_path):
+            if path.exists(file_path):
+                os.replace(file_path, f'{file_path}.bak')
+
+        if hash_manifest or files_stat or outbox_items:
+            self.logger.info(f'Состояние перенесено в базу {self.FILE_PATH}: файлов {len(hash_manifest.get('files', {}))}')
+
+
+    def read_json(self, file_path: str) -> dict:
+        """Считывает файл JSON прежней версии. Отсутствующий или повреждённый файл считается пустым."""
+
+        try:
+            if not path.exists(file_path):
+                return {}
+
+            with open(file_path, 'r', encoding='utf-8') as json_file:
+                return json.load(json_file)
+        except Exception as e:
+            self.logger.error(f'Ошибка при чтении файла {file_path}! Ошибка:\n{str(e)}')
+            return {}
@@ -0,0 +1,197 @@
+import asyncio
+import time
+from datetime import datetime, time as day_time
+from typing import AsyncIterator, Callable
+
+import app.logger as logger
+
+
+KB = 1024
+MB = 1024 * 1024
+STREAM_CHUNK_SIZE = 64 * KB
+
+
+class BandwidthLimiter:
+    """Ограничение скорости отправки по алгоритму token bucket.\n
+    Скорость задаётся в KB/s и может зависеть от времени суток: интервалы расписания
+    (<code>{"from": "18:00", "to": "23:30", "kbps": 256}</code>) проверяются по порядку,
+    вне интервалов действует общее ограничение. Ноль означает отправку без ограничения.
+    Одно ограничение делится между всеми одновременными запросами.
+    """
+
+    def __init__(self, rate_kbps: float, schedule: list[dict] | None = None, burst_seconds: float = 1.0):
+        """Инициализирует ограничение скорости.
+
+        Parameters
+        ----------
+        rate_kbps : float
+            скорость вне интервалов расписания в KB/s (0 - без ограничения)
+        schedule : list[dict] | None
+            интервалы расписания с ключами <code>from</code>, <code>to</code> (ЧЧ:ММ) и <code>kbps</code>.
+            Интервал, у которого <code>from</code> позже <code>to</code>, переходит через полночь
+        burst_seconds : float
+            сколько секунд отправки на текущей скорости накапливается за время простоя
+        """
+
+        self.logger = logger.setup_logging(__name__)
+        self.rate_kbps = max(0.0, float(rate_kbps))
+        self.schedule: list[tuple[day_time, day_time, float]] = []
+        self.burst_seconds = burst_seconds
+        self.tokens: float = 0.0
+        self.updated_at: float = time.monotonic()
+
+        for interval in schedule or []:
+            try:
+                self.schedule.append((
+                    day_time.fromisoformat(interval['from']),
+                    day_time.fromisoformat(interval['to']),
+                    max(0.0, float(interval['kbps']))
+                ))
+            except (KeyError, TypeError, ValueError):
+                self.logger.warning(f'Некорректный интервал расписания ограничения скорости {interval} пропущен')
+
+
+    def is_enabled(self) -> bool:
+        """Задано ли ограничение скорости хотя бы для части суток."""
+
+        return self.rate_kbps > 0 or any(rate_kbps > 0 for _, _, rate_kbps in self.schedule)
+
+
+    def get_rate(self, now: datetime | None = None) -> float:
+        """Возвращает текущую скорость в байтах в секунду (0 - без ограничения)."""
+
+        current_time: day_time = (now or datetime.now()).time()
+
+        for starts_at, ends_at, rate_kbps in self.schedule:
+            if starts_at <= ends_at:
+                in_interval = starts_at <= current_time < ends_at
+            else:
+                in_interval = current_time >= starts_at or current_time < ends_at
+
+            if in_interval:
+                return rate_kbps * KB
+
+        return self.rate_kbps * KB
+
+
+    async def consume(self, size: int) -> float:
+        """Списывает <code>size</code> байт и ожидает, если они превышают накопленный запас.\n
+        Запас может уйти в минус, тогда ожидание длится, пока он не восполнится: так блоки
+        больше запаса отправляются без дробления, а средняя скорость остаётся в пределах ограничения.
+
+        Returns
+        -------
+        float
+            время ожидания в секундах
+        """
+
+        rate: float = self.get_rate()
+        now = time.monotonic()
+
+        if rate <= 0:
+            self.tokens = 0.0
+            self.updated_at = now
+            return 0.0
+
+        self.tokens = min(self.tokens + (now - self.updated_at) * rate, rate * self.burst_seconds)
+        self.updated_at = now
+        self.tokens -= size
+
+        if self.tokens >= 0:
+            return 0.0
+
+        wait_time: float = -self.tokens / rate
+        await asyncio.sleep(wait_time)
+
+        return wait_time
+
+
+class UploadProgress:
+    """Ход отправки одного запроса: скорость, доля отправленного и оставшееся время.\n
+    Сообщения о ходе передаются функции <code>emit</code> не чаще раза в <code>interval</code> секунд,
+    чтобы не перегружать интерфейс. Для небольших запросов, отправленных быстрее интервала, сообщений нет.
+    """
+
+    def __init__(self, label: str, total_bytes: int, emit: Callable[[str], None], interval: float = 1.0):
+        """Начинает отслеживание отправки.
+
+        Parameters
+        ----------
+        label : str
+            что отправляется (для текста сообщения)
+        total_bytes : int
+            размер запроса в байтах
+        emit : Callable[[str], None]
+            функция, получающая текст сообщения о ходе отправки
+        interval : float
+            минимальный интервал между сообщениями в секундах
+        """
+
+        self.label = label
+        self.total_bytes = total_bytes
+        self.emit = emit
+        self.interval = interval
+        self.sent_bytes = 0
+        self.started_at = time.monotonic()
+        self.reported_at = self.started_at
+
+
+    def advance(self, size: int):
+        """Отмечает отправку <code>size</code> байт и при необходимости сообщает о ходе отправки."""
+
+        self.sent_bytes += size
+        now = time.monotonic()
+
+        if now - self.reported_at < self.interval or self.sent_bytes >= self.total_bytes:
+            return
+
+        self.reported_at = now
+        self.emit(self.format(now - self.started_at))
+
+
+    def format(self, elapsed: float) -> str:
+        """Возвращает текст сообщения о ходе отправки."""
+
+        speed: float = self.sent_bytes / elapsed if elapsed > 0 else 0.0
+        progress_text = (
+            f'Отправка {self.label}: {self.sent_bytes / self.total_bytes:.0%} '
+            f'({self.sent_bytes / MB:.1f}/{self.total_bytes / MB:.1f} MB), {speed / KB:.0f} KB/s'
+        )
+
+        if speed > 0:
+            progress_text += f', осталось {format_duration((self.total_bytes - self.sent_bytes) / speed)}'
+
+        return progress_text
+
+
+def format_duration(seconds: float) -> str:
+    """Возвращает длительность в формате Ч:ММ:СС или М:СС."""
+
+    minutes, seconds = divmod(round(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+
+    return f'{hours}:{minutes:02}:{seconds:02}' if hours else f'{minutes}:{seconds:02}'
+
+
+async def iter_throttled(
+    data: bytes,
+    limiter: BandwidthLimiter | None,
+    progress: UploadProgress | None,
+    on_wait: Callable[[float], None] | None = None
+) -> AsyncIterator[bytes]:
+    """Отдаёт данные запроса блоками по <code>STREAM_CHUNK_SIZE</code> с учётом ограничения скорости и хода отправки.\n
+    Блок отдаётся после ожидания ограничения (его длительность передаётся <code>on_wait</code>), а ход отправки
+    учитывается, когда aiohttp запрашивает следующий блок, то есть после записи предыдущего в соединение.
+    """
+
+    for offset in range(0, len(data), STREAM_CHUNK_SIZE):
+        chunk: bytes = data[offset:offset + STREAM_CHUNK_SIZE]
+        if limiter:
+            wait_time: float = await limiter.consume(len(chunk))
+            if wait_time and on_wait:
+                on_wait(wait_time)
+
+        yield chunk
+
+        if progress:
+            progress.advance(len(chunk))
@@ -0,0 +1,332 @@
+import copy
+import os
+import threading
+import time
+
+from PyQt6.QtCore import QObject, QFileSystemWatcher, QTimer, pyqtSignal
+
+import app.logger as logger
+from app.scanner import FileScanner
+
+
+DEBOUNCE_MS = 500
+
+
+class FolderWatcher(QObject):
+    """Наблюдатель за папками с файлами .pbo. Наследует <code>QObject</code>.\n
+    Собирает изменённые файлы по событиям файловой системы и сообщает о них, когда
+    размер и время изменения файла не меняются в течение окна стабилизации, то есть
+    когда файл дописан.
+
+    Наблюдаются папки (событие папки приходит при создании, удалении и переименовании её файлов)
+    и подходящие файлы (событие файла приходит при записи в него на месте, которая не меняет папку).
+    Файл, заменённый переименованием, снимается с наблюдения и добавляется снова при перечитывании папки.
+    События собираются за <code>DEBOUNCE_MS</code>, после чего перечитывается
+    только содержимое изменившихся папок без обхода вложенных. Полный обход (при начале наблюдения
+    и появлении новой вложенной папки) выполняется в отдельном потоке, чтобы не задерживать интерфейс.
+    """
+
+    files_ready = pyqtSignal(list)
+    scan_finished = pyqtSignal(int, object, list)
+
+    def __init__(self, settle_seconds: float):
+        """Инициализирует новый наблюдатель.
+
+        Parameters
+        ----------
+        settle_seconds : float
+            время в секундах, в течение которого файл не должен меняться
+        """
+
+        super().__init__()
+        self.logger = logger.setup_logging(__name__)
+        self.settle_seconds = settle_seconds
+        self.scanner: FileScanner | None = None
+        self.snapshot: dict[str, tuple] = {}
+        self.paths: dict[str, str] = {}
+        self.pending: dict[str, tuple[tuple, float]] = {}
+        self.changed_folders: set[str] = set()
+        self.scan_id = 0
+        self.scanning = False
+        self.report_scan_changes = False
+
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self.on_folder_changed)
+        self.watcher.fileChanged.connect(self.on_file_changed)
+        self.scan_finished.connect(self.on_scan_finished)
+
+        self.debounce_timer = QTimer(self)
+        self.debounce_timer.setSingleShot(True)
+        self.debounce_timer.setInterval(DEBOUNCE_MS)
+        self.debounce_timer.timeout.connect(self.on_debounce_timer_timeout)
+
+        self.settle_timer = QTimer(self)
+        self.settle_timer.setInterval(1000)
+        self.settle_timer.timeout.connect(self.on_settle_timer_timeout)
+
+
+    def watch(self, file_scanner: FileScanner):
+        """Начинает наблюдение за папками сканера вместо предыдущих.\n
+        Папки добавляются в наблюдение после первого обхода, который выполняется в отдельном потоке.
+
+        Parameters
+        ----------
+        file_scanner : FileScanner
+            сканер, определяющий папки и подходящие файлы
+        """
+
+        if self.watcher.directories():
+            self.watcher.removePaths(self.watcher.directories())
+        if self.watcher.files():
+            self.watcher.removePaths(self.watcher.files())
+
+        self.scanner = file_scanner
+        self.snapshot = {}
+        self.paths = {}
+        self.pending.clear()
+        self.changed_folders.clear()
+        self.debounce_timer.stop()
+
+        if not any(os.path.isdir(root) for root in file_scanner.roots):
+            self.logger.warning(f'Не удалось начать наблюдение за папками {', '.join(file_scanner.roots)}')
+            return
+
+        self.start_scan(report_changes=False)
+
+
+    def start_scan(self, report_changes: bool = True):
+        """Запускает полный обход папок в отдельном потоке. Результат передаётся в <code>on_scan_finished</code>.
+
+        Parameters
+        ----------
+        report_changes : bool
+            считать ли найденные новые и изменённые файлы изменёнными (при первом обходе - нет).
+            Если обход запускается до завершения первого, изменения тоже не учитываются
+        """
+
+        if self.scanning:
+            report_changes = report_changes and self.report_scan_changes
+
+        self.scan_id += 1
+        self.scanning = True
+        self.report_scan_changes = report_changes
+        scan_id: int = self.scan_id
+        file_scanner: FileScanner = copy.copy(self.scanner)
+
+        def run_scan():
+            try:
+                files: dict[str, tuple[str, dict]] = file_scanner.scan()
+            except Exception as e:
+                self.logger.error(f'Ошибка при обходе наблюдаемых папок! Ошибка:\n{str(e)}')
+                files = {}
+
+            self.scan_finished.emit(scan_id, files, file_scanner.directories)
+
+        threading.Thread(target=run_scan, name='pbo_watch_scan', daemon=True).start()
+
+
+    def on_scan_finished(self, scan_id: int, files: dict[str, tuple[str, dict]], directories: list[str]):
+        """Обработчик завершения полного обхода. Выполняется в потоке интерфейса.
+        Результат обхода, запущенного до последнего вызова <code>start_scan</code>, пропускается.
+        """
+
+        if scan_id != self.scan_id:
+            return
+
+        self.scanning = False
+        self.paths = {file_name: file_path for file_name, file_path in self.paths.items() if file_name in files}
+        self.snapshot = {file_name: file_stat for file_name, file_stat in self.snapshot.items() if file_name in files}
+        self.update_files(files, self.report_scan_changes)
+        self.watch_paths(directories)
+        self.watch_files()
+
+        if not self.report_scan_changes:
+            self.logger.info(f'Начато наблюдение за папками {', '.join(self.scanner.roots)}')
+
+        if self.changed_folders:
+            self.debounce_timer.start()
+
+
+    def watch_paths(self, directories: list[str]):
+        """Приводит набор наблюдаемых папок к папкам последнего обхода."""
+
+        watched_paths = set(self.watcher.directories())
+        new_paths: list[str] = [directory for directory in directories if directory not in watched_paths]
+        stale_paths: list[str] = list(watched_paths - set(directories))
+
+        if stale_paths:
+            self.watcher.removePaths(stale_paths)
+        if new_paths:
+            self.watcher.addPaths(new_paths)
+
+
+    def watch_files(self):
+        """Приводит набор наблюдаемых файлов к известным подходящим файлам.\n
+        Заново добавляет файлы, снятые с наблюдения после удаления или замены.
+        """
+
+        watched_paths = set(self.watcher.files())
+        file_paths = set(self.paths.values())
+        new_paths: list[str] = [file_path for file_path in file_paths if file_path not in watched_paths]
+        stale_paths: list[str] = list(watched_paths - file_paths)
+
+        if stale_paths:
+            self.watcher.removePaths(stale_paths)
+        if new_paths:
+            self.watcher.addPaths(new_paths)
+
+
+    def on_folder_changed(self, changed_path: str):
+        """Обработчик события, когда изменилась папка или один из её файлов. Запоминает папку до конца ожидания."""
+
+        self.changed_folders.add(changed_path)
+        self.debounce_timer.start()
+
+
+    def on_file_changed(self, changed_path: str):
+        """Обработчик события, когда файл записан на месте, удалён или заменён. Запоминает папку файла до конца ожидания."""
+
+        self.on_folder_changed(os.path.dirname(changed_path))
+
+
+    def on_debounce_timer_timeout(self):
+        """Обработчик события таймера ожидания. Перечитывает изменившиеся папки."""
+
+        if self.scanning:
+            return
+
+        changed_folders: list[str] = sorted(self.changed_folders)
+        self.changed_folders.clear()
+        new_folders: list[str] = []
+
+        for folder in changed_folders:
+            new_folders.extend(self.rescan_folder(folder))
+
+        if new_folders:
+            self.start_scan()
+
+        if self.pending and not self.settle_timer.isActive():
+            self.settle_timer.start()
+
+
+    def rescan_folder(self, folder: str) -> list[str]:
+        """Перечитывает содержимое одной папки без обхода вложенных и отмечает новые и изменённые файлы.\n
+        Файлы удалённой папки забываются.
+
+        Returns
+        -------
+        list[str]
+            вложенные папки, за которыми ещё нет наблюдения
+        """
+
+        relative_folder: str | None = self.get_relative_folder(folder)
+        if relative_folder is None:
+            return []
+
+        folder_files: dict[str, tuple[str, dict]] = {}
+        subfolders: list[tuple[str, str]] = []
+        self.scanner.counters = dict.fromkeys(('directories', 'matched', 'skipped', 'excluded', 'duplicates', 'errors'), 0)
+
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    self.scanner.scan_entry(entry, f'{relative_folder}{entry.name}', folder_files, subfolders)
+        except OSError:
+            self.forget_folder(folder)
+            self.watch_files()
+            return []
+
+        for file_name, file_path in list(self.paths.items()):
+            if os.path.dirname(file_path) == folder and file_name not in folder_files:
+                del self.paths[file_name]
+                self.snapshot.pop(file_name, None)
+
+        self.update_files({
+            file_name: file
+            for file_name, file in folder_files.items()
+            if self.paths.get(file_name, file[0]) == file[0]
+        })
+        self.watch_files()
+
+        watched_paths = set(self.watcher.directories())
+
+        return [subfolder for subfolder, _ in subfolders if subfolder not in watched_paths]
+
+
+    def get_relative_folder(self, folder: str) -> str | None:
+        """Возвращает путь папки относительно папки поиска в формате <code>FileScanner</code> (с <code>/</code> в конце,
+        для папки поиска - пустую строку) или None, если папка не относится к наблюдаемым.
+        """
+
+        for root in self.scanner.roots:
+            try:
+                relative_path: str = os.path.relpath(folder, root)
+            except ValueError:
+                continue
+
+            if relative_path == '.':
+                return ''
+            if not relative_path.startswith('..'):
+                return relative_path.replace(os.sep, '/') + '/'
+
+        return None
+
+
+    def forget_folder(self, folder: str):
+        """Забывает файлы удалённой папки и её вложенных папок."""
+
+        folder_prefix: str = os.path.join(folder, '')
+
+        for file_name, file_path in list(self.paths.items()):
+            if file_path.startswith(folder_prefix):
+                del self.paths[file_name]
+                self.snapshot.pop(file_name, None)
+                self.pending.pop(file_name, None)
+
+
+    def update_files(self, files: dict[str, tuple[str, dict]], report_changes: bool = True):
+        """Запоминает метаданные файлов и отмечает новые и изменённые для ожидания стабилизации."""
+
+        now = time.monotonic()
+
+        for file_name, (file_path, file_stat) in files.items():
+            current_stat = (file_stat['size'], file_stat['mtime_ns'])
+
+            if report_changes and self.snapshot.get(file_name) != current_stat:
+                self.pending[file_name] = (current_stat, now)
+
+            self.paths[file_name] = file_path
+            self.snapshot[file_name] = current_stat
+
+        if self.pending and not self.settle_timer.isActive():
+            self.settle_timer.start()
+
+
+    def on_settle_timer_timeout(self):
+        """Обработчик события таймера стабилизации. Сообщает о файлах, которые перестали меняться."""
+
+        now = time.monotonic()
+        ready_files: list[str] = []
+
+        for file_name, (file_stat, stable_since) in list(self.pending.items()):
+            try:
+                entry_stat = os.stat(self.paths[file_name])
+                current_stat = (entry_stat.st_size, entry_stat.st_mtime_ns)
+            except (OSError, KeyError):
+                del self.pending[file_name]
+                continue
+
+            if current_stat != file_stat:
+                self.pending[file_name] = (current_stat, now)
+                continue
+
+            if now - stable_since >= self.settle_seconds:
+                ready_files.append(file_name)
+                del self.pending[file_name]
+
+        if not self.pending:
+            self.settle_timer.stop()
+
+        if ready_files:
+            self.logger.info(f'Обнаружены изменённые файлы: {', '.join(ready_files)}')
+            self.files_ready.emit(ready_files)
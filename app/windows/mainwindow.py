@@ -1,8 +1,7 @@
-import json
-
+import app.config as config
 import app.logger as logger
-
-from os import getenv, path
+import app.metrics as metrics
+import app.scanner as scanner
 
 from datetime import datetime, timedelta
 
@@ -20,6 +19,7 @@ from PyQt6.QtGui import QIcon
 from PyQt6.QtGui import QIcon
 
 from app.senderthread import SenderThread
+from app.watcher import FolderWatcher
 
 
 class MainWindow(QMainWindow):
@@ -32,17 +32,8 @@ class MainWindow(QMainWindow):
 
         self.logger.info('---- ПРИЛОЖЕНИЕ ЗАПУЩЕНО ----')
 
-        self.CONFIG_FILE_PATH = 'pbo_sender.json'
-        self.DEFAULT_USER_CONFIG = {
-            'webhook_url': '',
-            'search_folder': f'{getenv('LOCALAPPDATA')}\\Arma 3\\MPMissionsCache',
-            'target_files_prefix': 'UTF',
-            'max_file_size_mb': 8,
-            'check_interval': 60,
-            'discord_admin_id': ''
-        }
-
         self.user_config = self.read_user_config()
+        logger.configure_logging(self.user_config)
 
         self.setWindowTitle('PBO Sender')
         self.setWindowIcon(QIcon('favicon.ico'))
@@ -54,7 +45,9 @@ class MainWindow(QMainWindow):
         self.next_check_time = self.calc_next_check_time()
 
         self.init_ui()
+        self.init_sender_thread()
         self.init_timers()
+        self.init_folder_watcher()
         self.init_system_tray()
 
 
@@ -72,7 +65,11 @@ class MainWindow(QMainWindow):
         self.status_label = QLabel('Ожидание...')
         self.status_label.setAlignment(Qt.AlignmentFlag.AlignLeft)
         self.status_label.setStyleSheet('font-weight: bold;')
-        status_layout.addWidget(self.status_label, 70)
+        status_layout.addWidget(self.status_label, 50)
+
+        self.outbox_label = QLabel()
+        self.outbox_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        status_layout.addWidget(self.outbox_label, 20)
 
         self.next_check_label = QLabel()
         self.next_check_label.setAlignment(Qt.AlignmentFlag.AlignRight)
@@ -130,6 +127,10 @@ class MainWindow(QMainWindow):
         self.send_button.clicked.connect(self.on_send_button_clicked)
         buttons_layout.addWidget(self.send_button)
 
+        self.cancel_button = QPushButton('Отменить')
+        self.cancel_button.clicked.connect(self.on_cancel_button_clicked)
+        buttons_layout.addWidget(self.cancel_button)
+
         main_layout.addLayout(buttons_layout)
 
         main_widget.setLayout(main_layout)
@@ -139,6 +140,21 @@ class MainWindow(QMainWindow):
         self.logger.info('Инициализация элементов интерфейса завершена')
 
 
+    def init_sender_thread(self):
+        """Инициализирует и запускает процесс отправщика, который работает всё время работы приложения."""
+
+        self.logger.info('Запуск процесса отправщика...')
+
+        self.sender_thread = SenderThread(self.user_config)
+        self.sender_thread.finished.connect(self.on_files_send_finished)
+        self.sender_thread.status_changed.connect(self.on_status_changed)
+        self.sender_thread.outbox_changed.connect(self.on_outbox_changed)
+        self.sender_thread.metrics_ready.connect(self.on_metrics_ready)
+        self.sender_thread.start()
+
+        self.logger.info('Процесс отправщика запущен')
+
+
     def init_timers(self):
         """Инициализирует таймеры."""
 
@@ -151,6 +167,26 @@ class MainWindow(QMainWindow):
         self.logger.info('Инициализация таймеров завершена')
 
 
+    def init_folder_watcher(self):
+        """Инициализирует наблюдение за папкой с файлами .pbo.\n
+        Изменённые файлы отправляются сразу после того, как будут дописаны. Проверка по интервалу
+        остаётся запасным вариантом на случай пропущенных событий.
+        """
+
+        self.folder_watcher = None
+
+        if not self.user_config['watch_folder']:
+            return
+
+        self.logger.info('Инициализация наблюдения за папкой...')
+
+        self.folder_watcher = FolderWatcher(self.user_config['watch_settle_seconds'])
+        self.folder_watcher.files_ready.connect(self.on_watched_files_ready)
+        self.folder_watcher.watch(scanner.create_scanner(self.user_config))
+
+        self.logger.info('Инициализация наблюдения за папкой завершена')
+
+
     def init_system_tray(self):
         """Инициализирует трэй иконку."""
 
@@ -194,10 +230,14 @@ class MainWindow(QMainWindow):
         """Обработчик события, когда нажата кнопка отправки."""
 
         self.disable_buttons()
-        self.sender_thread = SenderThread(self.user_config)
-        self.sender_thread.finished.connect(self.on_files_send_finished)
-        self.sender_thread.status_changed.connect(self.on_status_changed)
-        self.sender_thread.start()
+        self.sender_thread.submit(manual=True)
+
+
+    def on_cancel_button_clicked(self):
+        """Обработчик события, когда нажата кнопка отмены проверки."""
+
+        self.status_label.setText('Отмена проверки...')
+        self.sender_thread.cancel()
 
 
     def on_webhook_lineedit_text_changed(self):
@@ -235,6 +275,18 @@ class MainWindow(QMainWindow):
         self.update_next_check_label_text(f'Проверка через: {minutes}:{seconds}')
 
 
+    def on_watched_files_ready(self, files: list[str]):
+        """Обработчик события, когда наблюдаемые файлы изменились и дописаны.
+
+        Parameters
+        ----------
+        files : list[str]
+            имена изменённых файлов
+        """
+
+        self.run_watched_files_check(files)
+
+
     def on_show_window_action_triggered(self):
         """Обработчик события, когда сработало действие на показ главного окна."""
 
@@ -265,6 +317,30 @@ class MainWindow(QMainWindow):
         self.status_label.setText(message)
 
 
+    def on_outbox_changed(self, depth: int):
+        """Обработчик события, когда изменилось количество файлов в очереди отправки.
+
+        Parameters
+        ----------
+        depth : int
+            количество файлов в очереди
+        """
+
+        self.outbox_label.setText(f'В очереди: {depth}' if depth else '')
+
+
+    def on_metrics_ready(self, summary: dict):
+        """Обработчик события, когда готовы метрики завершённой проверки.
+
+        Parameters
+        ----------
+        summary : dict
+            сводка метрик проверки
+        """
+
+        self.status_label.setToolTip(f'Последняя проверка: {metrics.format_summary(summary)}')
+
+
     def show_main_window(self):
         """Показывает главное окно приложения."""
 
@@ -280,6 +356,10 @@ class MainWindow(QMainWindow):
 
         self.logger.info('Выход из приложения...')
 
+        self.sender_thread.stop()
+        self.sender_thread.wait()
+        logger.shutdown_logging()
+
         self.tray_icon.hide()
         QApplication.quit()
 
@@ -292,27 +372,23 @@ class MainWindow(QMainWindow):
         self.next_check_time = self.calc_next_check_time()
         self.status_label.setText('Автоматическая проверка файлов...')
 
-        self.auto_check_thread = SenderThread(self.user_config)
-        self.auto_check_thread.finished.connect(self.on_files_send_finished)
-        self.auto_check_thread.start()
+        self.sender_thread.submit()
 
 
-    def read_user_config(self):
-        """Считывает данные из конфига пользователя в формате JSON."""
+    def run_watched_files_check(self, files: list[str]):
+        """Запускает проверку и отправку указанных изменённых файлов .pbo."""
 
-        self.logger.info('Чтение файла конфигурации...')
+        self.logger.info(f'Запущена проверка изменённых файлов: {len(files)}')
 
-        try:
-            if not path.exists(self.CONFIG_FILE_PATH):
-                self.logger.warning('Файл конфигурации отсутствует')
-                return self.DEFAULT_USER_CONFIG
+        self.status_label.setText(f'Обнаружены изменения: {len(files)}')
+
+        self.sender_thread.submit(files)
 
-            with open(self.CONFIG_FILE_PATH, 'r', encoding='utf-8') as config_file:
-                self.logger.info('Файл конфигурации считан')
-                return json.load(config_file)
-        except Exception as e:
-            self.logger.error(f'Ошибка при чтении файла конфигурации! Будет загружена стандартная конфигурация. Ошибка:\n{str(e)}')
-            return self.DEFAULT_USER_CONFIG
+
+    def read_user_config(self):
+        """Считывает данные из конфига пользователя в формате JSON."""
+
+        return config.read_user_config()
 
 
     def save_user_config(self):
@@ -321,11 +397,13 @@ class MainWindow(QMainWindow):
         self.logger.info('Сохранение файла конфигруации...')
 
         try:
-            with open(self.CONFIG_FILE_PATH, 'w', encoding='utf-8') as config_file:
-                json.dump(self.user_config, config_file, indent=2, ensure_ascii=False)
+            config.save_user_config(self.user_config)
 
             self.status_label.setText('Конфигруация сохранена')
             self.logger.info('Файл конфигурации сохранён')
+
+            if self.folder_watcher:
+                self.folder_watcher.watch(scanner.create_scanner(self.user_config))
         except Exception as e:
             self.status_label.setText('Ошибка сохранения. Детали в файле .log')
             self.logger.info(f'Ошибка при сохранении файла конфигурации! Ошибка:\n{str(e)}')
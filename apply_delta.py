@@ -0,0 +1,143 @@
+"""Применение патчей PBO Sender на стороне получателя.
+
+Патч (<code>имя.pbo.pbodelta</code>) создаётся относительно последней отправленной версии файла, поэтому
+применять патчи нужно по порядку к файлу, полученному из предыдущего сообщения:
+```
+python apply_delta.py UTF_mission.Altis.pbo UTF_mission.Altis.pbo.pbodelta
+python apply_delta.py UTF_mission.Altis.pbo UTF_mission.Altis.pbo.pbodelta -o UTF_mission.Altis.new.pbo
+```
+Скрипт не зависит от остальных модулей отправщика: достаточно передать получателю только его
+и Python 3.13+ без дополнительных пакетов. Формат патча описан в <code>app/delta.py</code>,
+применение патча повторяет <code>app.delta.apply_patch</code>.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import struct
+import sys
+import zlib
+
+
+MAGIC = b'PBODLT01'
+
+COPY_STRUCT = struct.Struct('<QI')
+LENGTH_STRUCT = struct.Struct('<I')
+
+
+class PatchError(Exception):
+    """Ошибка применения патча: повреждённый патч или не та базовая версия."""
+
+
+def read_patch_header(patch_data: bytes) -> tuple[dict, int]:
+    """Возвращает заголовок патча и смещение потока команд."""
+
+    if patch_data[:len(MAGIC)] != MAGIC:
+        raise PatchError('Файл не является патчем PBO Sender')
+
+    header_start = len(MAGIC) + LENGTH_STRUCT.size
+    (header_length,) = LENGTH_STRUCT.unpack_from(patch_data, len(MAGIC))
+
+    return json.loads(patch_data[header_start:header_start + header_length]), header_start + header_length
+
+
+def apply_patch(base_path: str, patch_data: bytes, output_path: str) -> dict:
+    """Применяет патч к базовой версии и записывает новую версию.\n
+    Базовая версия и результат сверяются с хэшами из заголовка патча. Если результат не совпал,
+    выходной файл удаляется.
+
+    Returns
+    -------
+    dict
+        заголовок патча
+
+    Raises
+    ------
+    PatchError
+        если патч повреждён или создан для другой базовой версии
+    """
+
+    header, operations_offset = read_patch_header(patch_data)
+
+    try:
+        operations: bytes = zlib.decompress(patch_data[operations_offset:])
+    except zlib.error as e:
+        raise PatchError(f'Патч повреждён: {str(e)}') from e
+
+    with open(base_path, 'rb') as base_file:
+        base_digest: str = hashlib.file_digest(base_file, header['algorithm']).hexdigest()
+        if base_digest != header['base_digest']:
+            raise PatchError(f'Патч создан для другой версии файла ({header['base_digest'][:12]}, а не {base_digest[:12]})')
+
+        try:
+            with open(output_path, 'wb') as output_file:
+                target_digest: str = write_target(base_file, operations, output_file, header['algorithm'])
+
+            if target_digest != header['target_digest']:
+                raise PatchError('Хэш результата не совпадает с хэшем новой версии из патча')
+        except (PatchError, struct.error) as e:
+            os.remove(output_path)
+            raise e if isinstance(e, PatchError) else PatchError('Патч повреждён: команды обрываются') from e
+
+    return header
+
+
+def write_target(base_file, operations: bytes, output_file, algorithm: str) -> str:
+    """Выполняет команды патча и возвращает хэш записанной новой версии."""
+
+    target_hash = hashlib.new(algorithm)
+    position = 0
+
+    while position < len(operations):
+        operation = operations[position:position + 1]
+
+        if operation == b'C':
+            offset, length = COPY_STRUCT.unpack_from(operations, position + 1)
+            position += 1 + COPY_STRUCT.size
+            base_file.seek(offset)
+            chunk: bytes = base_file.read(length)
+        elif operation == b'L':
+            (length,) = LENGTH_STRUCT.unpack_from(operations, position + 1)
+            position += 1 + LENGTH_STRUCT.size
+            chunk = operations[position:position + length]
+            position += length
+        else:
+            raise PatchError(f'Неизвестная команда патча в позиции {position}')
+
+        if len(chunk) != length:
+            raise PatchError('Патч выходит за пределы базовой версии')
+
+        target_hash.update(chunk)
+        output_file.write(chunk)
+
+    return target_hash.hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Применяет патч PBO Sender к предыдущей версии файла')
+    parser.add_argument('base', help='предыдущая версия файла')
+    parser.add_argument('patch', help='файл патча .pbodelta')
+    parser.add_argument('-o', '--output', help='файл новой версии (по умолчанию заменяется предыдущая версия)')
+    args = parser.parse_args()
+
+    output_path: str = args.output or f'{args.base}.new'
+
+    with open(args.patch, 'rb') as patch_file:
+        patch_data: bytes = patch_file.read()
+
+    try:
+        header: dict = apply_patch(args.base, patch_data, output_path)
+    except PatchError as e:
+        print(f'Ошибка: {str(e)}', file=sys.stderr)
+        sys.exit(1)
+
+    if not args.output:
+        os.replace(output_path, args.base)
+        output_path = args.base
+
+    print(f'Записан {output_path}: {header['target_size']} байт, SHA256 {header['target_digest']}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Микро-бенчмарк алгоритмов отпечатков файлов на больших синтетических PBO.
+
+Запуск из корня проекта:
+```
+python -m benchmarks.bench_fingerprint --size-mb 512 --repeat 3
+```
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from hashlib import sha256
+
+import app.fingerprint as fingerprint
+from benchmarks.corpus import make_synthetic_pbo
+
+
+def hash_buffered_sha256(file_path: str) -> str:
+    """Прежняя реализация: SHA256 поверх чтения блоками по 64 KiB."""
+
+    sha256_file_hash = sha256()
+
+    with open(file_path, 'rb') as f:
+        while data := f.read(65536):
+            sha256_file_hash.update(data)
+
+    return sha256_file_hash.hexdigest()
+
+
+def measure(function, file_path: str, repeat: int) -> float:
+    """Возвращает лучшее время выполнения функции из указанного числа повторов."""
+
+    best_time = float('inf')
+
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        function(file_path)
+        best_time = min(best_time, time.perf_counter() - start_time)
+
+    return best_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Сравнение алгоритмов отпечатков файлов')
+    parser.add_argument('--size-mb', type=int, default=256, help='размер синтетического PBO в MB')
+    parser.add_argument('--repeat', type=int, default=3, help='количество повторов для каждого варианта')
+    args = parser.parse_args()
+
+    candidates = {'sha256 (read 64 KiB)': hash_buffered_sha256}
+    for algorithm in fingerprint.ALGORITHMS:
+        candidates[f'{algorithm} (mmap)'] = lambda file_path, algorithm=algorithm: fingerprint.fingerprint_file(file_path, (algorithm,))
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        file_path = os.path.join(temp_dir, 'UTF_bench.Altis.pbo')
+        make_synthetic_pbo(file_path, args.size_mb)
+        file_size_mb = os.path.getsize(file_path) / (1024 * 1024)
+
+        print(f'Файл: {file_size_mb:.0f} MB, повторов: {args.repeat}')
+        for name, function in candidates.items():
+            elapsed = measure(function, file_path, args.repeat)
+            print(f'{name:<24} {elapsed:8.3f} s  {file_size_mb / elapsed:10.1f} MB/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,274 @@
+"""Бенчмарк этапов конвейера отправки на синтетическом наборе PBO.
+
+Каждый этап (поиск, предварительный отбор по метаданным, хэширование, сжатие, отправка)
+измеряется отдельно, затем конвейер целиком - на новых файлах, повторно без изменений
+и с повторной отправкой всех файлов, архивы которых берутся из кэша.
+Отправка идёт на локальный сервер aiohttp, который принимает сообщения как Discord Webhook.
+
+Запуск из корня проекта:
+```
+python -m benchmarks.bench_pipeline --files 16 --size-mb 4 --output baseline.json
+python -m benchmarks.bench_pipeline --files 16 --size-mb 4 --baseline baseline.json --tolerance 0.2
+```
+С <code>--baseline</code> процесс завершается с кодом 1, если какой-то этап стал медленнее больше чем на <code>--tolerance</code>.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+from functools import partial
+
+import aiohttp
+from aiohttp import web
+
+import app.compression as compression
+import app.logger as logger
+import app.scanner as scanner
+from app.engine import SenderEngine
+from benchmarks.corpus import make_corpus
+
+
+MB = 1024 * 1024
+
+
+def measure(function, repeat: int) -> float:
+    """Возвращает лучшее время выполнения функции без аргументов из указанного числа повторов."""
+
+    best_time = float('inf')
+
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        function()
+        best_time = min(best_time, time.perf_counter() - start_time)
+
+    return best_time
+
+
+async def measure_async(function, repeat: int) -> float:
+    """Асинхронный вариант <code>measure</code>."""
+
+    best_time = float('inf')
+
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        await function()
+        best_time = min(best_time, time.perf_counter() - start_time)
+
+    return best_time
+
+
+async def start_webhook_server() -> tuple[web.AppRunner, str]:
+    """Запускает локальный сервер, который читает сообщения целиком и отвечает 204, как Discord Webhook."""
+
+    async def handle_message(request: web.Request) -> web.Response:
+        await request.read()
+        return web.Response(status=204)
+
+    server_app = web.Application(client_max_size=64 * MB)
+    server_app.router.add_post('/webhook', handle_message)
+
+    runner = web.AppRunner(server_app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', 0).start()
+
+    host, port = runner.addresses[0][:2]
+    return runner, f'http://{host}:{port}/webhook'
+
+
+def create_sender_engine(corpus_folder: str, webhook_url: str, args: argparse.Namespace) -> SenderEngine:
+    """Создаёт отправщик для набора файлов. Его состояние создаётся в текущей папке.
+    Кэш архивов (по умолчанию выключен) включается в папке рядом с набором и вмещает все его архивы,
+    чтобы этап <code>pipeline_cached</code> брал архивы из кэша.
+    """
+
+    user_config = {
+        'webhook_url': webhook_url,
+        'search_folder': corpus_folder,
+        'target_files_prefix': 'UTF',
+        'max_file_size_mb': args.max_file_size_mb,
+        'discord_admin_id': '',
+        'hash_workers': args.hash_workers,
+        'compress_workers': args.compress_workers,
+        'compress_executor': args.compress_executor,
+        'compression_policy': args.policy,
+        'batch_linger_seconds': 0.2,
+        'metrics_textfile': '',
+        'metrics_json': '',
+        'archive_cache_folder': os.path.join(os.path.dirname(corpus_folder), 'archives'),
+        'archive_cache_max_mb': args.files * args.size_mb * 2 + 16
+    }
+
+    return SenderEngine(user_config)
+
+
+async def run_benchmarks(args: argparse.Namespace, work_dir: str) -> dict:
+    """Создаёт набор файлов и измеряет этапы конвейера.
+
+    Returns
+    -------
+    dict
+        результаты этапов: <code>seconds</code> (лучшее время) и производные показатели
+    """
+
+    corpus_folder = os.path.join(work_dir, 'corpus')
+    file_paths: list[str] = make_corpus(corpus_folder, args.files, args.size_mb, args.compressibility, noise_files=args.noise_files, subfolders=args.subfolders)
+    corpus_mb: float = sum(os.path.getsize(file_path) for file_path in file_paths) / MB
+    stages: dict[str, dict] = {}
+
+    runner, webhook_url = await start_webhook_server()
+    engine: SenderEngine = create_sender_engine(corpus_folder, webhook_url, args)
+    published_metrics: list[dict] = []
+    engine.metrics_ready.connect(published_metrics.append)
+
+    try:
+        file_scanner: scanner.FileScanner = scanner.create_scanner(engine.user_config)
+        seconds: float = measure(file_scanner.scan, args.repeat)
+        entries_count: int = args.files + args.noise_files
+        stages['scan'] = {'seconds': seconds, 'entries_per_second': entries_count / seconds}
+
+        seconds = measure(lambda: [engine.fingerprint_file(file_path, file_path, (engine.hash_algorithm,)) for file_path in file_paths], args.repeat)
+        stages['hash'] = {'seconds': seconds, 'mb_per_second': corpus_mb / seconds}
+
+        memory_cap = int(args.max_file_size_mb * MB)
+        zip_results: list[dict] = []
+
+        def compress_corpus():
+            zip_results[:] = [compression.compress_file(file_path, memory_cap, args.policy) for file_path in file_paths]
+
+        seconds = measure(compress_corpus, args.repeat)
+        compressed_mb: float = sum(zip_result['compressed_size'] for zip_result in zip_results) / MB
+        stages['compress'] = {'seconds': seconds, 'mb_per_second': corpus_mb / seconds, 'compression_ratio': compressed_mb / corpus_mb}
+
+        async with aiohttp.ClientSession() as session:
+            payload = os.urandom(int(args.upload_kb * 1024))
+            make_message_data = partial(engine.make_message_data, text='benchmark', files=[('benchmark.zip', payload)])
+
+            async def send_messages():
+                await asyncio.gather(*(engine.send_message(session, make_message_data) for _ in range(args.upload_messages)))
+
+            seconds = await measure_async(send_messages, args.repeat)
+            upload_mb: float = len(payload) * args.upload_messages / MB
+            stages['upload'] = {'seconds': seconds, 'mb_per_second': upload_mb / seconds, 'messages_per_second': args.upload_messages / seconds}
+
+            engine.session = session
+
+            for stage_name in ('pipeline_cold', 'pipeline_warm', 'pipeline_cached'):
+                if stage_name == 'pipeline_cached':
+                    # Отпечатки забываются, и все файлы отправляются повторно с архивами из кэша
+                    engine.files_hash.clear()
+
+                start_time = time.perf_counter()
+                result: dict = await engine.run_job(None)
+                seconds = time.perf_counter() - start_time
+
+                if not result['successful']:
+                    raise RuntimeError(f'{stage_name}: {result['message']}')
+
+                run_metrics: dict = {key: value for key, value in published_metrics[-1].items() if key != 'files'}
+                if stage_name == 'pipeline_cached' and run_metrics['files_cached'] != args.files:
+                    raise RuntimeError(f'{stage_name}: из кэша взято архивов {run_metrics['files_cached']} из {args.files}')
+                stages[stage_name] = {'seconds': seconds, 'mb_per_second': corpus_mb / seconds, 'metrics': run_metrics}
+
+        scanned_files: dict = file_scanner.scan()
+        seconds = measure(lambda: engine.get_hash_candidates(scanned_files, False), args.repeat)
+        stages['prefilter'] = {'seconds': seconds, 'files_per_second': len(scanned_files) / seconds}
+    finally:
+        engine.store.close()
+        engine.loop.close()
+        await runner.cleanup()
+
+    return stages
+
+
+def compare_with_baseline(stages: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Сравнивает время этапов с сохранёнными результатами и возвращает этапы, ставшие медленнее допустимого."""
+
+    regressions: list[str] = []
+
+    print(f'\n{'Этап':<16} {'База, s':>10} {'Сейчас, s':>10} {'Изменение':>10}')
+    for stage_name, stage in stages.items():
+        baseline_stage: dict | None = baseline.get('stages', {}).get(stage_name)
+        if not baseline_stage:
+            continue
+
+        change: float = stage['seconds'] / baseline_stage['seconds'] - 1
+        marker = ''
+        if change > tolerance:
+            regressions.append(stage_name)
+            marker = '  <- регрессия'
+
+        print(f'{stage_name:<16} {baseline_stage['seconds']:10.4f} {stage['seconds']:10.4f} {change:+10.1%}{marker}')
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк этапов конвейера отправки')
+    parser.add_argument('--files', type=int, default=16, help='количество подходящих файлов')
+    parser.add_argument('--size-mb', type=float, default=4, help='размер каждого файла в MB')
+    parser.add_argument('--compressibility', type=float, default=0.5, help='доля хорошо сжимаемых данных от 0 до 1')
+    parser.add_argument('--noise-files', type=int, default=500, help='количество неподходящих файлов в папке')
+    parser.add_argument('--subfolders', type=int, default=0, help='количество вложенных папок')
+    parser.add_argument('--policy', default=compression.DEFAULT_POLICY, help='политика сжатия')
+    parser.add_argument('--hash-workers', type=int, default=4)
+    parser.add_argument('--compress-workers', type=int, default=2)
+    parser.add_argument('--compress-executor', default='thread', choices=('thread', 'process'))
+    parser.add_argument('--max-file-size-mb', type=float, default=8, help='ограничение размера сообщения')
+    parser.add_argument('--upload-messages', type=int, default=8, help='количество сообщений в этапе отправки')
+    parser.add_argument('--upload-kb', type=float, default=1024, help='размер вложения сообщения в KB')
+    parser.add_argument('--repeat', type=int, default=3, help='количество повторов для каждого этапа')
+    parser.add_argument('--output', help='файл JSON для записи результатов')
+    parser.add_argument('--baseline', help='файл JSON с результатами для сравнения')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='допустимое замедление этапа (0.2 - 20%%)')
+    args = parser.parse_args()
+
+    output_path: str | None = os.path.abspath(args.output) if args.output else None
+    baseline_path: str | None = os.path.abspath(args.baseline) if args.baseline else None
+    initial_dir = os.getcwd()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.chdir(work_dir)
+
+        try:
+            stages: dict = asyncio.run(run_benchmarks(args, work_dir))
+        finally:
+            logger.shutdown_logging()
+            os.chdir(initial_dir)
+
+    print(f'Файлов: {args.files} x {args.size_mb} MB, сжимаемость: {args.compressibility}, повторов: {args.repeat}')
+    for stage_name, stage in stages.items():
+        rates = ', '.join(f'{key} {value:.1f}' for key, value in stage.items() if key not in ('seconds', 'metrics'))
+        print(f'{stage_name:<16} {stage['seconds']:10.4f} s  {rates}')
+
+    results = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count()
+        },
+        'parameters': vars(args),
+        'stages': stages
+    }
+
+    if output_path:
+        with open(output_path, 'w', encoding='utf-8') as output_file:
+            json.dump(results, output_file, indent=2, ensure_ascii=False)
+        print(f'Результаты записаны в {output_path}')
+
+    if baseline_path:
+        with open(baseline_path, 'r', encoding='utf-8') as baseline_file:
+            baseline: dict = json.load(baseline_file)
+
+        if compare_with_baseline(stages, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
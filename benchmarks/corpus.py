@@ -0,0 +1,91 @@
+"""Генерация синтетических PBO и наборов файлов для бенчмарков."""
+
+import os
+import random
+import struct
+
+
+MAX_ENTRY_SIZE = 4 * 1024 * 1024
+MIN_ENTRY_SIZE = 4 * 1024
+
+TEXT_LINE = b'private _unit = _this select 0; [_unit] call UTF_fnc_init;\n'
+
+
+def make_synthetic_pbo(file_path: str, size_mb: float, compressibility: float = 0.5, seed: int = 0):
+    """Создаёт синтетический PBO указанного размера.\n
+    Доля <code>compressibility</code> записей содержит повторяющийся текст (как .sqf),
+    остальные - случайные данные (как .paa/.ogg), равномерно перемешанные.
+
+    Parameters
+    ----------
+    file_path : str
+        путь к создаваемому файлу
+    size_mb : float
+        примерный размер данных в MB
+    compressibility : float
+        доля хорошо сжимаемых записей от 0 до 1
+    seed : int
+        начальное значение генератора случайных данных
+    """
+
+    data_size = max(1, int(size_mb * 1024 * 1024))
+    entry_size = min(MAX_ENTRY_SIZE, max(MIN_ENTRY_SIZE, data_size // 8))
+    entries_count = max(1, data_size // entry_size)
+    text_block = (TEXT_LINE * (entry_size // len(TEXT_LINE) + 1))[:entry_size]
+    generator = random.Random(seed)
+
+    with open(file_path, 'wb') as f:
+        f.write(b'\0' + struct.pack('<5I', 0x56657273, 0, 0, 0, 0) + b'prefix\0UTF_bench\0\0')
+        for index in range(entries_count):
+            f.write(f'data\\entry_{index}.bin\0'.encode() + struct.pack('<5I', 0, entry_size, 0, 0, entry_size))
+        f.write(b'\0' + struct.pack('<5I', 0, 0, 0, 0, 0))
+
+        for index in range(entries_count):
+            is_text = int((index + 1) * compressibility) > int(index * compressibility)
+            f.write(text_block if is_text else generator.randbytes(entry_size))
+
+
+def make_corpus(folder: str, files_count: int, size_mb: float, compressibility: float = 0.5,
+                prefix: str = 'UTF', noise_files: int = 0, subfolders: int = 0) -> list[str]:
+    """Создаёт набор синтетических PBO, похожий на папку MPMissionsCache.
+
+    Parameters
+    ----------
+    folder : str
+        папка набора
+    files_count : int
+        количество подходящих файлов <code>{prefix}_bench_N.Altis.pbo</code>
+    size_mb : float
+        размер каждого файла в MB
+    compressibility : float
+        доля хорошо сжимаемых данных (см. <code>make_synthetic_pbo</code>)
+    prefix : str
+        префикс подходящих файлов
+    noise_files : int
+        количество маленьких неподходящих файлов (миссии других серверов)
+    subfolders : int
+        количество вложенных папок, по которым распределяются подходящие файлы
+
+    Returns
+    -------
+    list[str]
+        пути к подходящим файлам
+    """
+
+    os.makedirs(folder, exist_ok=True)
+    folders: list[str] = [folder] + [os.path.join(folder, f'sub_{index}') for index in range(subfolders)]
+    for subfolder in folders[1:]:
+        os.makedirs(subfolder, exist_ok=True)
+
+    file_paths: list[str] = []
+
+    for index in range(files_count):
+        file_path = os.path.join(folders[index % len(folders)], f'{prefix}_bench_{index}.Altis.pbo')
+        make_synthetic_pbo(file_path, size_mb, compressibility, seed=index)
+        file_paths.append(file_path)
+
+    for index in range(noise_files):
+        with open(os.path.join(folder, f'Other_mission_{index}.Stratis.pbo'), 'wb') as f:
+            f.write(TEXT_LINE * 16)
+
+    return file_paths
@@ -0,0 +1,69 @@
+"""Запуск отправщика без графического интерфейса.
+
+Разовая проверка всей папки или отдельных файлов:
+```
+python cli.py
+python cli.py --files UTF_mission.Altis.pbo
+```
+Работа в фоне с проверкой папки каждые <code>check_interval</code> минут (до Ctrl+C или SIGTERM):
+```
+python cli.py --daemon
+```
+"""
+
+import argparse
+import multiprocessing
+import signal
+import sys
+
+import app.config as config
+import app.logger as logger
+from app.engine import SenderEngine
+
+
+def print_status(message: str):
+    print(message, flush=True)
+
+
+def print_result(result: dict):
+    print(result['message'], flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Отправка файлов .pbo миссий в Discord без графического интерфейса')
+    parser.add_argument('--config', default=config.CONFIG_FILE_PATH, help='файл конфигурации')
+    parser.add_argument('--files', nargs='+', metavar='FILE', help='проверить только указанные файлы (пути относительно папки поиска)')
+    parser.add_argument('--daemon', action='store_true', help='работать в фоне и проверять папку по расписанию')
+    parser.add_argument('--interval', type=float, help='интервал проверки в режиме --daemon в минутах (по умолчанию check_interval)')
+    args = parser.parse_args()
+
+    user_config: dict = config.read_user_config(args.config)
+    logger.configure_logging(user_config)
+
+    if not config.get_webhook_urls(user_config):
+        print(f'В {args.config} не указан webhook_url', file=sys.stderr)
+        sys.exit(2)
+
+    engine = SenderEngine(user_config)
+    engine.status_changed.connect(print_status)
+
+    if not args.daemon:
+        result: dict = engine.run_once(args.files)
+        print_result(result)
+        sys.exit(0 if result['successful'] else 1)
+
+    engine.finished.connect(print_result)
+
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signal_number, lambda *_: engine.stop())
+
+    if args.files:
+        engine.submit(args.files)
+
+    check_interval: float = user_config['check_interval'] if args.interval is None else args.interval
+    engine.run(check_interval * 60)
+
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    main()
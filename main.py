@@ -1,3 +1,4 @@
+import multiprocessing
 import sys
 
 from PyQt6.QtWidgets import QApplication
@@ -6,6 +7,8 @@ from app.windows.mainwindow import MainWindow
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
+
     app = QApplication(sys.argv)
 
     if QApplication.instance() is not None:
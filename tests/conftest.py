@@ -0,0 +1,112 @@
+import asyncio
+import sys
+import threading
+from os import path
+
+import pytest
+from aiohttp import web
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+from app.config import DEFAULT_USER_CONFIG
+
+
+class WebhookServer:
+    """Локальный Webhook: запоминает имена полученных файлов по запросам и их содержимое.
+    Запросы больше <code>max_request_size</code> отклоняются с кодом 413, как в Discord.
+    """
+
+    def __init__(self):
+        self.requests: list[list[str]] = []
+        self.received: dict[str, list[str]] = {}
+        self.attachments: dict[str, bytes] = {}
+        self.max_request_size: int | None = None
+        self.loop = asyncio.new_event_loop()
+        self.runner: web.AppRunner | None = None
+        self.base_url = ''
+        self.url = ''
+
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.max_request_size is not None and (request.content_length or 0) > self.max_request_size:
+            return web.Response(status=413)
+
+        reader = await request.multipart()
+        file_names: list[str] = []
+
+        async for part in reader:
+            data: bytes = await part.read()
+            if part.filename:
+                file_names.append(part.filename)
+                self.attachments[part.filename] = bytes(data)
+
+        self.requests.append(file_names)
+        self.received.setdefault(request.match_info['hook'], []).extend(file_names)
+
+        return web.Response(status=200)
+
+
+    def start(self):
+        ready = threading.Event()
+
+        def serve():
+            asyncio.set_event_loop(self.loop)
+            app = web.Application(client_max_size=64 * 1024 * 1024)
+            app.router.add_post('/{hook}', self.handle)
+            self.runner = web.AppRunner(app)
+            self.loop.run_until_complete(self.runner.setup())
+            site = web.TCPSite(self.runner, '127.0.0.1', 0)
+            self.loop.run_until_complete(site.start())
+            port: int = self.runner.addresses[0][1]
+            self.base_url = f'http://127.0.0.1:{port}'
+            self.url = f'{self.base_url}/webhook'
+            ready.set()
+            self.loop.run_forever()
+
+        threading.Thread(target=serve, daemon=True).start()
+        ready.wait(5)
+
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+    def sent_files(self) -> list[str]:
+        """Имена всех отправленных файлов (вложения запросов)."""
+
+        return [file_name for file_names in self.requests for file_name in file_names]
+
+
+@pytest.fixture
+def webhook():
+    server = WebhookServer()
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def user_config(tmp_path, monkeypatch, webhook) -> dict:
+    """Настройки отправщика с папкой миссий во временной папке, которая становится текущей
+    (файлы состояния отправщика создаются в текущей папке).
+    """
+
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'missions').mkdir()
+
+    config: dict = dict(DEFAULT_USER_CONFIG)
+    config.update({
+        'search_folder': str(tmp_path / 'missions'),
+        'target_files_prefix': 'UTF',
+        'webhook_url': webhook.url,
+        'webhook_urls': [],
+        'discord_admin_id': '1',
+        'retry_base_delay': 0,
+        'retry_max_delay': 0,
+        'metrics_textfile': '',
+        'metrics_json': '',
+        'watch_folder': False
+    })
+
+    return config
@@ -0,0 +1,41 @@
+import logging
+import os
+import shutil
+
+import app.fingerprint as fingerprint
+from app.engine import SenderEngine
+from benchmarks.corpus import make_synthetic_pbo
+
+
+def test_cache_is_disabled_by_default(user_config, webhook):
+    make_synthetic_pbo(f'{user_config['search_folder']}/UTF_alpha.Altis.pbo', 0.05)
+
+    engine = SenderEngine(user_config)
+    engine.run_once(None)
+
+    assert engine.archive_cache is None
+    assert not os.path.exists(user_config['archive_cache_folder'])
+
+
+def test_reverted_file_is_sent_from_cache_without_extra_read(user_config, webhook, monkeypatch, caplog, tmp_path):
+    user_config['archive_cache_max_mb'] = 64
+    file_path = f'{user_config['search_folder']}/UTF_alpha.Altis.pbo'
+
+    make_synthetic_pbo(file_path, 0.05, seed=1)
+    shutil.copy(file_path, tmp_path / 'first.pbo')
+    SenderEngine(user_config).run_once(None)
+
+    make_synthetic_pbo(file_path, 0.05, seed=2)
+    SenderEngine(user_config).run_once(None)
+
+    def fail_fingerprint(*args):
+        raise AssertionError('файл не должен читаться отдельно для поиска в кэше')
+
+    monkeypatch.setattr(fingerprint, 'fingerprint_file', fail_fingerprint)
+    shutil.copy(tmp_path / 'first.pbo', file_path)
+
+    with caplog.at_level(logging.INFO):
+        SenderEngine(user_config).run_once(None)
+
+    assert 'Архив UTF_alpha.Altis.pbo взят из кэша без сжатия' in caplog.messages
+    assert webhook.sent_files() == ['UTF_alpha.Altis.pbo.zip'] * 3
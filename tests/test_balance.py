@@ -0,0 +1,43 @@
+import os
+
+from app.engine import SenderEngine
+from benchmarks.corpus import make_synthetic_pbo
+
+
+def use_two_webhooks(user_config: dict, webhook):
+    user_config.update({
+        'webhook_url': f'{webhook.base_url}/a',
+        'webhook_urls': [f'{webhook.base_url}/b'],
+        'webhook_mode': 'balance',
+        'max_attachments': 1
+    })
+
+
+def test_split_parts_go_to_one_webhook(user_config, webhook):
+    use_two_webhooks(user_config, webhook)
+    user_config.update({'max_file_size_mb': 0.25, 'oversized_mode': 'split'})
+    make_synthetic_pbo(f'{user_config['search_folder']}/UTF_alpha.Altis.pbo', 0.7, compressibility=0)
+
+    result: dict = SenderEngine(user_config).run_once(None)
+
+    assert result['successful']
+    assert list(webhook.received.values()) == [[f'UTF_alpha.Altis.pbo.zip.{index:03d}' for index in range(1, 5)]]
+
+
+def test_patch_goes_to_webhook_with_base(user_config, webhook):
+    use_two_webhooks(user_config, webhook)
+    user_config['delta_uploads'] = True
+    for seed, file_name in enumerate(('UTF_alpha.Altis.pbo', 'UTF_bravo.Altis.pbo')):
+        make_synthetic_pbo(f'{user_config['search_folder']}/{file_name}', 0.3, compressibility=0, seed=seed)
+
+    SenderEngine(user_config).run_once(None)
+
+    assert sorted(webhook.received) == ['a', 'b']
+    file_name: str = webhook.received['b'][0].removesuffix('.zip')
+    with open(f'{user_config['search_folder']}/{file_name}', 'r+b') as f:
+        f.seek(100_000)
+        f.write(os.urandom(4096))
+
+    SenderEngine(user_config).run_once(None)
+
+    assert webhook.received['b'] == [f'{file_name}.zip', f'{file_name}.pbodelta']
@@ -0,0 +1,128 @@
+import os
+import random
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+import app.delta as delta
+from app.engine import SenderEngine
+from benchmarks.corpus import make_synthetic_pbo
+
+
+APPLY_SCRIPT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'apply_delta.py')
+
+
+@pytest.fixture
+def versions(tmp_path) -> tuple[str, str]:
+    """Базовая версия и новая со вставкой, заменой, удалением и дописанными данными."""
+
+    generator = random.Random(0)
+    base_data: bytes = generator.randbytes(1024 * 1024)
+    target_data: bytes = (
+        base_data[:100_000] + b'inserted' * 1000
+        + base_data[100_000:400_000] + generator.randbytes(5000)
+        + base_data[405_000:700_000] + base_data[750_000:]
+        + generator.randbytes(3000)
+    )
+
+    base_path = tmp_path / 'base.pbo'
+    target_path = tmp_path / 'target.pbo'
+    base_path.write_bytes(base_data)
+    target_path.write_bytes(target_data)
+
+    return str(base_path), str(target_path)
+
+
+def test_patch_round_trip(versions, tmp_path):
+    base_path, target_path = versions
+    output_path = str(tmp_path / 'output.pbo')
+
+    patch: dict = delta.create_patch(base_path, target_path, 1024 * 1024, 1024 * 1024)
+    header: dict = delta.apply_patch(base_path, patch['data'], output_path)
+
+    with open(target_path, 'rb') as target_file, open(output_path, 'rb') as output_file:
+        assert output_file.read() == target_file.read()
+    assert header['target_digest'] == patch['target_digest']
+    assert len(patch['data']) < 64 * 1024
+    assert patch['literal_bytes'] < 32 * 1024
+
+
+def test_patch_for_other_base_is_rejected(versions, tmp_path):
+    base_path, target_path = versions
+    output_path = tmp_path / 'output.pbo'
+    patch: dict = delta.create_patch(base_path, target_path, 1024 * 1024, 1024 * 1024)
+
+    with pytest.raises(delta.PatchError):
+        delta.apply_patch(target_path, patch['data'], str(output_path))
+    assert not output_path.exists()
+
+
+def test_corrupted_patch_removes_output(versions, tmp_path):
+    base_path, target_path = versions
+    output_path = tmp_path / 'output.pbo'
+    patch: dict = delta.create_patch(base_path, target_path, 1024 * 1024, 1024 * 1024)
+    _, operations_offset = delta.read_patch_header(patch['data'])
+
+    with pytest.raises(delta.PatchError):
+        delta.apply_patch(base_path, patch['data'][:operations_offset] + b'broken', str(output_path))
+    assert not output_path.exists()
+
+
+def test_unrelated_file_gets_no_patch(versions, tmp_path):
+    base_path, _ = versions
+    other_path = tmp_path / 'other.pbo'
+    other_path.write_bytes(os.urandom(1024 * 1024))
+
+    assert delta.create_patch(base_path, str(other_path), 1024 * 1024, 1024 * 1024) is None
+
+
+def test_engine_sends_patch_against_last_sent_version(user_config, webhook, tmp_path):
+    user_config['delta_uploads'] = True
+    file_path = f'{user_config['search_folder']}/UTF_alpha.Altis.pbo'
+
+    make_synthetic_pbo(file_path, 0.5, compressibility=0)
+    base_path = tmp_path / 'sent.pbo'
+    base_path.write_bytes(open(file_path, 'rb').read())
+    SenderEngine(user_config).run_once(None)
+
+    with open(file_path, 'r+b') as f:
+        f.seek(200_000)
+        f.write(os.urandom(4096))
+    SenderEngine(user_config).run_once(None)
+
+    assert webhook.sent_files() == ['UTF_alpha.Altis.pbo.zip', 'UTF_alpha.Altis.pbo.pbodelta']
+
+    output_path = tmp_path / 'restored.pbo'
+    delta.apply_patch(str(base_path), webhook.attachments['UTF_alpha.Altis.pbo.pbodelta'], str(output_path))
+    assert output_path.read_bytes() == open(file_path, 'rb').read()
+
+
+def test_apply_script_runs_without_sender(versions, tmp_path):
+    """Скрипт получателя работает отдельно от отправщика: в папке только он, модули <code>app</code> недоступны."""
+
+    base_path, target_path = versions
+    patch: dict = delta.create_patch(base_path, target_path, 1024 * 1024, 1024 * 1024)
+
+    receiver_folder = tmp_path / 'receiver'
+    receiver_folder.mkdir()
+    shutil.copy(APPLY_SCRIPT_PATH, receiver_folder)
+    shutil.copy(base_path, receiver_folder / 'mission.pbo')
+    (receiver_folder / 'mission.pbo.pbodelta').write_bytes(patch['data'])
+
+    def run_script(*args: str) -> subprocess.CompletedProcess:
+        return subprocess.run(
+            [sys.executable, '-I', 'apply_delta.py', *args],
+            cwd=receiver_folder, capture_output=True, text=True, encoding='utf-8'
+        )
+
+    result = run_script('mission.pbo', 'mission.pbo.pbodelta')
+    assert result.returncode == 0, result.stderr
+
+    with open(target_path, 'rb') as target_file:
+        assert (receiver_folder / 'mission.pbo').read_bytes() == target_file.read()
+
+    result = run_script('mission.pbo', 'mission.pbo.pbodelta')
+    assert result.returncode == 1
+    assert 'другой версии' in result.stderr
@@ -0,0 +1,31 @@
+import pytest
+
+from app.engine import SenderEngine
+
+
+@pytest.fixture
+def engine(user_config):
+    sender_engine = SenderEngine(user_config)
+    yield sender_engine
+    sender_engine.loop.close()
+    sender_engine.store.close()
+
+
+def test_cancel_pending_job_emits_finished(engine):
+    results: list[dict] = []
+    engine.finished.connect(results.append)
+
+    engine.schedule_job(['UTF_alpha.Altis.pbo'], False)
+    engine.cancel_jobs()
+
+    assert engine.pending_job is None
+    assert results == [{'successful': False, 'message': 'Проверка отменена'}]
+
+
+def test_cancel_without_jobs_emits_nothing(engine):
+    results: list[dict] = []
+    engine.finished.connect(results.append)
+
+    engine.cancel_jobs()
+
+    assert results == []
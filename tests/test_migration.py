@@ -0,0 +1,53 @@
+import hashlib
+import json
+
+from app.engine import SenderEngine
+from benchmarks.corpus import make_synthetic_pbo
+
+
+HASH_FILE_PATH = 'pbo_sender_files_hash.json'
+MISSIONS = ['UTF_alpha.Altis.pbo', 'UTF_bravo.Stratis.pbo', 'UTF_charlie.Tanoa.pbo']
+
+
+def write_legacy_manifest(user_config: dict) -> dict[str, str]:
+    """Создаёт миссии и манифест хэшей старого формата (имя файла -> SHA256), как будто они уже отправлены."""
+
+    files_hash: dict[str, str] = {}
+
+    for seed, file_name in enumerate(MISSIONS):
+        file_path = f'{user_config['search_folder']}/{file_name}'
+        make_synthetic_pbo(file_path, 0.05, seed=seed)
+        with open(file_path, 'rb') as f:
+            files_hash[file_name] = hashlib.sha256(f.read()).hexdigest()
+
+    with open(HASH_FILE_PATH, 'w') as f:
+        json.dump(files_hash, f)
+
+    return files_hash
+
+
+def test_legacy_manifest_full_run_sends_nothing(user_config, webhook):
+    write_legacy_manifest(user_config)
+
+    SenderEngine(user_config).run_once(None)
+    SenderEngine(user_config).run_once(None)
+
+    assert webhook.sent_files() == []
+
+
+def test_subset_run_does_not_switch_algorithm(user_config, webhook):
+    write_legacy_manifest(user_config)
+    make_synthetic_pbo(f'{user_config['search_folder']}/UTF_new.Altis.pbo', 0.05, seed=10)
+
+    engine = SenderEngine(user_config)
+    engine.run_once(['UTF_new.Altis.pbo'])
+    assert engine.files_hash_algorithm == 'sha256'
+    assert webhook.sent_files() == ['UTF_new.Altis.pbo.zip']
+
+    engine = SenderEngine(user_config)
+    engine.run_once(None)
+    assert engine.files_hash_algorithm == engine.hash_algorithm
+    assert webhook.sent_files() == ['UTF_new.Altis.pbo.zip']
+
+    SenderEngine(user_config).run_once(None)
+    assert webhook.sent_files() == ['UTF_new.Altis.pbo.zip']
@@ -0,0 +1,110 @@
+import pytest
+
+import app.outbox as outbox_module
+from app.engine import SenderEngine
+from app.outbox import Outbox
+from app.store import ManifestStore
+from benchmarks.corpus import make_synthetic_pbo
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    manifest_store = ManifestStore(str(tmp_path / 'pbo_sender.db'))
+    yield manifest_store
+    manifest_store.close()
+
+
+@pytest.fixture
+def clock(monkeypatch) -> list[float]:
+    """Подменяет время очереди: текущее время - первый элемент списка."""
+
+    now: list[float] = [1000.0]
+    monkeypatch.setattr(outbox_module.time, 'time', lambda: now[0])
+
+    return now
+
+
+def test_backoff_grows_exponentially_up_to_max_delay(store, clock, monkeypatch):
+    monkeypatch.setattr(outbox_module.random, 'uniform', lambda low, high: high)
+    outbox = Outbox(store, 10, 60)
+    outbox.add('UTF_alpha.Altis.pbo', 'digest')
+
+    delays: list[float] = []
+    for _ in range(5):
+        outbox.fail('UTF_alpha.Altis.pbo', 'Ошибка 500')
+        delays.append(outbox.items['UTF_alpha.Altis.pbo']['next_attempt_at'] - clock[0])
+
+    assert delays == [10, 20, 40, 60, 60]
+    assert outbox.items['UTF_alpha.Altis.pbo']['attempts'] == 5
+    assert outbox.items['UTF_alpha.Altis.pbo']['last_error'] == 'Ошибка 500'
+
+
+def test_jitter_keeps_delay_between_half_and_full(store, clock):
+    outbox = Outbox(store, 10, 600)
+
+    for index in range(50):
+        file_name = f'UTF_{index}.Altis.pbo'
+        outbox.add(file_name, 'digest')
+        outbox.fail(file_name, 'Ошибка 500')
+        outbox.fail(file_name, 'Ошибка 500')
+
+        assert 10 <= outbox.items[file_name]['next_attempt_at'] - clock[0] <= 20
+
+
+def test_waiting_until_next_attempt(store, clock, monkeypatch):
+    monkeypatch.setattr(outbox_module.random, 'uniform', lambda low, high: high)
+    outbox = Outbox(store, 10, 60)
+    outbox.add('UTF_alpha.Altis.pbo', 'digest')
+    outbox.fail('UTF_alpha.Altis.pbo', 'Ошибка 500')
+
+    assert outbox.is_waiting('UTF_alpha.Altis.pbo', 'digest')
+    assert not outbox.is_waiting('UTF_alpha.Altis.pbo', 'other')
+
+    clock[0] += 10
+    assert not outbox.is_waiting('UTF_alpha.Altis.pbo', 'digest')
+
+
+def test_changed_content_resets_attempts(store, clock):
+    outbox = Outbox(store, 10, 60)
+    outbox.add('UTF_alpha.Altis.pbo', 'digest')
+    outbox.fail('UTF_alpha.Altis.pbo', 'Ошибка 500')
+
+    outbox.add('UTF_alpha.Altis.pbo', 'digest')
+    assert outbox.items['UTF_alpha.Altis.pbo']['attempts'] == 1
+
+    outbox.add('UTF_alpha.Altis.pbo', 'new_digest')
+    assert outbox.items['UTF_alpha.Altis.pbo']['attempts'] == 0
+    assert not outbox.is_waiting('UTF_alpha.Altis.pbo')
+
+
+def test_state_survives_restart(store, clock):
+    outbox = Outbox(store, 10, 60)
+    outbox.add('UTF_alpha.Altis.pbo', 'digest')
+    outbox.add('UTF_bravo.Stratis.pbo', 'digest')
+    outbox.fail('UTF_alpha.Altis.pbo', 'Ошибка 500')
+    outbox.remove('UTF_bravo.Stratis.pbo')
+
+    restored = Outbox(store, 10, 60)
+
+    assert len(restored) == 1
+    assert restored.items['UTF_alpha.Altis.pbo'] == outbox.items['UTF_alpha.Altis.pbo']
+    assert restored.is_waiting('UTF_alpha.Altis.pbo', 'digest')
+
+
+def test_file_stat_is_stored_after_outbox_item(user_config, webhook, monkeypatch):
+    """Если работа прервётся между записями, по старым метаданным файл будет поставлен в очередь заново."""
+
+    make_synthetic_pbo(f'{user_config['search_folder']}/UTF_alpha.Altis.pbo', 0.1)
+    queued_on_stat: list[bool] = []
+    set_stat = ManifestStore.set_stat
+
+    def record_set_stat(self, file_name: str, file_stat: dict):
+        queued_on_stat.append(file_name in self.read_outbox())
+        set_stat(self, file_name, file_stat)
+
+    monkeypatch.setattr(ManifestStore, 'set_stat', record_set_stat)
+    SenderEngine(user_config).run_once(None)
+
+    assert queued_on_stat == [True]
+    assert webhook.sent_files() == ['UTF_alpha.Altis.pbo.zip']
@@ -0,0 +1,73 @@
+import hashlib
+import struct
+
+import pytest
+
+import app.pbo as pbo
+from app.engine import SenderEngine
+
+
+ENTRIES = {
+    'mission.sqm': b'class Mission {};' * 300,
+    'init.sqf': b'hint "alpha";' * 200,
+    'scripts\\fn_spawn.sqf': b'private _unit = _this select 0;' * 500
+}
+
+
+def write_pbo(file_path, entries: dict[str, bytes], checksum: bool = True):
+    """Создаёт PBO с разным временем изменения записей и, при <code>checksum</code>, SHA1 в конце."""
+
+    header = b'\0' + struct.pack('<5I', 0x56657273, 0, 0, 0, 0) + b'prefix\0UTF_test\0\0'
+    for index, (name, data) in enumerate(entries.items()):
+        header += name.encode() + b'\0' + struct.pack('<5I', 0, len(data), 0, 1_700_000_000 + index, len(data))
+    header += b'\0' + struct.pack('<5I', 0, 0, 0, 0, 0)
+
+    body: bytes = header + b''.join(entries.values())
+    if checksum:
+        body += b'\0' + hashlib.sha1(body).digest()
+
+    with open(file_path, 'wb') as f:
+        f.write(body)
+
+
+def edit_in_place(entries: dict[str, bytes]) -> dict[str, bytes]:
+    """Меняет данные записи, сохраняя её размер (время изменения в заголовке остаётся прежним)."""
+
+    edited: dict[str, bytes] = dict(entries)
+    edited['init.sqf'] = entries['init.sqf'].replace(b'alpha', b'bravo')
+
+    return edited
+
+
+@pytest.mark.parametrize('checksum', [True, False])
+def test_in_place_edit_changes_digest(tmp_path, checksum):
+    file_path = tmp_path / 'UTF_test.Altis.pbo'
+    write_pbo(file_path, ENTRIES, checksum)
+    digests, previous, _ = pbo.fingerprint_pbo(str(file_path), ('pbo-sha256',))
+
+    write_pbo(file_path, edit_in_place(ENTRIES), checksum)
+    edited_digests, entries, hashed_bytes = pbo.fingerprint_pbo(str(file_path), ('pbo-sha256',), previous)
+
+    assert edited_digests['pbo-sha256'] != digests['pbo-sha256']
+    assert edited_digests == pbo.fingerprint_pbo(str(file_path), ('pbo-sha256',))[0]
+    assert hashed_bytes == sum(map(len, ENTRIES.values()))
+    assert pbo.compare_entries(previous, entries)['modified'] == ['init.sqf']
+
+
+def test_same_checksum_reuses_entry_digests(tmp_path):
+    file_path = tmp_path / 'UTF_test.Altis.pbo'
+    write_pbo(file_path, ENTRIES)
+    digests, previous, _ = pbo.fingerprint_pbo(str(file_path), ('pbo-sha256',))
+
+    assert pbo.fingerprint_pbo(str(file_path), ('pbo-sha256',), previous)[::2] == (digests, 0)
+
+
+def test_in_place_edit_is_sent(user_config, webhook):
+    file_path = f'{user_config['search_folder']}/UTF_test.Altis.pbo'
+    write_pbo(file_path, ENTRIES)
+    SenderEngine(user_config).run_once(None)
+
+    write_pbo(file_path, edit_in_place(ENTRIES))
+    SenderEngine(user_config).run_once(None)
+
+    assert webhook.sent_files() == ['UTF_test.Altis.pbo.zip'] * 2
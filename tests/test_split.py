@@ -0,0 +1,68 @@
+import hashlib
+import io
+import os
+import shutil
+from os import path
+from zipfile import ZipFile
+
+import pytest
+
+import app.compression as compression
+from app.engine import MESSAGE_MAX_LENGTH, SenderEngine
+from benchmarks.corpus import make_synthetic_pbo
+
+
+@pytest.fixture
+def engine(user_config):
+    user_config['max_file_size_mb'] = 1
+    sender_engine = SenderEngine(user_config)
+    yield sender_engine
+    sender_engine.loop.close()
+    sender_engine.store.close()
+
+
+def test_split_parts_reassemble_to_archive(tmp_path):
+    source_path = tmp_path / 'UTF_big.Altis.pbo'
+    source_data: bytes = os.urandom(700 * 1024)
+    source_path.write_bytes(source_data)
+
+    zip_result: dict = compression.compress_file(str(source_path), 256 * 1024, split=True)
+
+    try:
+        assert [path.basename(part_path) for part_path in zip_result['parts']] == [
+            f'UTF_big.Altis.pbo.zip.{index:03d}' for index in range(1, len(zip_result['parts']) + 1)
+        ]
+        assert len(zip_result['parts']) == 3
+        assert all(path.getsize(part_path) <= 256 * 1024 for part_path in zip_result['parts'])
+
+        archive_data = b''.join(open(part_path, 'rb').read() for part_path in zip_result['parts'])
+        assert hashlib.sha256(archive_data).hexdigest() == zip_result['archive_sha256']
+
+        with ZipFile(io.BytesIO(archive_data)) as archive:
+            assert archive.read('UTF_big.Altis.pbo') == source_data
+    finally:
+        shutil.rmtree(path.dirname(zip_result['parts'][0]), ignore_errors=True)
+
+
+def test_full_part_request_fits_limit(engine):
+    attachments_limit: int = engine.get_attachments_limit()
+    message_data = engine.make_message_data(
+        text='\x01' * MESSAGE_MAX_LENGTH,
+        files=[('UTF_big.Altis.pbo.zip.001', os.urandom(attachments_limit))]
+    )
+
+    body: bytes = engine.loop.run_until_complete(message_data().as_bytes())
+
+    assert attachments_limit < 1024 * 1024
+    assert len(body) <= 1024 * 1024
+
+
+def test_split_upload_is_accepted_by_size_limited_webhook(user_config, webhook):
+    user_config.update({'max_file_size_mb': 0.25, 'oversized_mode': 'split'})
+    webhook.max_request_size = 256 * 1024
+    make_synthetic_pbo(f'{user_config['search_folder']}/UTF_big.Altis.pbo', 0.7, compressibility=0)
+
+    result: dict = SenderEngine(user_config).run_once(None)
+
+    assert result['successful']
+    assert webhook.sent_files() == [f'UTF_big.Altis.pbo.zip.{index:03d}' for index in range(1, 5)]
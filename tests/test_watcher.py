@@ -0,0 +1,114 @@
+import os
+import time
+
+import pytest
+from PyQt6.QtCore import QCoreApplication
+
+from app.scanner import FileScanner
+from app.watcher import FolderWatcher
+
+
+@pytest.fixture(scope='module')
+def qt_app():
+    return QCoreApplication.instance() or QCoreApplication([])
+
+
+def process_events(until, timeout: float = 5.0) -> bool:
+    """Обрабатывает события Qt, пока условие не выполнится или не истечёт время."""
+
+    deadline = time.monotonic() + timeout
+
+    while time.monotonic() < deadline:
+        QCoreApplication.processEvents()
+        if until():
+            return True
+        time.sleep(0.01)
+
+    return False
+
+
+@pytest.fixture
+def watcher(qt_app, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'UTF_old.Altis.pbo').write_bytes(b'old')
+    (tmp_path / 'nested').mkdir()
+
+    folder_watcher = FolderWatcher(0.2)
+    ready_files: list[str] = []
+    folder_watcher.files_ready.connect(ready_files.extend)
+    folder_watcher.watch(FileScanner([str(tmp_path)], ['UTF*.pbo'], []))
+    folder_watcher.ready_files = ready_files
+
+    assert process_events(lambda: folder_watcher.watcher.directories())
+
+    return folder_watcher
+
+
+def test_watches_folders_and_matched_files(watcher, tmp_path):
+    assert sorted(watcher.watcher.directories()) == sorted([str(tmp_path), str(tmp_path / 'nested')])
+    assert watcher.watcher.files() == [str(tmp_path / 'UTF_old.Altis.pbo')]
+    assert watcher.snapshot.keys() == {'UTF_old.Altis.pbo'}
+
+
+def test_reports_files_written_in_place(watcher, tmp_path):
+    with open(tmp_path / 'UTF_old.Altis.pbo', 'ab') as file:
+        file.write(b' appended')
+
+    assert process_events(lambda: watcher.ready_files)
+    assert watcher.ready_files == ['UTF_old.Altis.pbo']
+
+    watcher.ready_files.clear()
+    temp_path = tmp_path / 'UTF_old.Altis.pbo.tmp'
+    temp_path.write_bytes(b'replaced')
+    os.replace(temp_path, tmp_path / 'UTF_old.Altis.pbo')
+
+    assert process_events(lambda: watcher.ready_files)
+    assert process_events(lambda: watcher.watcher.files() == [str(tmp_path / 'UTF_old.Altis.pbo')])
+
+    watcher.ready_files.clear()
+    with open(tmp_path / 'UTF_old.Altis.pbo', 'ab') as file:
+        file.write(b' appended again')
+
+    assert process_events(lambda: watcher.ready_files)
+    assert watcher.ready_files == ['UTF_old.Altis.pbo']
+
+
+def test_reports_new_and_replaced_files(watcher, tmp_path):
+    (tmp_path / 'UTF_new.Altis.pbo').write_bytes(b'new')
+    (tmp_path / 'other.pbo').write_bytes(b'other')
+    temp_path = tmp_path / 'UTF_old.Altis.pbo.tmp'
+    temp_path.write_bytes(b'replaced')
+    os.replace(temp_path, tmp_path / 'UTF_old.Altis.pbo')
+
+    assert process_events(lambda: len(watcher.ready_files) >= 2)
+    assert sorted(watcher.ready_files) == ['UTF_new.Altis.pbo', 'UTF_old.Altis.pbo']
+
+
+def test_rescans_only_changed_folder(watcher, tmp_path, monkeypatch):
+    scan_calls: list[int] = []
+    scan = watcher.scanner.scan
+    monkeypatch.setattr(watcher.scanner, 'scan', lambda: scan_calls.append(1) or scan())
+    (tmp_path / 'nested' / 'UTF_nested.Altis.pbo').write_bytes(b'nested')
+
+    assert process_events(lambda: watcher.ready_files)
+    assert watcher.ready_files == ['nested/UTF_nested.Altis.pbo']
+    assert scan_calls == []
+
+
+def test_new_folder_is_scanned_and_watched(watcher, tmp_path):
+    (tmp_path / 'added').mkdir()
+    (tmp_path / 'added' / 'UTF_added.Altis.pbo').write_bytes(b'added')
+
+    assert process_events(lambda: watcher.ready_files)
+    assert watcher.ready_files == ['added/UTF_added.Altis.pbo']
+    assert str(tmp_path / 'added') in watcher.watcher.directories()
+
+
+def test_removed_folder_is_forgotten(watcher, tmp_path):
+    (tmp_path / 'nested' / 'UTF_nested.Altis.pbo').write_bytes(b'nested')
+    assert process_events(lambda: watcher.ready_files)
+
+    os.remove(tmp_path / 'nested' / 'UTF_nested.Altis.pbo')
+    os.rmdir(tmp_path / 'nested')
+
+    assert process_events(lambda: 'nested/UTF_nested.Altis.pbo' not in watcher.snapshot)